@@ -2,8 +2,7 @@ import os
 import sys
 import logging
 from datetime import datetime
-from flask import Flask, render_template_string, request, send_file, flash, redirect, url_for, Response
-import fitz  # PyMuPDF
+from flask import Flask, request, send_file, flash, redirect, url_for, Response, jsonify
 import tempfile
 import base64
 
@@ -16,131 +15,60 @@ app.secret_key = 'supersecretkey-vercel-deployment'
 
 # Get the base directory (parent of api folder)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import receipt_engine  # noqa: E402
+import receipt_bulk  # noqa: E402
+import receipt_preview  # noqa: E402
+import receipt_edit  # noqa: E402
+import consignee_directory  # noqa: E402
+import template_registry  # noqa: E402
+from receipt_metrics import METRICS, NULL_TIMER, current_timer, install as install_metrics  # noqa: E402
+
+install_metrics(app)
 
 # ============ Delivery Receipt Filler Logic ============
 
-TABLE_ROWS = [
-    {'y_start': 275, 'y_end': 309},  # Row 1
-    {'y_start': 309, 'y_end': 343},  # Row 2
-    {'y_start': 343, 'y_end': 377},  # Row 3
-    {'y_start': 377, 'y_end': 411},  # Row 4
-    {'y_start': 411, 'y_end': 445},  # Row 5
-]
+TEMPLATE_PATH = os.path.join(BASE_DIR, 'delivery_receipt_template.pdf')
 
-TABLE_COLUMNS = {
-    'item_description': {'x_start': 45, 'x_end': 325},
-    'quantity': {'x_start': 335, 'x_end': 425},
-    'remarks': {'x_start': 435, 'x_end': 615}
-}
+# Warm start: parse the template, build font metrics, compile the layout and
+# pre-render the form at import time, so the work lands in the cold start
+# (or the snapshot) instead of the first request. RECEIPT_WARM_START=0 keeps
+# everything lazy.
+WARM_START = os.environ.get('RECEIPT_WARM_START', '1') != '0'
 
+# JSON bulk API: POST /api/receipts
+receipt_bulk.install(app, TEMPLATE_PATH)
 
-def fill_delivery_receipt(data, template_path):
-    """Fill the PDF template with the provided data and return bytes."""
-    
-    doc = fitz.open(template_path)
-    page = doc[0]
-    
-    white = fitz.pdfcolor["white"]
-    black = fitz.pdfcolor["black"]
-    # Font settings
-    font_name = "helv"  # Helvetica
-    base_font_size = 10
-    font = fitz.Font(font_name)
-    
-    def draw_text_in_rect(rect, text, align="left", font_size=14, inset=0):
-        """Draw text in a rectangle with auto-scaling and alignment.
-        inset: padding for the whiteout box to preserve borders (x, y) or single int"""
-        
-        # Handle inset
-        if isinstance(inset, int):
-            inset_x, inset_y = inset, inset
-        else:
-            inset_x, inset_y = inset
-            
-        # 1. Clear the area (DISABLED for clean template to preserve grid lines)
-        # We only need to write text now since the template is blank.
-        # If we needed to erase, we would uncomment this:
-        # shape = page.new_shape()
-        # shape.draw_rect(erase_rect)
-        # shape.finish(fill=white, color=white)
-        # shape.commit()
-        
-        if not text:
-            return
-
-        # 2. Auto-scale font size
-        current_font_size = font_size
-        text_width = font.text_length(text, fontsize=current_font_size)
-        rect_width = rect.width - 4  # 2px padding on each side
-        
-        while text_width > rect_width and current_font_size > 6:
-            current_font_size -= 0.5
-            text_width = font.text_length(text, fontsize=current_font_size)
-            
-        # 3. Calculate alignment
-        # Vertical center baseline approximation: y_mid + font_size * 0.35
-        # Lift text up larger amount for larger font (-8)
-        y_pos = rect.y1 - ((rect.height - current_font_size) / 2) - 8
-        
-        if align == "center":
-            x_pos = rect.x0 + (rect.width - text_width) / 2
-        else:  # left
-            x_pos = rect.x0 + 2  # Left padding
-            
-        text_point = fitz.Point(x_pos, y_pos)
-        page.insert_text(text_point, text, fontname=font_name, fontsize=current_font_size, color=black)
-    
-    # Fill fields
-    # Date (Top) - Anchor Y ~76
-    date_rect = fitz.Rect(80, 76, 250, 92)
-    draw_text_in_rect(date_rect, data['date'], font_size=16)
-    
-    # Consignee - Anchor Y ~160
-    consignee_rect = fitz.Rect(115, 163, 400, 183)
-    draw_text_in_rect(consignee_rect, data['consignee'], font_size=16)
-    
-    # Delivery Location - Anchor Y ~179
-    location_rect = fitz.Rect(155, 182, 540, 198)
-    draw_text_in_rect(location_rect, data['delivery_location'], font_size=16)
-    
-    # Date (Bottom) - Anchor Y ~648
-    # Move WAY LEFT to sit on the line under "Date:"
-    date_bottom_rect = fitz.Rect(50, 680, 250, 700)
-    # Align left to start near the "Date:" label
-    draw_text_in_rect(date_bottom_rect, data['date'], align="left", font_size=14)
-    
-    for i in range(5):  # Loop through all 5 possible rows
-        row = TABLE_ROWS[i]
-        y_top = row['y_start'] - 2
-        y_bottom = row['y_end'] + 2
-        
-        # Define rectangles for all three columns
-        desc_rect = fitz.Rect(TABLE_COLUMNS['item_description']['x_start'], y_top,
-                              TABLE_COLUMNS['item_description']['x_end'], y_bottom)
-        qty_rect = fitz.Rect(TABLE_COLUMNS['quantity']['x_start'], y_top,
-                             TABLE_COLUMNS['quantity']['x_end'], y_bottom)
-        remarks_rect = fitz.Rect(TABLE_COLUMNS['remarks']['x_start'], y_top,
-                                 TABLE_COLUMNS['remarks']['x_end'], y_bottom)
-        
-        if i < len(data['items']):
-            item = data['items'][i]
-            # Description: Inset x=3, y=4 to definitely avoid grid lines
-            draw_text_in_rect(desc_rect, f"{i + 1}. {item['description']}", align="left", inset=(3, 4), font_size=14)
-            # Quantity: Centered
-            draw_text_in_rect(qty_rect, item['quantity'], align="center", inset=(3, 4), font_size=14)
-            # Remarks: Left aligned
-            draw_text_in_rect(remarks_rect, item['remarks'], align="left", inset=(3, 4), font_size=14)
-        else:
-            # If no item, clear. Important to inset to keep grid lines.
-            draw_text_in_rect(desc_rect, "", inset=(3, 4))
-            draw_text_in_rect(qty_rect, "", inset=(3, 4))
-            draw_text_in_rect(remarks_rect, "", inset=(3, 4))
-    
-    # Save to bytes
-    pdf_bytes = doc.tobytes()
-    doc.close()
-    
-    return pdf_bytes
+# Live preview image: GET /preview?<form fields>
+receipt_preview.install(app, TEMPLATE_PATH)
+
+# Field corrections saved incrementally: POST /api/receipts/edit
+receipt_edit.install(app)
+
+# Templates other than the delivery receipt, by ID: GET /api/templates
+template_registry.install(app)
+
+# Known consignees and their delivery locations, from consignees.csv (or a
+# CSV/SQLite file named by RECEIPT_CONSIGNEES). The form searches it through
+# /api/consignees, and the engine pre-bakes template variants for it.
+CONSIGNEES_PATH = os.environ.get('RECEIPT_CONSIGNEES', os.path.join(BASE_DIR, 'consignees.csv'))
+CONSIGNEE_CACHE_SECONDS = 300
+
+
+def get_consignees():
+    """The consignee directory, reloaded (and re-registered) when its file changes."""
+    directory = consignee_directory.get_directory(CONSIGNEES_PATH)
+    receipt_engine.set_directory(directory, directory.version)
+    return directory
+
+
+def fill_delivery_receipt(data, template_path, timer=NULL_TIMER, profile=None, template_id=None):
+    """Fill the PDF template (or the registered template_id) with the provided data and return bytes."""
+    with timer.stage('template'):
+        get_consignees()
+        template = template_registry.get_template(template_id, profile, template_path)
+    return template.fill_bytes(data, timer, profile)
 
 
 # ============ HTML Template ============
@@ -207,6 +135,10 @@ HTML_TEMPLATE = '''
     <form action="/delivery-receipt" method="post">
         <div class="card">
             <h3>Basic Info</h3>
+            <div class="form-group" id="template-group" hidden>
+                <label for="template">Template</label>
+                <select id="template" name="template"></select>
+            </div>
             <div class="form-group">
                 <label for="date">Date</label>
                 <input type="text" id="date" name="date" value="{{ today }}">
@@ -214,14 +146,8 @@ HTML_TEMPLATE = '''
             </div>
             <div class="form-group">
                 <label for="consignee">Consignee</label>
-                <select id="consignee" name="consignee" required onchange="updateLocation()" style="width: 100%; padding: 8px; border: 1px solid #ccc; border-radius: 4px;">
-                    <option value="" disabled selected>Select Consignee</option>
-                    <option value="The Clean Room">The Clean Room</option>
-                    <option value="Simula PH">Simula PH</option>
-                    <option value="9 Matters">9 Matters</option>
-                    <option value="Back to Basics">Back to Basics</option>
-                    <option value="EcoShoppe PH">EcoShoppe PH</option>
-                </select>
+                <input type="text" id="consignee" name="consignee" list="consignee-options" required autocomplete="off" placeholder="Start typing a consignee">
+                <datalist id="consignee-options"></datalist>
             </div>
             <div class="form-group">
                 <label for="delivery_location">Delivery Location</label>
@@ -230,23 +156,38 @@ HTML_TEMPLATE = '''
         </div>
 
         <script>
-            const locations = {
-                "The Clean Room": "Pick up",
-                "Simula PH": "Simula PH, Glorietta 2, Makati",
-                "9 Matters": "#25 Pearl St., Dona Juana Pasig City, Kalakhang Manila",
-                "Back to Basics": "30 Maginhawa, Diliman Quezon City",
-                "EcoShoppe PH": "Ecoshoppe PH, 883 Malaria Rd. Brgy. 185, N. Caloocan, 1427"
-            };
+            const consigneeInput = document.getElementById('consignee');
+            const locationInput = document.getElementById('delivery_location');
+            const options = document.getElementById('consignee-options');
+            let matches = {};
+            let pending = null;
 
             function updateLocation() {
-                const consignee = document.getElementById('consignee').value;
-                const locationInput = document.getElementById('delivery_location');
-                if (locations[consignee]) {
-                    locationInput.value = locations[consignee];
-                } else {
-                    locationInput.value = "";
-                }
+                locationInput.value = matches[consigneeInput.value] || "";
+                locationInput.dispatchEvent(new Event('input', {bubbles: true}));
             }
+
+            async function searchConsignees() {
+                const query = consigneeInput.value.trim();
+                const response = await fetch('/api/consignees?q=' + encodeURIComponent(query));
+                if (!response.ok || consigneeInput.value.trim() !== query) return;
+                const data = await response.json();
+                matches = {};
+                options.replaceChildren(...data.results.map(entry => {
+                    matches[entry.name] = entry.location;
+                    const option = document.createElement('option');
+                    option.value = entry.name;
+                    return option;
+                }));
+                updateLocation();
+            }
+
+            consigneeInput.addEventListener('input', () => {
+                updateLocation();
+                clearTimeout(pending);
+                pending = setTimeout(searchConsignees, 100);
+            });
+            searchConsignees();
         </script>
 
         <div class="card">
@@ -317,8 +258,37 @@ HTML_TEMPLATE = '''
             </div>
         </div>
 
+        <div class="card">
+            <h3>Preview</h3>
+            <img id="preview" alt="Receipt preview" style="width: 100%; border: 1px solid #eee;">
+        </div>
+
         <button type="submit" class="btn-primary">Generate Receipt</button>
     </form>
+    <script>
+        // Refresh the preview image shortly after the user stops typing
+        const form = document.querySelector('form');
+        const preview = document.getElementById('preview');
+        let previewPending = null;
+
+        function refreshPreview() {
+            preview.src = '/preview?' + new URLSearchParams(new FormData(form));
+        }
+
+        form.addEventListener('input', () => {
+            clearTimeout(previewPending);
+            previewPending = setTimeout(refreshPreview, 150);
+        });
+        refreshPreview();
+
+        // Offer a template picker only when more than one template is registered
+        fetch('/api/templates').then(response => response.json()).then(({templates, default: selected}) => {
+            if (templates.length < 2) return;
+            const select = document.getElementById('template');
+            for (const {id, name} of templates) select.add(new Option(name, id, false, id === selected));
+            document.getElementById('template-group').hidden = false;
+        });
+    </script>
     <footer style="text-align: center; margin-top: 30px; font-size: 12px; color: #999;">
         &copy; 2026 Delivery Receipt Tool
     </footer>
@@ -326,6 +296,36 @@ HTML_TEMPLATE = '''
 </html>
 '''
 
+# Compiled once; the plain GET page only varies by date, so it is cached per day
+FORM_TEMPLATE = app.jinja_env.from_string(HTML_TEMPLATE)
+_form_cache = {}
+
+
+def render_form(today, error=None):
+    """Render the receipt form, serving the error-free page from cache."""
+    if error:
+        return FORM_TEMPLATE.render(today=today, error=error)
+
+    html = _form_cache.get(today)
+    if html is not None:
+        METRICS.inc('receipt_cache_hits_total', cache='form')
+    else:
+        METRICS.inc('receipt_cache_misses_total', cache='form')
+        _form_cache.clear()
+        html = _form_cache[today] = FORM_TEMPLATE.render(today=today)
+    return html
+
+
+def warm_up():
+    """Do all per-process setup now rather than on the first request."""
+    get_consignees()
+    receipt_engine.get_template(TEMPLATE_PATH)
+    render_form(datetime.now().strftime("%m/%d/%Y"))
+
+
+if WARM_START:
+    warm_up()
+
 
 # ============ Routes ============
 
@@ -334,6 +334,20 @@ def home():
     return redirect('/delivery-receipt')
 
 
+@app.route('/api/consignees')
+def consignee_search():
+    """Typeahead search: top matches for ?q= as {"results": [{"name", "location"}]}."""
+    directory = get_consignees()
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', consignee_directory.DEFAULT_LIMIT, type=int)
+
+    response = jsonify(results=directory.lookup(query, limit))
+    # Results only change with the directory, so its version doubles as the ETag
+    response.set_etag(directory.version[:32])
+    response.headers['Cache-Control'] = f'public, max-age={CONSIGNEE_CACHE_SECONDS}'
+    return response.make_conditional(request)
+
+
 @app.route('/delivery-receipt', methods=['GET', 'POST'])
 def delivery_receipt():
     today = datetime.now().strftime("%m/%d/%Y")
@@ -347,13 +361,25 @@ def delivery_receipt():
             delivery_location = request.form.get('delivery_location', '').strip()
             
             if not consignee:
-                return render_template_string(HTML_TEMPLATE, today=today, error='Please enter a consignee name.')
+                return render_form(today, error='Please enter a consignee name.')
             
             if not delivery_location:
-                return render_template_string(HTML_TEMPLATE, today=today, error='Please enter a delivery location.')
+                return render_form(today, error='Please enter a delivery location.')
+            
+            # Output profile (default/compact/web), from the form or ?profile=
+            profile = request.values.get('profile', '').strip() or None
+            if profile and profile not in receipt_engine.SAVE_PROFILES:
+                return render_form(today, error=f'Unknown output profile "{profile}".')
+            
+            # Template (see template_registry.py), from the form or ?template=
+            template_id = request.values.get('template', '').strip() or None
+            if template_id and template_id not in template_registry.template_ids():
+                return render_form(today, error=f'Unknown template "{template_id}".')
             
+            # As many item rows as the template has (as the preview reads them)
+            template = template_registry.get_template(template_id, profile, TEMPLATE_PATH)
             items = []
-            for i in range(1, 6):
+            for i in range(1, template.max_items + 1):
                 desc = request.form.get(f'item{i}_description', '').strip()
                 if desc:
                     items.append({
@@ -363,7 +389,7 @@ def delivery_receipt():
                     })
             
             if not items:
-                return render_template_string(HTML_TEMPLATE, today=today, error='Please add at least one item.')
+                return render_form(today, error='Please add at least one item.')
             
             data = {
                 'date': date,
@@ -372,8 +398,7 @@ def delivery_receipt():
                 'items': items
             }
             
-            template_path = os.path.join(BASE_DIR, 'delivery_receipt_template.pdf')
-            pdf_bytes = fill_delivery_receipt(data, template_path)
+            pdf_bytes = fill_delivery_receipt(data, TEMPLATE_PATH, current_timer(), profile, template_id)
             
             filename = f'Delivery_Receipt_{consignee.replace(" ", "_")}_{date.replace("/", "-")}.pdf'
             
@@ -387,9 +412,10 @@ def delivery_receipt():
             
         except Exception as e:
             logger.error(f"Error generating delivery receipt: {e}")
-            return render_template_string(HTML_TEMPLATE, today=today, error=f'An error occurred: {str(e)}')
+            METRICS.inc('receipt_errors_total', endpoint='delivery_receipt')
+            return render_form(today, error=f'An error occurred: {str(e)}')
     
-    return render_template_string(HTML_TEMPLATE, today=today, error=error, success=success)
+    return render_form(today, error=error)
 
 
 # For Vercel
@@ -0,0 +1,214 @@
+"""
+ASGI entry point for the delivery receipt app.
+
+Wraps the Flask app from app.py so it can be served by an ASGI server.
+Each request runs on a bounded thread pool, so the CPU-bound
+fill_delivery_receipt work never blocks the event loop. An admission
+limit (concurrency + queue depth) answers excess load with a fast 503
+and a Retry-After header instead of letting latency climb without bound.
+Routes behave exactly as they do under `python app.py`.
+
+Usage:
+    uvicorn asgi:application --port 5000
+    python asgi.py --port 5000 --concurrency 4 --queue 8
+
+Configuration (environment):
+    RECEIPT_MAX_CONCURRENCY   requests executing at once (default: CPU count)
+    RECEIPT_MAX_QUEUE         requests waiting for a slot (default: 2x concurrency)
+    RECEIPT_RETRY_AFTER       seconds suggested to rejected clients (default: 1)
+"""
+
+import os
+import io
+import sys
+import asyncio
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import receipt_engine
+from receipt_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = int(os.environ.get('RECEIPT_MAX_CONCURRENCY', '0')) or os.cpu_count() or 1
+MAX_QUEUE = int(os.environ.get('RECEIPT_MAX_QUEUE', str(MAX_CONCURRENCY * 2)))
+RETRY_AFTER = int(os.environ.get('RECEIPT_RETRY_AFTER', '1'))
+
+_END = object()
+
+
+def _build_environ(scope, body):
+    """Translate an ASGI http scope into a WSGI environ."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI wants the raw path as latin-1 decoded bytes
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _start_wsgi(wsgi_app, environ):
+    """Call the WSGI app; returns (status, headers, body iterator)."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return lambda data: None  # legacy write() callable, unused by Flask
+
+    iterator = iter(wsgi_app(environ, start_response))
+    # start_response may be deferred until the first chunk is produced
+    first = next(iterator, _END)
+    return response['status'], response['headers'], first, iterator
+
+
+def _next_chunk(iterator):
+    return next(iterator, _END)
+
+
+class AdmissionControlledWSGI:
+    """ASGI application running a WSGI app on a bounded executor.
+
+    At most `max_concurrency` requests execute at once and up to
+    `max_queue` more wait for a slot; anything beyond that gets a 503.
+    """
+
+    def __init__(self, wsgi_app, max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE,
+                 retry_after=RETRY_AFTER):
+        self.wsgi_app = wsgi_app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix='receipt')
+        self.admitted = 0
+        self._slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Warm the template before the first request arrives
+                await asyncio.get_running_loop().run_in_executor(self.executor, receipt_engine.get_template)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _reject(self, send):
+        METRICS.inc('receipt_rejected_total')
+        await send({
+            'type': 'http.response.start',
+            'status': 503,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8'),
+                        (b'retry-after', str(self.retry_after).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': b'Server busy, please retry.\n'})
+
+    async def _http(self, scope, receive, send):
+        # Reject before reading the body so overload costs as little as possible
+        if self.admitted >= self.max_concurrency + self.max_queue:
+            await self._reject(send)
+            return
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        self.admitted += 1
+        try:
+            body = bytearray()
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    break
+
+            async with self._slots:
+                await self._run(scope, bytes(body), send)
+        finally:
+            self.admitted -= 1
+
+    async def _run(self, scope, body, send):
+        loop = asyncio.get_running_loop()
+        environ = _build_environ(scope, body)
+        status, headers, chunk, iterator = await loop.run_in_executor(
+            self.executor, _start_wsgi, self.wsgi_app, environ)
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        try:
+            # Streamed responses (e.g. the bulk ZIP) are pulled one chunk at a
+            # time on the executor and forwarded as they are produced
+            while chunk is not _END:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, _next_chunk, iterator)
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                await loop.run_in_executor(self.executor, close)
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+def create_application(max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE, retry_after=RETRY_AFTER):
+    from app import app as flask_app
+    return AdmissionControlledWSGI(flask_app, max_concurrency, max_queue, retry_after)
+
+
+application = create_application()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the delivery receipt app over ASGI.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="Requests executing at once")
+    parser.add_argument("--queue", type=int, default=MAX_QUEUE, help="Requests waiting for a slot")
+    parser.add_argument("--retry-after", type=int, default=RETRY_AFTER, help="Retry-After seconds on 503")
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("Error: uvicorn is required to serve ASGI (pip install uvicorn).")
+        sys.exit(1)
+
+    uvicorn.run(create_application(args.concurrency, args.queue, args.retry_after),
+                host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,414 @@
 import os
+import re
 import sys
 import json
+import time
+import cProfile
 import hashlib
 import argparse
 import logging
-from typing import Dict, Optional, List, Tuple
+import threading
+import tracemalloc
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Callable, Dict, Optional, List, Tuple, Union
+
+if __name__ == "__main__":
+    # Run as a script, keep fitz's import-time deprecation warning off stdout
+    # (where `-o -` writes the PDF); main() redirects later messages. Importers
+    # keep their own environment.
+    os.environ.setdefault("PYMUPDF_MESSAGE", "fd:2")
 
 # Third-party libraries
 import fitz  # PyMuPDF
-import pytesseract
-from pdf2image import convert_from_path
+import numpy as np
+from pdf2image import convert_from_bytes, convert_from_path
 from PIL import Image
 
+from ocr_backends import DEFAULT_BACKEND, get_backend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
 TEMPLATE_DIR = "ocr_cache"
+# Field maps kept in memory by PDF hash, so a warm process fills a known
+# form without reading ocr_cache/ again
+MAX_CACHED_FIELD_MAPS = int(os.environ.get("AUTOFILL_FIELD_MAP_CACHE", "256"))
+
+# A PDF on disk, or its bytes (bytes, bytearray, memoryview or a binary file object)
+PdfSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+# "adaptive" OCRs only the text regions found on a low-DPI render;
+# "fixed" OCRs whole pages at FULL_PAGE_DPI
+OCR_MODE = os.environ.get("AUTOFILL_OCR_MODE", "adaptive")
+FULL_PAGE_DPI = 200
+LOW_DPI = 60
+CROP_DPI = 300
+# Whitespace that separates two text regions, and ink runs long enough to be
+# form rules rather than glyphs (all in points)
+REGION_GAP_X_PT = 18
+REGION_GAP_Y_PT = 24
+RULE_MIN_PT = 36
+MIN_REGION_PT = 4
+REGION_PAD_PT = 4
+LINE_HEIGHT_PT = 16
+MAX_OCR_REGIONS = 40
+# Tesseract page segmentation modes: single line, uniform block, full page
+PSM_LINE = 7
+PSM_BLOCK = 6
+PSM_PAGE = 3
+
+
+class RasterizeError(RuntimeError):
+    """Poppler couldn't turn the PDF into page images for OCR."""
+
+
+def render_gray(page: fitz.Page, dpi: int, clip: Optional[fitz.Rect] = None) -> np.ndarray:
+    """Renders a page (or the clip of it) as a greyscale array."""
+    pix = page.get_pixmap(dpi=dpi, clip=clip, colorspace=fitz.csGRAY, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Grey level that best separates ink from paper (Otsu's method)."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    count = np.cumsum(hist)
+    mass = np.cumsum(hist * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (mass[-1] * count / gray.size - mass) ** 2 / (count * (gray.size - count))
+    return int(np.nanargmax(between)) if np.isfinite(between).any() else 0
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Black text on white, which is what Tesseract reads best."""
+    return np.where(gray > otsu_threshold(gray), 255, 0).astype(np.uint8)
+
+
+def _long_runs(ink: np.ndarray, length: int) -> np.ndarray:
+    """Pixels of ink that are part of a horizontal run of at least `length`."""
+    padded = np.pad(ink.astype(np.int32), ((0, 0), (1, 0)))
+    sums = np.cumsum(padded, axis=1)
+    full = (sums[:, length:] - sums[:, :-length]) == length
+    # Every pixel covered by a full window is part of the run
+    covered = np.cumsum(np.pad(full.astype(np.int32), ((0, 0), (length, length - 1))), axis=1)
+    return (covered[:, length:] - covered[:, :-length]) > 0
+
+
+def _runs(profile: np.ndarray, gap: int) -> List[Tuple[int, int]]:
+    """(start, end) of the stretches of `profile` split by at least `gap` empty entries."""
+    filled = np.flatnonzero(profile)
+    breaks = np.flatnonzero(np.diff(filled) > gap)
+    starts = np.concatenate(([filled[0]], filled[breaks + 1]))
+    ends = np.concatenate((filled[breaks], [filled[-1]])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+def _xy_cut(mask: np.ndarray, x0: int, y0: int, gap_x: int, gap_y: int, boxes: List):
+    """Recursively splits the mask at whitespace gaps (XY-cut) into region boxes."""
+    rows = np.flatnonzero(mask.any(axis=1))
+    if rows.size == 0:
+        return
+    cols = np.flatnonzero(mask.any(axis=0))
+    mask = mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+    x0 += int(cols[0])
+    y0 += int(rows[0])
+
+    row_runs = _runs(mask.any(axis=1), gap_y)
+    if len(row_runs) > 1:
+        for start, end in row_runs:
+            _xy_cut(mask[start:end], x0, y0 + start, gap_x, gap_y, boxes)
+        return
+    col_runs = _runs(mask.any(axis=0), gap_x)
+    if len(col_runs) > 1:
+        for start, end in col_runs:
+            _xy_cut(mask[:, start:end], x0 + start, y0, gap_x, gap_y, boxes)
+        return
+    boxes.append((x0, y0, x0 + mask.shape[1], y0 + mask.shape[0]))
+
+
+def text_regions(gray: np.ndarray, dpi: int) -> List[fitz.Rect]:
+    """Rectangles (in points) around the text on a low-DPI page render.
+
+    Form rules (long horizontal or vertical ink runs) are dropped first, so
+    that underlined blanks and table borders don't join labels into one region.
+    """
+    px = dpi / 72
+    ink = gray <= otsu_threshold(gray)
+    rule = max(2, round(RULE_MIN_PT * px))
+    # Both from the original ink: rules crossing each other split into short pieces
+    rules = np.zeros_like(ink)
+    if ink.shape[1] > rule:
+        rules |= _long_runs(ink, rule)
+    if ink.shape[0] > rule:
+        rules |= _long_runs(ink.T, rule).T
+    ink &= ~rules
+
+    boxes = []
+    _xy_cut(ink, 0, 0, max(1, round(REGION_GAP_X_PT * px)), max(1, round(REGION_GAP_Y_PT * px)), boxes)
+    min_size = MIN_REGION_PT * px
+    return [fitz.Rect(x0 / px, y0 / px, x1 / px, y1 / px) for x0, y0, x1, y1 in boxes
+            if x1 - x0 >= min_size and y1 - y0 >= min_size]
+
+
+def page_crops(page: fitz.Page) -> List[Tuple[fitz.Rect, Image.Image, str]]:
+    """(clip, image, Tesseract config) for each text region of a page.
+
+    A LOW_DPI render locates the regions; each is then rendered alone at
+    CROP_DPI, binarized and given a page segmentation mode for its shape.
+    """
+    regions = text_regions(render_gray(page, LOW_DPI), LOW_DPI)
+    if len(regions) > MAX_OCR_REGIONS:
+        # Dense page: one full-page pass is cheaper than many small ones
+        regions = [fitz.Rect(0, 0, page.rect.width, page.rect.height)]
+
+    crops = []
+    for region in regions:
+        clip = (region + (-REGION_PAD_PT, -REGION_PAD_PT, REGION_PAD_PT, REGION_PAD_PT)) & page.rect
+        if len(regions) == 1 and region.height > page.rect.height / 2:
+            psm = PSM_PAGE
+        elif region.height < 2 * LINE_HEIGHT_PT:
+            psm = PSM_LINE
+        else:
+            psm = PSM_BLOCK
+        crops.append((clip, Image.fromarray(binarize(render_gray(page, CROP_DPI, clip))), f"--psm {psm}"))
+    return crops
+
+
+# ============ Stage Events ============
+
+_NO_STAGE = nullcontext()
+
+
+def _max_rss_kb() -> Optional[int]:
+    """High-water mark of the process RSS in KB (None where unavailable)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class _Stage:
+    """Times one stage of a FormAutofiller and passes the event to its hook.
+
+    Memory is reported twice: Python allocations from tracemalloc (only
+    while it is tracing) and the growth of the process RSS high-water mark,
+    which also catches native allocations by MuPDF, Poppler and Tesseract.
+    """
+
+    __slots__ = ("on_event", "origin", "name", "page", "start", "mem_start", "rss_start")
+
+    def __init__(self, on_event: Callable[[Dict], None], origin: float, name: str, page: Optional[int]):
+        self.on_event = on_event
+        self.origin = origin
+        self.name = name
+        self.page = page
+
+    def __enter__(self):
+        self.mem_start = None
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self.mem_start = tracemalloc.get_traced_memory()[0]
+        self.rss_start = _max_rss_kb()
+        self.start = time.perf_counter()
+
+    def __exit__(self, exc_type, *exc):
+        end = time.perf_counter()
+        event = {
+            "stage": self.name,
+            "page": self.page,
+            "start_ms": (self.start - self.origin) * 1000,
+            "duration_ms": (end - self.start) * 1000,
+            "py_peak_kb": None,
+            "py_delta_kb": None,
+            "rss_growth_kb": None,
+            "ok": exc_type is None,
+        }
+        if self.mem_start is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            event["py_peak_kb"] = (peak - self.mem_start) / 1024
+            event["py_delta_kb"] = (current - self.mem_start) / 1024
+        if self.rss_start is not None:
+            event["rss_growth_kb"] = _max_rss_kb() - self.rss_start
+        self.on_event(event)
+
+
+class StageProfile:
+    """Collects FormAutofiller stage events; pass it as on_event.
+
+    Usage:
+        profile = StageProfile()
+        with FormAutofiller(pdf, data, on_event=profile) as agent:
+            agent.run()
+        print(profile.summary())
+    """
+
+    def __init__(self):
+        self.events: List[Dict] = []
+        self.start = time.perf_counter()
+
+    def __call__(self, event: Dict):
+        self.events.append(event)
+
+    def totals(self) -> Dict[str, Dict]:
+        """Per stage, in order of first appearance: calls, total/max ms and memory maxima."""
+        totals: Dict[str, Dict] = {}
+        for event in self.events:
+            stage = totals.setdefault(event["stage"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                       "py_peak_kb": None, "rss_growth_kb": None})
+            stage["calls"] += 1
+            stage["total_ms"] += event["duration_ms"]
+            stage["max_ms"] = max(stage["max_ms"], event["duration_ms"])
+            for key in ("py_peak_kb", "rss_growth_kb"):
+                if event[key] is not None:
+                    stage[key] = max(stage[key] or 0, event[key])
+        return totals
+
+    def summary(self) -> str:
+        elapsed_ms = (time.perf_counter() - self.start) * 1000
+        rows = [f"{'stage':<14} {'calls':>5} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'share':>6} "
+                f"{'py peak KB':>10} {'RSS +KB':>8}"]
+        for name, stage in self.totals().items():
+            py_peak = f"{stage['py_peak_kb']:.0f}" if stage["py_peak_kb"] is not None else "-"
+            rss = f"{stage['rss_growth_kb']}" if stage["rss_growth_kb"] is not None else "-"
+            rows.append(f"{name:<14} {stage['calls']:>5} {stage['total_ms']:>10.1f} "
+                        f"{stage['total_ms'] / stage['calls']:>9.2f} {stage['max_ms']:>9.2f} "
+                        f"{stage['total_ms'] / elapsed_ms:>6.1%} {py_peak:>10} {rss:>8}")
+        rows.append(f"{'wall':<14} {'':>5} {elapsed_ms:>10.1f}")
+        return "\n".join(rows)
+
+    def write_trace(self, path: str):
+        """The raw events as JSON, with the per-stage totals."""
+        with open(path, "w") as f:
+            json.dump({"events": self.events, "totals": self.totals()}, f, indent=2)
+
+
+# ============ Autofiller ============
+
+_field_maps: "OrderedDict[str, Dict]" = OrderedDict()
+_field_maps_lock = threading.Lock()
+
+
+def _cached_field_map(pdf_hash: str) -> Optional[Dict]:
+    with _field_maps_lock:
+        field_map = _field_maps.get(pdf_hash)
+        if field_map is not None:
+            _field_maps.move_to_end(pdf_hash)
+        return field_map
+
+
+def _cache_field_map(pdf_hash: str, field_map: Dict):
+    with _field_maps_lock:
+        _field_maps[pdf_hash] = field_map
+        _field_maps.move_to_end(pdf_hash)
+        while len(_field_maps) > MAX_CACHED_FIELD_MAPS:
+            _field_maps.popitem(last=False)
+
+
+def read_pdf_source(pdf: PdfSource) -> bytes:
+    """The bytes of an in-memory PDF source (anything but a path)."""
+    if hasattr(pdf, "read"):
+        pdf = pdf.read()
+    if not isinstance(pdf, (bytes, bytearray, memoryview)):
+        raise TypeError(f"Expected a path, PDF bytes or a binary file object, not {type(pdf).__name__}")
+    return bytes(pdf)
+
 
 class FormAutofiller:
-    def __init__(self, pdf_path: str, data: Dict[str, str]):
-        self.pdf_path = os.path.abspath(pdf_path)
+    """Fills one PDF form from a dict of label -> value.
+
+    The form is a path, or PDF bytes / a binary file object; filling from
+    bytes with a field map already in memory touches no files at all.
+    Holds the PDF open until close(); use it as a context manager:
+
+        with FormAutofiller(pdf_path, data) as agent:
+            agent.run()
+    """
+
+    def __init__(self, pdf_path: PdfSource, data: Dict[str, str], pdf_hash: Optional[str] = None,
+                 ocr_mode: str = OCR_MODE, ocr_backend: Optional[str] = None,
+                 on_event: Optional[Callable[[Dict], None]] = None):
+        if isinstance(pdf_path, (str, os.PathLike)):
+            self.pdf_path: Optional[str] = os.path.abspath(pdf_path)
+            self.pdf_bytes: Optional[bytes] = None
+        else:
+            self.pdf_path = None
+            self.pdf_bytes = read_pdf_source(pdf_path)
         self.data = data
-        self.doc = fitz.open(self.pdf_path)
-        self.pdf_hash = self._get_pdf_hash()
+        self.ocr_mode = ocr_mode
+        # Resolved on first use, so filling from a cached template never starts an OCR engine
+        self.ocr_backend = ocr_backend
+        # Called with one dict per finished stage (see _Stage); None costs nothing
+        self.on_event = on_event
+        self._origin = time.perf_counter()
+        with self._stage("open"):
+            if self.pdf_bytes is None:
+                self.doc = fitz.open(self.pdf_path)
+            else:
+                self.doc = fitz.open(stream=self.pdf_bytes, filetype="pdf")
+        # Batch mode hashes each form once and passes the hash in
+        if pdf_hash:
+            self.pdf_hash = pdf_hash
+        else:
+            try:
+                with self._stage("hash"):
+                    self.pdf_hash = self._get_pdf_hash()
+            except BaseException:
+                self.close()
+                raise
         self.template_path = os.path.join(TEMPLATE_DIR, f"{self.pdf_hash}.json")
-        
-        # Ensure template directory exists
-        os.makedirs(TEMPLATE_DIR, exist_ok=True)
+
+    def close(self):
+        """Releases the PDF and MuPDF's memory for it; safe to call twice."""
+        if not self.doc.is_closed:
+            self.doc.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _stage(self, name: str, page: Optional[int] = None):
+        """Context manager timing one stage for on_event; a shared no-op when there is no hook."""
+        if self.on_event is None:
+            return _NO_STAGE
+        return _Stage(self.on_event, self._origin, name, page)
 
     def _get_pdf_hash(self) -> str:
-        """Generates a SHA256 hash of the PDF file content."""
-        hasher = hashlib.sha256()
-        with open(self.pdf_path, 'rb') as f:
-            buf = f.read()
-            hasher.update(buf)
-        return hasher.hexdigest()
+        """Generates a SHA256 hash of the PDF content (from memory when given bytes)."""
+        if self.pdf_bytes is not None:
+            return hashlib.sha256(self.pdf_bytes).hexdigest()
+        return file_hash(self.pdf_path)
 
     def _load_template(self) -> Optional[Dict]:
-        """Loads an existing template if available."""
+        """Loads an existing template if available: from memory, else from TEMPLATE_DIR."""
+        field_map = _cached_field_map(self.pdf_hash)
+        if field_map is not None:
+            return field_map
         if os.path.exists(self.template_path):
             try:
                 with open(self.template_path, 'r') as f:
-                    return json.load(f)
+                    field_map = json.load(f)
             except Exception as e:
                 logger.warning(f"Failed to load template: {e}")
+                return None
+            if field_map:
+                _cache_field_map(self.pdf_hash, field_map)
+            return field_map
         return None
 
     def _save_template(self, field_map: Dict):
         """Saves the detected field coordinates to a JSON file."""
+        _cache_field_map(self.pdf_hash, field_map)
         try:
+            os.makedirs(TEMPLATE_DIR, exist_ok=True)
             with open(self.template_path, 'w') as f:
                 json.dump(field_map, f, indent=2)
             logger.info(f"Template saved to {self.template_path}")
@@ -60,153 +419,215 @@ class FormAutofiller:
         """Normalizes text for comparison (lowercase, strip)."""
         return text.lower().strip().replace(":", "")
 
-    def _find_coordinates(self) -> Dict:
-        """
-        Runs OCR on the PDF to find coordinates for the keys in self.data.
-        Returns a nested dict: { page_num: { field_key: {x, y, fontsize} } }
+    def _ocr_lines(self, img: Image.Image, config: str, origin: Tuple[float, float],
+                   scale: Tuple[float, float], page_num: Optional[int] = None) -> List[List[Dict]]:
+        """OCRs one image and groups its words into lines.
+
+        Word boxes are returned in PDF points: image pixels times `scale`,
+        plus the `origin` of the image (a crop's top-left corner) on the page.
         """
-        logger.info("No template found. Running OCR to detect fields...")
-        field_map = {}
-        
+        with self._stage("ocr", page_num):
+            ocr_data = get_backend(self.ocr_backend).image_to_data(img, config)
+        with self._stage("group", page_num):
+            return self._group_lines(ocr_data, origin, scale)
+
+    def _group_lines(self, ocr_data: Dict, origin: Tuple[float, float],
+                     scale: Tuple[float, float]) -> List[List[Dict]]:
+        """Word boxes of image_to_data output grouped into lines, in PDF points."""
+        n_boxes = len(ocr_data['text'])
+        origin_x, origin_y = origin
+        scale_x, scale_y = scale
+
+        # Group words into lines using (block, par, line)
+        lines = []
+        current_line_words = []
+        # key is (block_num, par_num, line_num)
+        current_line_key = None
+
+        for i in range(n_boxes):
+            text = ocr_data['text'][i].strip()
+            if not text:
+                continue
+
+            # Create a unique key for the line
+            line_key = (
+                ocr_data['block_num'][i],
+                ocr_data['par_num'][i],
+                ocr_data['line_num'][i]
+            )
+
+            x, y, w, h = ocr_data['left'][i], ocr_data['top'][i], ocr_data['width'][i], ocr_data['height'][i]
+
+            if line_key != current_line_key:
+                if current_line_words:
+                    lines.append(current_line_words)
+                current_line_words = []
+                current_line_key = line_key
+
+            current_line_words.append({
+                'text': text,
+                'left': origin_x + x * scale_x, 'top': origin_y + y * scale_y,
+                'width': w * scale_x, 'height': h * scale_y
+            })
+
+        if current_line_words:
+            lines.append(current_line_words)
+        return lines
+
+    def _ocr_pages_fixed(self):
+        """Yields the OCR lines of each page, OCRing whole pages at FULL_PAGE_DPI."""
         try:
-            images = convert_from_path(self.pdf_path, dpi=200)
+            with self._stage("rasterize"):
+                if self.pdf_bytes is None:
+                    images = convert_from_path(self.pdf_path, dpi=FULL_PAGE_DPI)
+                else:
+                    images = convert_from_bytes(self.pdf_bytes, dpi=FULL_PAGE_DPI)
         except Exception as e:
-            logger.error(f"Error converting PDF to images: {e}")
-            sys.exit(1)
+            raise RasterizeError(f"Error converting PDF to images: {e}") from e
 
         for page_num, img in enumerate(images):
-            page_map = {}
             pdf_page = self.doc[page_num]
-            page_width_pt = pdf_page.rect.width
-            page_height_pt = pdf_page.rect.height
-            
-            scale_x = page_width_pt / img.width
-            scale_y = page_height_pt / img.height
+            scale_x = pdf_page.rect.width / img.width
+            scale_y = pdf_page.rect.height / img.height
+            yield self._ocr_lines(img, "", (0, 0), (scale_x, scale_y), page_num)
 
-            # Get detailed data
-            ocr_data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
-            n_boxes = len(ocr_data['text'])
-            
-            # Group words into lines using (block, par, line)
+    def _ocr_pages_adaptive(self):
+        """Yields the OCR lines of each page, OCRing only its text regions (see page_crops)."""
+        scale = 72 / CROP_DPI
+        for page_num, page in enumerate(self.doc):
             lines = []
-            current_line_words = []
-            # key is (block_num, par_num, line_num)
-            current_line_key = None
-            
-            for i in range(n_boxes):
-                text = ocr_data['text'][i].strip()
-                if not text:
+            with self._stage("rasterize", page_num):
+                crops = page_crops(page)
+            for clip, img, config in crops:
+                lines.extend(self._ocr_lines(img, config, (clip.x0, clip.y0), (scale, scale), page_num))
+            yield lines
+
+    def _match_fields(self, lines: List[List[Dict]], page_num: int) -> Dict:
+        """Field positions for the keys in self.data whose labels start one of the OCR lines."""
+        page_map = {}
+
+        # Find matches
+        for key in self.data.keys():
+            normalized_key = self._normalize_text(key)
+            best_match = None
+
+            for line in lines:
+                # Check if any word in the line matches the key start
+                # We want to find "Name:" or "Name"
+
+                # Reconstruct line text for context
+                line_text = " ".join([w['text'] for w in line])
+                normalized_line = self._normalize_text(line_text)
+
+                # Strict check: Line must start with the key
+                if not normalized_line.startswith(normalized_key):
                     continue
-                
-                # Create a unique key for the line
-                line_key = (
-                    ocr_data['block_num'][i],
-                    ocr_data['par_num'][i],
-                    ocr_data['line_num'][i]
-                )
-                
-                x, y, w, h = ocr_data['left'][i], ocr_data['top'][i], ocr_data['width'][i], ocr_data['height'][i]
-                
-                if line_key != current_line_key:
-                    if current_line_words:
-                        lines.append(current_line_words)
-                    current_line_words = []
-                    current_line_key = line_key
-                
-                current_line_words.append({
-                    'text': text,
-                    'left': x, 'top': y, 'width': w, 'height': h
-                })
-            
-            if current_line_words:
-                lines.append(current_line_words)
 
+                # Now find the specific word that ends the label
+                # e.g. "Name:" -> we want the right edge of this word
+
+                temp_str = ""
+                for word in line:
+                    # Accumulate text to handle split words if necessary
+                    # But usually "Name:" is one or two words
+                    word_clean = word['text'].lower().replace(":", "")
+                    # Space-separated, as in normalized_key ("full name")
+                    temp_str = f"{temp_str} {word_clean}".lstrip()
+
+                    # Check if we have matched the key
+                    if normalized_key in temp_str:
+                        # This is the word (or the last word of the label)
+                        # We use its right edge
+                        label_end_x = word['left'] + word['width']
+                        label_top = word['top']
+                        label_height = word['height']
+
+                        best_match = (label_end_x, label_top, label_height)
+                        logger.info(f"MATCHED '{key}' at word '{word['text']}' in line '{line_text}'")
+                        break
+
+                if best_match:
+                    break
+
+            if best_match:
+                px, py, ph = best_match
+                # Word boxes are already in PDF coordinates
+                # Add padding (10pt) to start writing in the blank
+                pdf_x = px + 10 
+                # Adjust Y to align with baseline (approximate)
+                # OCR 'top' is the top of the bbox. PDF text placement is usually baseline.
+                # Adding height is a good approximation for baseline.
+                pdf_y = py + (ph * 0.8)
+
+                page_map[key] = {
+                    "x": pdf_x,
+                    "y": pdf_y,
+                    "fontsize": 12
+                }
+            else:
+                logger.warning(f"Could not find label for '{key}' on page {page_num+1}")
+
+        return page_map
+
+    def _find_coordinates(self) -> Dict:
+        """
+        Runs OCR on the PDF to find coordinates for the keys in self.data.
+        Returns a nested dict: { page_num: { field_key: {x, y, fontsize} } }
+        """
+        logger.info(f"No template found. Running {self.ocr_mode} OCR to detect fields...")
+        field_map = {}
+
+        if self.ocr_mode == "fixed":
+            pages = self._ocr_pages_fixed()
+        else:
+            pages = self._ocr_pages_adaptive()
+
+        for page_num, lines in enumerate(pages):
             # Debug: Print all lines
             logger.info(f"--- Page {page_num + 1} OCR Lines ---")
             for line in lines:
                 line_text = " ".join([w['text'] for w in line])
                 logger.info(f"Line: '{line_text}'")
 
-            # Find matches
-            for key in self.data.keys():
-                normalized_key = self._normalize_text(key)
-                best_match = None
-                
-                for line in lines:
-                    # Check if any word in the line matches the key start
-                    # We want to find "Name:" or "Name"
-                    
-                    # Reconstruct line text for context
-                    line_text = " ".join([w['text'] for w in line])
-                    normalized_line = self._normalize_text(line_text)
-                    
-                    # Strict check: Line must start with the key
-                    if not normalized_line.startswith(normalized_key):
-                        continue
-
-                    # Now find the specific word that ends the label
-                    # e.g. "Name:" -> we want the right edge of this word
-                    
-                    temp_str = ""
-                    for word in line:
-                        # Accumulate text to handle split words if necessary
-                        # But usually "Name:" is one or two words
-                        word_clean = word['text'].lower().replace(":", "")
-                        temp_str += word_clean
-                        
-                        # Check if we have matched the key
-                        if normalized_key in temp_str:
-                            # This is the word (or the last word of the label)
-                            # We use its right edge
-                            label_end_x = word['left'] + word['width']
-                            label_top = word['top']
-                            label_height = word['height']
-                            
-                            best_match = (label_end_x, label_top, label_height)
-                            logger.info(f"MATCHED '{key}' at word '{word['text']}' in line '{line_text}'")
-                            break
-                    
-                    if best_match:
-                        break
-                
-                if best_match:
-                    px, py, ph = best_match
-                    # Convert to PDF coordinates
-                    # Add padding (10pt) to start writing in the blank
-                    pdf_x = (px * scale_x) + 10 
-                    # Adjust Y to align with baseline (approximate)
-                    # OCR 'top' is the top of the bbox. PDF text placement is usually baseline.
-                    # Adding height is a good approximation for baseline.
-                    pdf_y = (py * scale_y) + (ph * scale_y * 0.8)
-                    
-                    page_map[key] = {
-                        "x": pdf_x,
-                        "y": pdf_y,
-                        "fontsize": 12
-                    }
-                else:
-                    logger.warning(f"Could not find label for '{key}' on page {page_num+1}")
-
+            with self._stage("match", page_num):
+                page_map = self._match_fields(lines, page_num)
             if page_map:
                 field_map[str(page_num)] = page_map
 
         return field_map
 
-    def run(self):
-        """Main execution method."""
-        # 1. Check for template
-        field_map = self._load_template()
+    def get_field_map(self) -> Optional[Dict]:
+        """Field coordinates from the template cache, running OCR (and caching it) on a miss."""
+        with self._stage("load_template"):
+            field_map = self._load_template()
         
         if not field_map:
-            # 2. Run OCR if no template
             field_map = self._find_coordinates()
             if field_map:
-                self._save_template(field_map)
+                with self._stage("save_template"):
+                    self._save_template(field_map)
             else:
                 logger.error("No fields found via OCR. Cannot proceed.")
-                return
+                return None
+        return field_map
+
+    def fill(self, field_map: Dict, output_path: str) -> Tuple[int, int]:
+        """Writes self.data at the field_map coordinates and saves to output_path.
+
+        Returns (filled, skipped) field counts.
+        """
+        counts = self._insert_values(field_map)
+        with self._stage("save"):
+            self.doc.save(output_path)
+        return counts
+
+    def fill_bytes(self, field_map: Dict) -> bytes:
+        """Writes self.data at the field_map coordinates and returns the filled PDF."""
+        self._insert_values(field_map)
+        with self._stage("save"):
+            return self.doc.tobytes()
 
-        # 3. Fill PDF
+    def _insert_values(self, field_map: Dict) -> Tuple[int, int]:
         filled_count = 0
         skipped_count = 0
         
@@ -217,39 +638,292 @@ class FormAutofiller:
                 
             page = self.doc[page_num]
             
-            for key, coords in fields.items():
-                if key in self.data:
-                    value = self.data[key]
-                    try:
-                        # Insert text
-                        page.insert_text(
-                            (coords['x'], coords['y']),
-                            str(value),
-                            fontsize=coords.get('fontsize', 11),
-                            color=(0, 0, 1) # Blue color to distinguish filled text
-                        )
-                        filled_count += 1
-                    except Exception as e:
-                        logger.error(f"Error filling '{key}': {e}")
+            with self._stage("insert_text", page_num):
+                for key, coords in fields.items():
+                    if key in self.data:
+                        value = self.data[key]
+                        try:
+                            # Insert text
+                            page.insert_text(
+                                (coords['x'], coords['y']),
+                                str(value),
+                                fontsize=coords.get('fontsize', 11),
+                                color=(0, 0, 1) # Blue color to distinguish filled text
+                            )
+                            filled_count += 1
+                        except Exception as e:
+                            logger.error(f"Error filling '{key}': {e}")
+                            skipped_count += 1
+                    else:
                         skipped_count += 1
-                else:
-                    skipped_count += 1
 
-        # 4. Save Output
-        output_path = self.pdf_path.replace(".pdf", "_filled.pdf")
-        self.doc.save(output_path)
+        return filled_count, skipped_count
+
+    def run(self, output_path: Optional[str] = None) -> Optional[str]:
+        """Main execution method; returns the output path, or None when no fields were found.
+
+        The output defaults to <input>_filled.pdf next to a path input;
+        PDFs given as bytes need an output_path.
+        """
+        if output_path is None:
+            if self.pdf_path is None:
+                raise ValueError("A PDF given as bytes needs an output_path")
+            output_path = f"{os.path.splitext(self.pdf_path)[0]}_filled.pdf"
+
+        # 1. Check for template, 2. run OCR if there is none
+        field_map = self.get_field_map()
+        if not field_map:
+            return None
+
+        # 3. Fill PDF, 4. save output
+        filled_count, _ = self.fill(field_map, output_path)
         logger.info(f"Done! Filled {filled_count} fields. Output saved to: {output_path}")
+        return output_path
+
+
+def autofill_bytes(pdf: PdfSource, data: Dict[str, str], **options) -> Optional[bytes]:
+    """Fills a PDF given as bytes, a binary file object or a path; returns the filled PDF bytes.
+
+    None when no fields were found. options go to FormAutofiller (pdf_hash,
+    ocr_mode, ocr_backend, on_event).
+    """
+    with FormAutofiller(pdf, data, **options) as agent:
+        field_map = agent.get_field_map()
+        if not field_map:
+            return None
+        return agent.fill_bytes(field_map)
+
+
+def file_hash(path: str) -> str:
+    """SHA256 of a file, read in chunks."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def read_json_lines(path: str) -> List:
+    """Items of a JSON array, a single JSON object or NDJSON ("-" reads stdin)."""
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, "r") as f:
+            text = f.read()
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return parsed if isinstance(parsed, list) else [parsed]
+
+
+def load_manifest(path: str) -> List[Tuple[str, Dict]]:
+    """(pdf, data) pairs from a manifest of {"pdf", "data"} or {"pdf", "data_file"} entries.
+
+    Relative paths are resolved against the manifest's directory.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path)) if path != "-" else os.getcwd()
+    jobs = []
+    for entry in read_json_lines(path):
+        pdf_path = os.path.join(base_dir, entry["pdf"])
+        data = entry.get("data")
+        if data is None:
+            with open(os.path.join(base_dir, entry["data_file"]), "r") as f:
+                data = json.load(f)
+        jobs.append((pdf_path, data))
+    return jobs
+
+
+class OutputNames:
+    """Hands out <stem>_filled.pdf, <stem>_filled_2.pdf, ... in a directory.
+
+    Each name is claimed by creating the file exclusively, so neither jobs
+    in the same batch nor files from earlier runs are ever overwritten.
+    """
+
+    def __init__(self, out_dir: str, name_key: Optional[str] = None):
+        self.out_dir = out_dir
+        self.name_key = name_key
+        self.next_number: Dict[str, int] = {}
+
+    def stem(self, pdf_path: str, data: Dict) -> str:
+        stem = os.path.splitext(os.path.basename(pdf_path))[0]
+        if self.name_key and data.get(self.name_key):
+            label = re.sub(r"[^\w.-]+", "_", str(data[self.name_key])).strip("_.")
+            if label:
+                stem = f"{stem}_{label}"
+        return stem
+
+    def reserve(self, pdf_path: str, data: Dict) -> str:
+        stem = self.stem(pdf_path, data)
+        number = self.next_number.get(stem, 1)
+        while True:
+            suffix = "" if number == 1 else f"_{number}"
+            path = os.path.join(self.out_dir, f"{stem}_filled{suffix}.pdf")
+            number += 1
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                continue
+            self.next_number[stem] = number
+            return path
+
+
+def _detect_fields(form: Tuple[str, str, List[str], str, str]) -> Tuple[str, Optional[Dict]]:
+    """Field map for one unique form, looking up (or OCRing) the union of its records' keys."""
+    pdf_path, pdf_hash, keys, ocr_mode, ocr_backend = form
+    with FormAutofiller(pdf_path, {key: "" for key in keys}, pdf_hash, ocr_mode, ocr_backend) as agent:
+        try:
+            return pdf_hash, agent.get_field_map()
+        except Exception as e:
+            logger.error(f"OCR failed for {pdf_path}: {e}")
+            return pdf_hash, None
+
+
+def _fill_job(job: Tuple[int, str, str, Dict, Dict, str]) -> Dict:
+    index, pdf_path, pdf_hash, data, field_map, output_path = job
+    result = {"index": index, "pdf": pdf_path, "output": output_path}
+    try:
+        with FormAutofiller(pdf_path, data, pdf_hash) as agent:
+            result["filled"], result["skipped"] = agent.fill(field_map, output_path)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def run_batch(jobs: List[Tuple[str, Dict]], out_dir: str, workers: int = 1,
+              name_key: Optional[str] = None, ocr_mode: str = OCR_MODE,
+              ocr_backend: Optional[str] = None) -> List[Dict]:
+    """Fills many (pdf, data) pairs into out_dir; returns one result dict per job, in order.
+
+    Jobs are grouped by PDF content, so each unique form is looked up in the
+    template cache (or OCRed, for the union of its records' keys) once.
+    Detection and filling both run on a process pool of `workers`.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    os.makedirs(TEMPLATE_DIR, exist_ok=True)
+
+    hashes: Dict[str, Optional[str]] = {}
+    forms: Dict[str, Tuple[str, set]] = {}
+    for pdf_path, data in jobs:
+        pdf_path = os.path.abspath(pdf_path)
+        if pdf_path not in hashes:
+            try:
+                hashes[pdf_path] = file_hash(pdf_path)
+            except OSError as e:
+                logger.error(f"Could not read {pdf_path}: {e}")
+                hashes[pdf_path] = None
+                continue
+        if hashes[pdf_path]:
+            _, keys = forms.setdefault(hashes[pdf_path], (pdf_path, set()))
+            keys.update(data.keys())
+
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    pool_map = executor.map if executor else map
+    try:
+        unique_forms = [(path, pdf_hash, sorted(keys), ocr_mode, ocr_backend)
+                        for pdf_hash, (path, keys) in forms.items()]
+        field_maps = dict(pool_map(_detect_fields, unique_forms))
+        logger.info(f"{len(jobs)} jobs over {len(forms)} unique forms")
+
+        names = OutputNames(out_dir, name_key)
+        results: List[Optional[Dict]] = [None] * len(jobs)
+        tasks = []
+        for index, (pdf_path, data) in enumerate(jobs):
+            pdf_path = os.path.abspath(pdf_path)
+            if not hashes[pdf_path]:
+                results[index] = {"index": index, "pdf": pdf_path, "output": None,
+                                  "error": "Could not read the PDF."}
+                continue
+            field_map = field_maps[hashes[pdf_path]]
+            if not field_map:
+                results[index] = {"index": index, "pdf": pdf_path, "output": None,
+                                  "error": "No fields found via OCR."}
+                continue
+            tasks.append((index, pdf_path, hashes[pdf_path], data, field_map, names.reserve(pdf_path, data)))
+
+        if executor:
+            fills = executor.map(_fill_job, tasks, chunksize=max(1, len(tasks) // (workers * 8)))
+        else:
+            fills = map(_fill_job, tasks)
+        for result in fills:
+            if "error" in result:
+                logger.error(f"Job {result['index']} ({result['pdf']}) failed: {result['error']}")
+                os.unlink(result["output"])
+                result["output"] = None
+            results[result["index"]] = result
+    finally:
+        if executor:
+            executor.shutdown()
+    return results
+
 
 def main():
     parser = argparse.ArgumentParser(description="Autofill flattened PDF forms.")
-    parser.add_argument("pdf_file", help="Path to the input PDF file")
-    parser.add_argument("data_file", help="Path to the JSON data file")
+    parser.add_argument("pdf_file", nargs="?", help="Path to the input PDF file (- reads it from stdin)")
+    parser.add_argument("data_file", nargs="?", help="Path to the JSON data file")
+    parser.add_argument("-o", "--output",
+                        help="Filled PDF path (default: <pdf_file>_filled.pdf); - streams it to stdout, "
+                             "the default when pdf_file is -")
+    parser.add_argument("--ocr", choices=("adaptive", "fixed"), default=OCR_MODE,
+                        help="adaptive: OCR text regions only; fixed: OCR whole pages (default: %(default)s)")
+    parser.add_argument("--ocr-backend", choices=("auto", "tesserocr", "pipe", "pytesseract"), default=DEFAULT_BACKEND,
+                        help="OCR engine; auto uses tesserocr when installed (default: %(default)s)")
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument("--manifest", help='JSON array or NDJSON of {"pdf", "data" or "data_file"} entries')
+    batch.add_argument("--form", help="One PDF form, filled once per record in --records")
+    batch.add_argument("--records", default="-", help="NDJSON or JSON array of data records for --form (default: stdin)")
+    batch.add_argument("--out", default="filled", help="Output directory (default: filled)")
+    batch.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    batch.add_argument("--name-key", help="Data key whose value goes into each output file name")
+    profiling = parser.add_argument_group("profiling")
+    profiling.add_argument("--profile", action="store_true",
+                           help="Print time and RSS growth per stage (hash, rasterize, ocr, match, save, ...)")
+    profiling.add_argument("--profile-memory", action="store_true",
+                           help="Also trace Python allocation peaks per stage (slows Python-heavy stages)")
+    profiling.add_argument("--trace", metavar="FILE", help="Write the stage events as JSON (implies --profile)")
+    profiling.add_argument("--cprofile", metavar="FILE",
+                           help="Write cProfile stats for pstats or snakeviz (implies --profile)")
     
     args = parser.parse_args()
+    profiling = args.profile or args.profile_memory or args.trace or args.cprofile
+
+    if args.manifest or args.form:
+        if profiling:
+            parser.error("profiling covers a single form; run it on one pdf_file and data_file")
+        if args.output:
+            parser.error("--output is for a single form; batch mode writes to --out")
+        try:
+            if args.manifest:
+                jobs = load_manifest(args.manifest)
+            else:
+                jobs = [(args.form, record) for record in read_json_lines(args.records)]
+        except (OSError, KeyError, json.JSONDecodeError) as e:
+            print(f"Error: Could not read batch input: {e}")
+            sys.exit(1)
+
+        results = run_batch(jobs, args.out, args.workers, args.name_key, args.ocr, args.ocr_backend)
+        with open(os.path.join(args.out, "batch_report.json"), "w") as f:
+            json.dump(results, f, indent=2)
+        failed = sum(1 for result in results if result.get("error"))
+        logger.info(f"Done! Filled {len(results) - failed} of {len(results)} forms into {args.out}")
+        sys.exit(1 if failed else 0)
+
+    if not args.pdf_file or not args.data_file:
+        parser.error("pdf_file and data_file are required outside batch mode")
     
-    if not os.path.exists(args.pdf_file):
+    if args.pdf_file == "-":
+        pdf_source: PdfSource = sys.stdin.buffer.read()
+        args.output = args.output or "-"
+    elif not os.path.exists(args.pdf_file):
         print(f"Error: PDF file '{args.pdf_file}' not found.")
         sys.exit(1)
+    else:
+        pdf_source = args.pdf_file
+    if args.output == "-":
+        # PyMuPDF prints its messages on stdout, where the filled PDF goes; fitz
+        # may well have been imported before this module, so redirect them now
+        fitz.set_messages(stream=sys.stderr)
         
     if not os.path.exists(args.data_file):
         print(f"Error: Data file '{args.data_file}' not found.")
@@ -262,8 +936,56 @@ def main():
         print("Error: Invalid JSON in data file.")
         sys.exit(1)
 
-    agent = FormAutofiller(args.pdf_file, data)
-    agent.run()
+    def fill_form(agent: FormAutofiller) -> bool:
+        if args.output != "-":
+            return agent.run(args.output) is not None
+        field_map = agent.get_field_map()
+        if not field_map:
+            return False
+        sys.stdout.buffer.write(agent.fill_bytes(field_map))
+        sys.stdout.flush()
+        return True
+
+    if not profiling:
+        with FormAutofiller(pdf_source, data, ocr_mode=args.ocr, ocr_backend=args.ocr_backend) as agent:
+            try:
+                filled = fill_form(agent)
+            except RasterizeError as e:
+                logger.error(str(e))
+                sys.exit(1)
+        if not filled:
+            sys.exit(1)
+        return
+
+    # Keep stdout for the PDF when it is streamed there
+    report = sys.stderr if args.output == "-" else sys.stdout
+    profile = StageProfile()
+    profiler = cProfile.Profile() if args.cprofile else None
+    if args.profile_memory:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+    try:
+        with FormAutofiller(pdf_source, data, ocr_mode=args.ocr, ocr_backend=args.ocr_backend,
+                            on_event=profile) as agent:
+            filled = fill_form(agent)
+    except RasterizeError as e:
+        logger.error(str(e))
+        filled = False
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        tracemalloc.stop()
+        print(profile.summary(), file=report)
+        if args.trace:
+            profile.write_trace(args.trace)
+            print(f"Stage trace written to {args.trace}", file=report)
+        if args.cprofile:
+            print(f"cProfile stats written to {args.cprofile}", file=report)
+    if not filled:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,416 @@
+"""
+Autofill Jobs
+FormAutofiller runs on uploaded forms, in the background. OCR of a
+multi-page scan takes far longer than a request may, so an upload only
+stores the files and queues a job:
+
+    POST /api/autofill/jobs                  multipart: pdf, optional data (JSON file or text)
+                                             -> 202 with the job status
+    GET  /api/autofill/jobs/<id>             job status
+    GET  /api/autofill/jobs/<id>/events      Server-Sent Events: the job status after every change
+    GET  /api/autofill/jobs/<id>/download    the filled PDF, once the job is done
+
+Without data the form is filled from the saved profile (user_profile.json,
+or the file named by AUTOFILL_PROFILE). A job goes queued -> running ->
+done or failed; while running, pages_done counts the pages OCR has read
+out of pages (all of them at once when the form's template is cached).
+Job IDs are random and are the only key to a job's files.
+
+Jobs and their status events are rows in a SQLite database in the upload
+folder, so every process serving the app sees every job and an event
+stream can resume from Last-Event-ID. Jobs run on a pool of
+AUTOFILL_JOB_WORKERS threads (default 2) in the process that accepted
+them. Rasterizing runs in-process, and so does OCR when the tesserocr
+backend is installed, so a running job competes with request threads for
+the GIL; set AUTOFILL_OCR_BACKEND=pipe to keep OCR in tesseract
+subprocesses, or keep the pool small. Jobs left queued or running by a
+process that died are marked failed on the next start, and finished jobs
+and their files are removed after AUTOFILL_JOB_TTL seconds (default a
+day).
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from receipt_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_PATH = os.environ.get('AUTOFILL_PROFILE', os.path.join(BASE_DIR, 'user_profile.json'))
+JOB_WORKERS = int(os.environ.get('AUTOFILL_JOB_WORKERS', '2'))
+JOB_TTL_SECONDS = float(os.environ.get('AUTOFILL_JOB_TTL', str(24 * 3600)))
+MAX_UPLOAD_MB = float(os.environ.get('AUTOFILL_MAX_UPLOAD_MB', '50'))
+
+# Event streams poll the database; a comment line keeps idle proxies from closing them
+EVENT_POLL_SECONDS = 0.25
+KEEPALIVE_SECONDS = 15
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+FINAL_STATES = ('done', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    pages INTEGER,
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    filled INTEGER,
+    error TEXT,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+STATUS_COLUMNS = ('id', 'state', 'filename', 'pages', 'pages_done', 'filled', 'error', 'created', 'updated')
+UPDATABLE_COLUMNS = ('state', 'pages', 'pages_done', 'filled', 'error')
+
+
+class AutofillJobError(ValueError):
+    """A bad upload or profile, or a form the job couldn't fill; the message is safe to show."""
+
+
+# ============ Profile ============
+
+def parse_data(raw):
+    """A JSON object of label -> value, from text or bytes."""
+    try:
+        data = json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        raise AutofillJobError('Data must be valid JSON.')
+    if not isinstance(data, dict) or not data:
+        raise AutofillJobError('Data must be a non-empty JSON object of label -> value.')
+    if not all(isinstance(value, (str, int, float)) for value in data.values()):
+        raise AutofillJobError('Data values must be text or numbers.')
+    return data
+
+
+def load_profile(path=None):
+    try:
+        with open(path or PROFILE_PATH, encoding='utf-8') as f:
+            return parse_data(f.read())
+    except FileNotFoundError:
+        raise AutofillJobError('No saved profile; save one or upload data with the form.')
+
+
+def save_profile(raw, path=None):
+    """Validate and save profile JSON; returns the data."""
+    data = parse_data(raw)
+    path = path or PROFILE_PATH
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return data
+
+
+# ============ Job Store ============
+
+class JobStore:
+    """Jobs and their status events in a SQLite database.
+
+    Each call opens its own short-lived connection, so one store can be
+    shared by threads and by forked worker processes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with self._db() as db:
+            # Lets event streams read while a job writes
+            db.execute('PRAGMA journal_mode=WAL')
+            db.executescript(SCHEMA)
+
+    @contextmanager
+    def _db(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def _status(row):
+        return {column: row[column] for column in STATUS_COLUMNS}
+
+    def _publish(self, db, job_id):
+        """Append the job's current status as its next event."""
+        row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        db.execute('INSERT INTO events (job_id, seq, status) '
+                   'SELECT ?, COALESCE(MAX(seq), 0) + 1, ? FROM events WHERE job_id = ?',
+                   (job_id, json.dumps(self._status(row)), job_id))
+
+    def create(self, job_id, filename):
+        now = time.time()
+        with self._db() as db:
+            db.execute('INSERT INTO jobs (id, state, filename, host, pid, created, updated) '
+                       'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (job_id, 'queued', filename, socket.gethostname(), os.getpid(), now, now))
+            self._publish(db, job_id)
+
+    def update(self, job_id, **fields):
+        assert fields and set(fields) <= set(UPDATABLE_COLUMNS), fields
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        with self._db() as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is None or all(row[column] == value for column, value in fields.items()):
+                return
+            db.execute(f'UPDATE jobs SET {assignments}, updated = ? WHERE id = ?',
+                       (*fields.values(), time.time(), job_id))
+            self._publish(db, job_id)
+
+    def get(self, job_id):
+        with self._db() as db:
+            row = db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._status(row) if row else None
+
+    def events(self, job_id, after=0):
+        """[(seq, status JSON)] of the job's events after seq `after`."""
+        with self._db() as db:
+            return [tuple(row) for row in db.execute(
+                'SELECT seq, status FROM events WHERE job_id = ? AND seq > ? ORDER BY seq', (job_id, after))]
+
+    def recover(self):
+        """Fail the unfinished jobs of processes on this host that no longer exist."""
+        with self._db() as db:
+            rows = db.execute('SELECT id, pid FROM jobs WHERE state NOT IN (?, ?) AND host = ?',
+                              (*FINAL_STATES, socket.gethostname())).fetchall()
+        for job_id, pid in rows:
+            if not _process_alive(pid):
+                logger.warning(f"Autofill job {job_id} was interrupted (process {pid} is gone)")
+                self.update(job_id, state='failed', error='Interrupted by a server restart; upload the form again.')
+
+    def expire(self, ttl):
+        """Delete finished jobs last updated more than ttl seconds ago; returns their IDs."""
+        cutoff = time.time() - ttl
+        with self._db() as db:
+            ids = [row[0] for row in db.execute(
+                'SELECT id FROM jobs WHERE state IN (?, ?) AND updated < ?', (*FINAL_STATES, cutoff))]
+            for job_id in ids:
+                db.execute('DELETE FROM events WHERE job_id = ?', (job_id,))
+                db.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        return ids
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# ============ Worker Pool ============
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """This process's job pool, created on first use (and again in a forked child)."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(JOB_WORKERS, thread_name_prefix='autofill')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+class _PageProgress:
+    """FormAutofiller on_event hook: records each page whose fields have been matched."""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def __call__(self, event):
+        if event['stage'] == 'match' and event['page'] is not None:
+            self.store.update(self.job_id, pages_done=event['page'] + 1)
+
+
+def run_job(store, job_id, pdf_path, data, output_path):
+    """Fill one uploaded form; the outcome is recorded in the store, never raised."""
+    # Imported here so the web app only loads OCR and Poppler bindings once a job runs
+    from autofill import FormAutofiller, RasterizeError
+
+    try:
+        with FormAutofiller(pdf_path, data, on_event=_PageProgress(store, job_id)) as agent:
+            pages = len(agent.doc)
+            store.update(job_id, state='running', pages=pages)
+            field_map = agent.get_field_map()
+            if not field_map:
+                raise AutofillJobError('No form fields were found in this PDF.')
+            store.update(job_id, pages_done=pages)
+            filled, _ = agent.fill(field_map, output_path)
+        if not filled:
+            raise AutofillJobError('None of the data labels appear on this form.')
+    except AutofillJobError as e:
+        error = str(e)
+    except RasterizeError as e:
+        logger.error(f"Autofill job {job_id} failed: {e}")
+        error = 'Could not read this PDF.'
+    except Exception as e:
+        logger.error(f"Autofill job {job_id} failed: {e}")
+        error = 'Could not fill this PDF.'
+    else:
+        store.update(job_id, state='done', filled=filled)
+        METRICS.inc('receipt_autofill_jobs_total', state='done')
+        logger.info(f"Autofill job {job_id}: filled {filled} fields")
+        return
+
+    store.update(job_id, state='failed', error=error)
+    METRICS.inc('receipt_autofill_jobs_total', state='failed')
+    try:
+        os.unlink(output_path)
+    except FileNotFoundError:
+        pass
+
+
+# ============ Routes ============
+
+def install(app, upload_folder, output_folder, db_path=None):
+    """Register the job routes on a Flask app; returns the JobStore.
+
+    Uploads and the database go in <upload_folder>/autofill, filled PDFs
+    in <output_folder>/autofill.
+    """
+    from flask import request, jsonify, Response, send_file, url_for
+    from werkzeug.utils import secure_filename
+
+    # Absolute, since jobs write relative to the working directory but send_file reads relative to the app
+    upload_dir = os.path.abspath(os.path.join(upload_folder, 'autofill'))
+    output_dir = os.path.abspath(os.path.join(output_folder, 'autofill'))
+    os.makedirs(upload_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    store = JobStore(db_path or os.environ.get('AUTOFILL_JOBS_DB') or os.path.join(upload_dir, 'jobs.sqlite3'))
+    store.recover()
+
+    def upload_path(job_id):
+        return os.path.join(upload_dir, f'{job_id}.pdf')
+
+    def output_path(job_id):
+        return os.path.join(output_dir, f'{job_id}.pdf')
+
+    def remove_expired():
+        for job_id in store.expire(JOB_TTL_SECONDS):
+            for path in (upload_path(job_id), output_path(job_id)):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def find_job(job_id):
+        return store.get(job_id) if JOB_ID_PATTERN.match(job_id) else None
+
+    def with_links(job):
+        job = dict(job, status_url=url_for('autofill_job', job_id=job['id']),
+                   events_url=url_for('autofill_job_events', job_id=job['id']))
+        if job['state'] == 'done':
+            job['download_url'] = url_for('autofill_job_download', job_id=job['id'])
+        return job
+
+    def read_data():
+        upload = request.files.get('data')
+        if upload is not None and upload.filename:
+            return parse_data(upload.read())
+        if request.form.get('data', '').strip():
+            return parse_data(request.form['data'])
+        return load_profile()
+
+    def create_job():
+        if request.content_length and request.content_length > MAX_UPLOAD_MB * 1024 * 1024:
+            return jsonify(error=f'Uploads are limited to {MAX_UPLOAD_MB:g} MB.'), 413
+        upload = request.files.get('pdf')
+        if upload is None or not upload.filename:
+            return jsonify(error='Upload the form PDF as "pdf".'), 400
+        pdf_bytes = upload.read()
+        # The header may follow up to 1KB of junk
+        if b'%PDF-' not in pdf_bytes[:1024]:
+            return jsonify(error='The uploaded form is not a PDF.'), 400
+        try:
+            data = read_data()
+        except AutofillJobError as e:
+            return jsonify(error=str(e)), 400
+
+        remove_expired()
+        job_id = uuid.uuid4().hex
+        with open(upload_path(job_id), 'wb') as f:
+            f.write(pdf_bytes)
+        store.create(job_id, secure_filename(upload.filename) or 'form.pdf')
+        executor().submit(run_job, store, job_id, upload_path(job_id), data, output_path(job_id))
+        METRICS.inc('receipt_autofill_jobs_total', state='queued')
+
+        job = with_links(store.get(job_id))
+        return jsonify(job), 202, {'Location': job['status_url']}
+
+    def autofill_job(job_id):
+        job = find_job(job_id)
+        if job is None:
+            return jsonify(error='Unknown job.'), 404
+        return jsonify(with_links(job))
+
+    def autofill_job_events(job_id):
+        if find_job(job_id) is None:
+            return jsonify(error='Unknown job.'), 404
+        # EventSource sends the last ID it saw when it reconnects
+        after = request.headers.get('Last-Event-ID', 0, type=int)
+
+        def stream(seq):
+            yield 'retry: 1000\n\n'
+            quiet_since = time.monotonic()
+            while True:
+                events = store.events(job_id, seq)
+                for seq, status in events:
+                    yield f'id: {seq}\ndata: {status}\n\n'
+                if events:
+                    quiet_since = time.monotonic()
+                    if json.loads(events[-1][1])['state'] in FINAL_STATES:
+                        return
+                else:
+                    job = store.get(job_id)
+                    if job is None or job['state'] in FINAL_STATES:
+                        return  # finished before this stream resumed, or expired
+                    if time.monotonic() - quiet_since > KEEPALIVE_SECONDS:
+                        yield ': keepalive\n\n'
+                        quiet_since = time.monotonic()
+                time.sleep(EVENT_POLL_SECONDS)
+
+        return Response(stream(after), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    def autofill_job_download(job_id):
+        job = find_job(job_id)
+        if job is None:
+            return jsonify(error='Unknown job.'), 404
+        if job['state'] != 'done':
+            return jsonify(error=f'The job is {job["state"]}.', state=job['state']), 409
+        stem = os.path.splitext(job['filename'])[0]
+        return send_file(output_path(job_id), mimetype='application/pdf', as_attachment=True,
+                         download_name=f'{stem}_filled.pdf')
+
+    app.add_url_rule('/api/autofill/jobs', 'autofill_jobs', create_job, methods=['POST'])
+    app.add_url_rule('/api/autofill/jobs/<job_id>', 'autofill_job', autofill_job)
+    app.add_url_rule('/api/autofill/jobs/<job_id>/events', 'autofill_job_events', autofill_job_events)
+    app.add_url_rule('/api/autofill/jobs/<job_id>/download', 'autofill_job_download', autofill_job_download)
+    return store
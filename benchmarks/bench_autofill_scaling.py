@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+How FormAutofiller scales with pages and labels.
+
+For every (pages, keys) point of the grid a synthetic form is generated
+with setup_test.generate_form, and each phase is timed, with its Python
+peak memory from tracemalloc:
+
+- ocr: field detection's OCR pass (needs tesseract; skipped otherwise)
+- match: matching the data keys against the OCR lines (_match_fields);
+  without tesseract the lines come from the form's text layer instead
+- cache_hit: a new FormAutofiller loading the saved template from
+  ocr_cache/ (the in-process copy is dropped first)
+- fill: writing the values and saving the filled PDF
+
+The log-log slope of each phase against pages and against keys is printed
+too: about 1 is linear, clearly above 1 is superlinear. --plot draws time
+and peak memory against both axes (needs matplotlib).
+
+Usage:
+    python benchmarks/bench_autofill_scaling.py --pages 1,2,4,8 --keys 5,10,20,40 --plot scaling.png
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import numpy as np  # noqa: E402
+import pytesseract  # noqa: E402
+
+import autofill  # noqa: E402
+import setup_test  # noqa: E402
+
+PHASES = ('ocr', 'match', 'cache_hit', 'fill')
+
+
+def text_layer_lines(doc):
+    """OCR-style lines (word boxes in points) per page, from the PDF's own text."""
+    pages = []
+    for page in doc:
+        lines = {}
+        for x0, y0, x1, y1, text, block, line, _ in page.get_text('words'):
+            lines.setdefault((block, line), []).append(
+                {'text': text, 'left': x0, 'top': y0, 'width': x1 - x0, 'height': y1 - y0})
+        pages.append(list(lines.values()))
+    return pages
+
+
+def timed(func, repeat):
+    """(median ms, tracemalloc peak KB, last result) of func() over `repeat` runs plus one traced run."""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(samples), peak / 1024, result
+
+
+def measure(tmp, pages, keys, args, ocr_available):
+    pdf_path = os.path.join(tmp, f'form_{pages}x{keys}.pdf')
+    data = setup_test.generate_form(pdf_path, pages, keys, args.raster, args.noise, seed=args.seed)
+    agent = autofill.FormAutofiller(pdf_path, data, ocr_mode=args.ocr)
+    result = {'pages': pages, 'keys': keys}
+
+    if ocr_available:
+        ocr_pages = agent._ocr_pages_fixed if args.ocr == 'fixed' else agent._ocr_pages_adaptive
+        result['ocr_ms'], result['ocr_peak_kb'], lines = timed(lambda: list(ocr_pages()), 1)
+    else:
+        lines = text_layer_lines(agent.doc)
+
+    def match():
+        return {str(p): fields for p, page_lines in enumerate(lines)
+                if (fields := agent._match_fields(page_lines, p))}
+
+    result['match_ms'], result['match_peak_kb'], field_map = timed(match, args.repeat)
+    result['found'] = sum(len(fields) for fields in field_map.values())
+    agent._save_template(field_map)
+
+    def cache_hit():
+        autofill._field_maps.clear()
+        with autofill.FormAutofiller(pdf_path, data) as cached:
+            return cached.get_field_map()
+
+    result['cache_hit_ms'], result['cache_hit_peak_kb'], _ = timed(cache_hit, args.repeat)
+
+    output_path = os.path.join(tmp, 'filled.pdf')
+
+    def fill():
+        with autofill.FormAutofiller(pdf_path, data, agent.pdf_hash) as filler:
+            return filler.fill(field_map, output_path)
+
+    result['fill_ms'], result['fill_peak_kb'], _ = timed(fill, args.repeat)
+    agent.close()
+    return result
+
+
+def slope(results, axis, fixed_axis, fixed_value, metric):
+    """Log-log slope of `metric` along `axis` with the other axis held at fixed_value."""
+    points = [(r[axis], r[metric]) for r in results if r[fixed_axis] == fixed_value and r.get(metric)]
+    if len(points) < 2:
+        return None
+    x, y = np.log([p[0] for p in points]), np.log([p[1] for p in points])
+    return float(np.polyfit(x, y, 1)[0])
+
+
+def plot(results, pages_grid, keys_grid, path):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not installed; skipping the plot (pip install matplotlib)")
+        return
+
+    fig, axes = plt.subplots(2, 2, figsize=(11, 8))
+    for col, (axis, fixed_axis, fixed_value) in enumerate((('pages', 'keys', max(keys_grid)),
+                                                           ('keys', 'pages', max(pages_grid)))):
+        subset = sorted((r for r in results if r[fixed_axis] == fixed_value), key=lambda r: r[axis])
+        for row, (suffix, label) in enumerate((('_ms', 'time (ms)'), ('_peak_kb', 'Python peak memory (KB)'))):
+            ax = axes[row][col]
+            for phase in PHASES:
+                points = [(r[axis], r[phase + suffix]) for r in subset if phase + suffix in r]
+                if points:
+                    ax.plot(*zip(*points), marker='o', label=phase)
+            ax.set_xscale('log')
+            ax.set_yscale('log')
+            ax.set_xlabel(f'{axis} ({fixed_axis} = {fixed_value})')
+            ax.set_ylabel(label)
+            ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    print(f"Plot saved to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FormAutofiller scaling benchmark.")
+    parser.add_argument("--pages", default="1,2,4,8", help="Comma-separated page counts")
+    parser.add_argument("--keys", default="5,10,20,40", help="Comma-separated labels per page")
+    parser.add_argument("--raster", type=float, default=0.0, help="Share of image-only pages (needs tesseract)")
+    parser.add_argument("--noise", type=float, default=0.0, help="Noise on image-only pages (0-1)")
+    parser.add_argument("--ocr", choices=("adaptive", "fixed"), default=autofill.OCR_MODE)
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per phase (OCR runs once)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON")
+    parser.add_argument("--plot", help="Save a PNG of time and memory against pages and keys")
+    args = parser.parse_args()
+
+    pages_grid = [int(n) for n in args.pages.split(',')]
+    keys_grid = [int(n) for n in args.keys.split(',')]
+    ocr_available = shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+    if not ocr_available:
+        print("tesseract is not on PATH: skipping the OCR phase, matching against the text layer")
+        if args.raster:
+            parser.error("--raster needs tesseract: image-only pages have no text layer to match")
+    logging.getLogger('autofill').setLevel(logging.ERROR)
+
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # The template cache (ocr_cache/) is relative to the working directory
+        os.chdir(tmp)
+        try:
+            print(f"{'pages':>5} {'keys':>5} {'found':>6} "
+                  + " ".join(f"{phase + ' ms':>12}" for phase in PHASES) + f" {'peak KB (max)':>14}")
+            for pages in pages_grid:
+                for keys in keys_grid:
+                    result = measure(tmp, pages, keys, args, ocr_available)
+                    results.append(result)
+                    times = " ".join(f"{result[phase + '_ms']:>12.2f}" if phase + '_ms' in result else f"{'-':>12}"
+                                     for phase in PHASES)
+                    peak = max(result[phase + '_peak_kb'] for phase in PHASES if phase + '_peak_kb' in result)
+                    print(f"{pages:>5} {keys:>5} {result['found']:>6} {times} {peak:>14.0f}")
+        finally:
+            os.chdir(cwd)
+
+    print("\nLog-log slope of time (1 = linear):")
+    for phase in PHASES:
+        by_pages = slope(results, 'pages', 'keys', max(keys_grid), phase + '_ms')
+        by_keys = slope(results, 'keys', 'pages', max(pages_grid), phase + '_ms')
+        if by_pages is None and by_keys is None:
+            continue
+        text = [f"pages^{by_pages:.2f}" if by_pages is not None else "",
+                f"keys/page^{by_keys:.2f}" if by_keys is not None else ""]
+        print(f"  {phase:<10} " + "  ".join(t for t in text if t))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.plot:
+        plot(results, pages_grid, keys_grid, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Typeahead search latency of the consignee directory at scale.
+
+Builds a synthetic directory (100k entries by default), written to CSV or
+SQLite and loaded through the same path the app uses, then times searches
+by query kind:
+
+- prefix: first characters of a name, as typed ("sim", "simula p")
+- word:   start of a later word ("glor" for "Ayala Glorietta")
+- fuzzy:  a name with one character dropped ("simla ph")
+- miss:   nothing matches
+
+Each query is timed uncached (ConsigneeDirectory.search) and through the
+memoized lookup() the endpoint uses, after one warm-up call.
+
+Usage:
+    python benchmarks/bench_consignee_search.py --entries 100000 --queries 2000
+    python benchmarks/bench_consignee_search.py --format sqlite
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import consignee_directory  # noqa: E402
+
+SYLLABLES = [onset + vowel + coda for onset in ('', 'b', 'd', 'g', 'h', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'w', 'y')
+             for vowel in 'aeiou' for coda in ('', 'n', 'ng', 'r', 's')]
+# Words shared by many business names, as in a real directory
+COMMON = ['PH', 'Inc', 'Trading', 'Store', 'Foods', 'Mart', 'Supply', 'Corp', 'Kitchen',
+          'Manila', 'Makati', 'Pasig', 'Cafe', 'Niño']
+CITIES = ['Makati', 'Pasig City', 'Quezon City', 'Caloocan', 'Taguig', 'Mandaluyong']
+
+
+def synthetic_entries(count, seed=0):
+    rng = random.Random(seed)
+    vocabulary = sorted({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+                         for _ in range(count // 4)})
+    seen = set()
+    while len(seen) < count:
+        words = rng.sample(vocabulary, rng.randint(1, 3))
+        if rng.random() < 0.6:
+            words.append(rng.choice(COMMON))
+        name = ' '.join(words)
+        if name in seen:
+            continue
+        seen.add(name)
+        yield name, f'{rng.randint(1, 999)} {rng.choice(vocabulary)} St., {rng.choice(CITIES)}'
+
+
+def write_csv(entries, path):
+    import csv
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'location'])
+        writer.writerows(entries)
+
+
+def write_sqlite(entries, path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE consignees (name TEXT PRIMARY KEY, location TEXT)')
+    conn.executemany('INSERT INTO consignees VALUES (?, ?)', entries)
+    conn.commit()
+    conn.close()
+
+
+def make_queries(names, count, seed=1):
+    rng = random.Random(seed)
+    queries = {'prefix': [], 'word': [], 'fuzzy': [], 'miss': []}
+    for _ in range(count):
+        name = rng.choice(names)
+        queries['prefix'].append(name[:rng.randint(1, 8)])
+        words = name.split()
+        queries['word'].append(rng.choice(words[1:] or words)[:rng.randint(2, 5)])
+        drop = rng.randrange(1, len(words[0]))
+        queries['fuzzy'].append(name[:drop] + name[drop + 1:])
+        queries['miss'].append(''.join(rng.choice('qxzjv') for _ in range(rng.randint(3, 6))))
+    return queries
+
+
+def time_calls(fn, queries):
+    samples = []
+    for query in queries:
+        t0 = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - t0) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1], samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consignee directory search benchmark.")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000, help="Queries per kind")
+    parser.add_argument("--format", choices=("csv", "sqlite"), default="csv")
+    parser.add_argument("--limit", type=int, default=consignee_directory.DEFAULT_LIMIT)
+    args = parser.parse_args()
+
+    entries = list(synthetic_entries(args.entries))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'consignees.' + ('csv' if args.format == 'csv' else 'db'))
+        (write_csv if args.format == 'csv' else write_sqlite)(entries, path)
+        t0 = time.perf_counter()
+        directory = consignee_directory.load_directory(path)
+        load_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"{len(directory)} entries from {args.format}: loaded and indexed in {load_ms:.0f} ms "
+          f"({len(directory.trigram_postings)} trigrams, {len(directory.word_keys)} word keys)")
+
+    queries = make_queries(directory.names, args.queries)
+    print(f"{'kind':<8} {'search p50':>11} {'p99':>9} {'max':>9} {'lookup p50':>11} {'hit p50':>9}")
+    for kind, batch in queries.items():
+        search = time_calls(lambda q: directory.search(q, args.limit), batch)
+        # First lookup() per query fills the cache, the second is a hit
+        miss = time_calls(lambda q: directory.lookup(q, args.limit), batch)
+        hit = time_calls(lambda q: directory.lookup(q, args.limit), batch)
+        print(f"{kind:<8} {search[0]:>9.1f}us {search[1]:>7.1f}us {search[2]:>7.1f}us "
+              f"{miss[0]:>9.1f}us {hit[0]:>7.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Per-receipt latency from a script: a fresh Python process per receipt
+(interpreter + PyMuPDF import + template parse + fill, what cron jobs do
+today) vs. the resident daemon in receipt_daemon.py.
+
+Daemon paths:
+- client: `receipt_daemon.py fill` started per receipt, still one
+  interpreter start but no PyMuPDF import or template parse;
+- connection: one connection carrying every receipt, as a pipeline feeding
+  NDJSON to a single client does;
+- in-process: fill_bytes on a warm template, the floor.
+
+Usage:
+    python benchmarks/bench_daemon.py --receipts 20 --batch 500
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import receipt_daemon  # noqa: E402
+
+RECEIPT = {
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'items': [{'description': 'Hand Soap Starter Kit w/ Ribbon', 'quantity': '36 boxes', 'remarks': 'No issues'}],
+}
+
+COLD_FILL = (
+    "import json, sys, receipt_engine; "
+    "receipt_engine.get_template().fill_file(json.load(open(sys.argv[1])), sys.argv[2])"
+)
+
+
+def timed_runs(commands, **kwargs):
+    samples = []
+    for command in commands:
+        t0 = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def wait_for_socket(path, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            return
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(0.05)
+        finally:
+            probe.close()
+    raise SystemExit(f"Daemon did not come up on {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill daemon latency benchmark.")
+    parser.add_argument("--receipts", type=int, default=20, help="Process launches per subprocess path")
+    parser.add_argument("--batch", type=int, default=500, help="Receipts over one connection")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        receipt_path = os.path.join(tmp, 'receipt.json')
+        with open(receipt_path, 'w') as f:
+            json.dump(RECEIPT, f)
+        output = os.path.join(tmp, 'out.pdf')
+        socket_path = os.path.join(tmp, 'daemon.sock')
+
+        cold = timed_runs([[sys.executable, '-c', COLD_FILL, receipt_path, output]] * args.receipts, cwd=BASE_DIR)
+
+        daemon = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, 'receipt_daemon.py'),
+                                   '--socket', socket_path, 'serve'],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_socket(socket_path)
+            client = timed_runs([[sys.executable, os.path.join(BASE_DIR, 'receipt_daemon.py'), '--socket',
+                                  socket_path, 'fill', receipt_path, '-o', output]] * args.receipts)
+
+            connection = []
+            with receipt_daemon.connect(socket_path) as sock:
+                for _ in range(args.batch):
+                    t0 = time.perf_counter()
+                    response, pdf_bytes = receipt_daemon.request(sock, {'receipt': RECEIPT})
+                    connection.append((time.perf_counter() - t0) * 1000)
+                    assert response['ok'] and len(pdf_bytes) == response['size']
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+    import receipt_engine
+    template = receipt_engine.get_template()
+    in_process = []
+    for _ in range(args.batch):
+        t0 = time.perf_counter()
+        template.fill_bytes(RECEIPT)
+        in_process.append((time.perf_counter() - t0) * 1000)
+
+    print(f"{'path':<22} {'p50':>9} {'p95':>9}")
+    for name, samples in (('process per receipt', cold), ('client per receipt', client),
+                          ('one connection', connection), ('in-process fill', in_process)):
+        samples.sort()
+        print(f"{name:<22} {statistics.median(samples):>7.2f}ms {samples[int(len(samples) * 0.95) - 1]:>7.2f}ms")
+    print(f"({args.receipts} process launches per subprocess path, {args.batch} receipts otherwise)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Correcting one field of a filled receipt: an incremental edit
+(receipt_edit.py: redact the field's text, redraw it, append an update)
+vs. filling the whole receipt again from the template.
+
+Reports time per correction and bytes written: the edit appends a small
+update to the existing file, the re-fill writes the whole PDF again. The
+re-fill starts from the engine's warm in-memory template, so it is not
+slower; the edit's gains are the bytes written and keeping the original
+receipt (and its earlier revisions) intact.
+
+First it checks that edits render exactly like a fresh fill of the
+corrected receipt, including a description long enough to overflow its
+cell into the quantity column, and exits 1 if any differs.
+
+Usage:
+    python benchmarks/bench_edit.py --edits 200
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import fitz  # noqa: E402
+
+import receipt_engine  # noqa: E402
+import receipt_edit  # noqa: E402
+
+RECEIPT = {
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'items': [{'description': f'Hand Soap Starter Kit {i}', 'quantity': f'{i * 6} boxes', 'remarks': 'No issues'}
+              for i in range(1, 6)],
+}
+
+
+def with_item(receipt, row, **changes):
+    items = [dict(item) for item in receipt['items']]
+    items[row].update(changes)
+    return dict(receipt, items=items)
+
+
+# (name, receipt as filled, edit, receipt the edit should produce)
+OVERFLOWING = with_item(RECEIPT, 0, description='Soap ' * 20, quantity='3 boxes')
+CHECKS = [
+    ('quantity', RECEIPT, {'item3_quantity': '40 boxes'}, with_item(RECEIPT, 2, quantity='40 boxes')),
+    ('consignee', RECEIPT, {'consignee': 'The Clean Room Trading'}, dict(RECEIPT, consignee='The Clean Room Trading')),
+    ('overflowing description', OVERFLOWING, {'item1_description': 'Short'},
+     with_item(OVERFLOWING, 0, description='Short')),
+]
+
+
+def check_edits(template, tmp):
+    """Names of the CHECKS whose edited page differs from a fresh fill."""
+    failed = []
+    path = os.path.join(tmp, 'check.pdf')
+    for name, before, changes, after in CHECKS:
+        template.fill_file(before, path)
+        receipt_edit.edit_file(path, changes)
+        with fitz.open(path) as edited, fitz.open(stream=template.fill_bytes(after)) as fresh:
+            same = edited[0].get_pixmap(dpi=72).samples == fresh[0].get_pixmap(dpi=72).samples
+        print(f"check {name:<26} {'ok' if same else 'DIFFERS from a fresh fill'}")
+        if not same:
+            failed.append(name)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental edit vs. re-fill benchmark.")
+    parser.add_argument("--edits", type=int, default=200)
+    args = parser.parse_args()
+
+    template = receipt_engine.get_template()
+    with tempfile.TemporaryDirectory() as tmp:
+        if check_edits(template, tmp):
+            return 1
+        edit_path = os.path.join(tmp, 'edited.pdf')
+        fill_path = os.path.join(tmp, 'filled.pdf')
+        template.fill_file(RECEIPT, edit_path)
+        start_size = os.path.getsize(edit_path)
+
+        edit_ms, appended = [], []
+        for n in range(args.edits):
+            t0 = time.perf_counter()
+            _, added, _ = receipt_edit.edit_file(edit_path, {'item3_quantity': f'{n} boxes'})
+            edit_ms.append((time.perf_counter() - t0) * 1000)
+            appended.append(added)
+
+        fill_ms = []
+        for n in range(args.edits):
+            data = dict(RECEIPT, items=[dict(item) for item in RECEIPT['items']])
+            data['items'][2]['quantity'] = f'{n} boxes'
+            t0 = time.perf_counter()
+            template.fill_file(data, fill_path)
+            fill_ms.append((time.perf_counter() - t0) * 1000)
+        fill_size = os.path.getsize(fill_path)
+        end_size = os.path.getsize(edit_path)
+
+    print(f"{'path':<12} {'p50':>9} {'max':>9} {'bytes written':>14}")
+    print(f"{'edit':<12} {statistics.median(edit_ms):>7.2f}ms {max(edit_ms):>7.2f}ms {statistics.median(appended):>14.0f}")
+    print(f"{'re-fill':<12} {statistics.median(fill_ms):>7.2f}ms {max(fill_ms):>7.2f}ms {fill_size:>14}")
+    print(f"(file grew from {start_size} to {end_size} bytes over {args.edits} edits)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
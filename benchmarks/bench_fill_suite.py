@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark suite for the receipt fill hot path, with a regression gate.
+
+`run` times every fill entry point on every case and writes JSON:
+
+- app: app.fill_delivery_receipt (engine fill to a file, as the form POST does)
+- api: api/index.py fill_delivery_receipt (engine fill to bytes)
+- filler: delivery_receipt_filler.fill_pdf (the interactive CLI's fill)
+
+Cases cover 1 to 5 items, descriptions long enough to make the engine
+shrink the font, and non-ASCII names. For each benchmark it records latency
+percentiles, the median of each engine stage (template, open, fit,
+insert_text, save), Python allocations per fill from tracemalloc (peak and
+retained; MuPDF's own C allocations are not traced) and output bytes.
+
+`compare` checks a run against a stored baseline and exits 1 if any
+benchmark or stage got slower, allocated more or grew its output beyond
+the thresholds. Differences below --min-ms are treated as noise.
+
+Usage:
+    python benchmarks/bench_fill_suite.py run --iterations 200 -o benchmarks/baselines/fill_suite.json
+    python benchmarks/bench_fill_suite.py run -o current.json
+    python benchmarks/bench_fill_suite.py compare benchmarks/baselines/fill_suite.json current.json --threshold 0.10
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import tracemalloc
+import importlib.util
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import fitz  # noqa: E402
+
+from receipt_metrics import StageTimer  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BASE_DIR, 'benchmarks', 'baselines', 'fill_suite.json')
+
+ITEMS = [
+    {'description': 'Hand Soap Starter Kit w/ Ribbon', 'quantity': '36 boxes', 'remarks': 'No issues'},
+    {'description': 'Hand Soap Refill Pouch 1L', 'quantity': '12 boxes', 'remarks': 'No issues'},
+    {'description': 'Dishwashing Liquid 500ml', 'quantity': '48 bottles', 'remarks': 'Two dented'},
+    {'description': 'Laundry Powder 2kg', 'quantity': '20 bags', 'remarks': ''},
+    {'description': 'Glass Cleaner Spray 750ml', 'quantity': '24 bottles', 'remarks': 'Sealed'},
+]
+
+LONG_ITEMS = [
+    {'description': 'Dishwashing Liquid Concentrate, lemon and lime scent, 500ml squeeze bottle, pack of 12',
+     'quantity': '48 bottles in 4 cartons', 'remarks': 'Two bottles dented in transit, replaced on site'}
+    for _ in range(5)
+]
+
+
+def receipt(items, consignee='Simula PH', location='Simula PH, Glorietta 2, Makati'):
+    return {'date': '01/30/2026', 'consignee': consignee, 'delivery_location': location, 'items': items}
+
+
+CASES = {
+    **{f'items_{n}': receipt(ITEMS[:n]) for n in range(1, 6)},
+    'long_descriptions': receipt(LONG_ITEMS, location='Unit 1203, Tower 2, Ayala Triangle Gardens, '
+                                                      'Paseo de Roxas corner Makati Avenue, Makati City'),
+    'unicode': receipt(ITEMS[:3], consignee='Peñafrancia Café & Señor Niño Pâtisserie',
+                       location='Ortigas Ave., Pasig — São Paulo Bldg., Zoë Ångström'),
+}
+
+
+def load_targets(tmp):
+    """name -> fill(data, timer): each entry point under test."""
+    import app
+    import delivery_receipt_filler
+
+    spec = importlib.util.spec_from_file_location('api_index', os.path.join(BASE_DIR, 'api', 'index.py'))
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+
+    output = os.path.join(tmp, 'receipt.pdf')
+
+    def app_fill(data, timer):
+        app.fill_delivery_receipt(data, app.TEMPLATE_PATH, output, timer)
+        return os.path.getsize(output)
+
+    def api_fill(data, timer):
+        return len(api.fill_delivery_receipt(data, api.TEMPLATE_PATH, timer))
+
+    def filler_fill(data, timer):
+        # fill_pdf has no stage timer; only its total is measured
+        delivery_receipt_filler.fill_pdf(data, app.TEMPLATE_PATH, output)
+        return os.path.getsize(output)
+
+    return {'app': app_fill, 'api': api_fill, 'filler': filler_fill}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def measure(fill, data, iterations, alloc_iterations):
+    for _ in range(3):
+        fill(data, StageTimer())
+
+    samples, stages = [], {}
+    for _ in range(iterations):
+        timer = StageTimer()
+        t0 = time.perf_counter()
+        size = fill(data, timer)
+        samples.append((time.perf_counter() - t0) * 1000)
+        for name, seconds in timer.stages.items():
+            stages.setdefault(name, []).append(seconds * 1000)
+
+    # Allocations in a separate pass: tracing slows every allocation down
+    peaks, retained = [], []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_iterations):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fill(data, StageTimer())
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append((peak - before) / 1024)
+            retained.append((current - before) / 1024)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': statistics.median(samples),
+        'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99),
+        'mean_ms': statistics.fmean(samples),
+        'stages_ms': {name: statistics.median(values) for name, values in stages.items()},
+        'alloc_peak_kb': statistics.median(peaks),
+        'alloc_retained_kb': statistics.median(retained),
+        'bytes': size,
+    }
+
+
+def run_command(args):
+    results = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pymupdf': fitz.VersionBind,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'iterations': args.iterations,
+        },
+        'benchmarks': {},
+    }
+    cases = args.cases.split(',') if args.cases else list(CASES)
+    with tempfile.TemporaryDirectory() as tmp:
+        targets = load_targets(tmp)
+        names = args.targets.split(',') if args.targets else list(targets)
+        print(f"{'benchmark':<26} {'p50':>8} {'p95':>8} {'p99':>8} {'peak KB':>8} {'bytes':>7}")
+        for target in names:
+            for case in cases:
+                name = f'{target}/{case}'
+                result = measure(targets[target], CASES[case], args.iterations, args.alloc_iterations)
+                results['benchmarks'][name] = result
+                print(f"{name:<26} {result['p50_ms']:>6.2f}ms {result['p95_ms']:>6.2f}ms {result['p99_ms']:>6.2f}ms "
+                      f"{result['alloc_peak_kb']:>8.1f} {result['bytes']:>7}")
+
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+def regressions(base, current, args):
+    """(metric, baseline, current, change) for each metric of one benchmark past its threshold."""
+    checks = [(args.metric, base[args.metric], current[args.metric], args.threshold, args.min_ms)]
+    for stage, base_ms in base.get('stages_ms', {}).items():
+        if stage in current.get('stages_ms', {}):
+            checks.append((f'stage:{stage}', base_ms, current['stages_ms'][stage], args.threshold, args.min_ms))
+    checks.append(('alloc_peak_kb', base['alloc_peak_kb'], current['alloc_peak_kb'], args.alloc_threshold, 1.0))
+    checks.append(('bytes', base['bytes'], current['bytes'], args.bytes_threshold, 0))
+
+    failed = []
+    for metric, before, after, threshold, floor in checks:
+        if after - before > floor and after > before * (1 + threshold):
+            failed.append((metric, before, after, after / before - 1 if before else float('inf')))
+    return failed
+
+
+def compare_command(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)['benchmarks']
+    with open(args.current) as f:
+        current = json.load(f)['benchmarks']
+
+    failures = 0
+    print(f"{'benchmark':<26} {'baseline':>9} {'current':>9} {'change':>8}")
+    for name, base in baseline.items():
+        if name not in current:
+            print(f"{name:<26} missing from the current run")
+            continue
+        metric = args.metric
+        change = current[name][metric] / base[metric] - 1
+        print(f"{name:<26} {base[metric]:>7.2f}ms {current[name][metric]:>7.2f}ms {change:>+7.1%}")
+        for failed_metric, before, after, delta in regressions(base, current[name], args):
+            failures += 1
+            print(f"  REGRESSION {failed_metric}: {before:.2f} -> {after:.2f} ({delta:+.1%})")
+
+    if failures:
+        print(f"{failures} regression(s) beyond the thresholds")
+        return 1
+    print("No regressions")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receipt fill hot-path benchmark suite.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the suite and write JSON results")
+    run_parser.add_argument("-o", "--output", default="fill_suite_results.json")
+    run_parser.add_argument("--iterations", type=int, default=100, help="Timed fills per benchmark")
+    run_parser.add_argument("--alloc-iterations", type=int, default=10, help="Traced fills per benchmark")
+    run_parser.add_argument("--targets", help="Comma-separated subset of app,api,filler")
+    run_parser.add_argument("--cases", help=f"Comma-separated subset of {','.join(CASES)}")
+
+    compare_parser = commands.add_parser("compare", help="Fail on regressions against a baseline")
+    compare_parser.add_argument("baseline", nargs="?", default=DEFAULT_BASELINE)
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--metric", default="p50_ms", choices=("p50_ms", "p95_ms", "p99_ms", "mean_ms"))
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed latency growth (0.10 = 10%%)")
+    compare_parser.add_argument("--min-ms", type=float, default=0.05, help="Latency differences treated as noise")
+    compare_parser.add_argument("--alloc-threshold", type=float, default=0.10, help="Allowed peak allocation growth")
+    compare_parser.add_argument("--bytes-threshold", type=float, default=0.02, help="Allowed output size growth")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        return run_command(args)
+    return compare_command(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Overhead of the per-stage timers and metrics registry on a receipt fill.
+
+Two measurements are reported:
+
+- A/B: the same fill with and without instrumentation in alternating
+  rounds (so CPU frequency drift hits both sides equally), best round of
+  each. Useful as a sanity check but noisy at the 1% level.
+- Direct: the timer and registry calls one instrumented fill makes,
+  replayed without the PDF work, as a fraction of the plain fill time.
+  This is the number the exit status is based on (fails at >= 1%).
+
+Usage:
+    python benchmarks/bench_instrumentation.py --rounds 30 --fills 100
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import receipt_engine  # noqa: E402
+from receipt_metrics import MetricsRegistry, StageTimer, NULL_TIMER  # noqa: E402
+
+SAMPLE_DATA = {
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'items': [
+        {'description': 'Hand Soap Starter Kit w/ Ribbon', 'quantity': '36 boxes', 'remarks': 'No issues'},
+        {'description': 'Hand Soap Refill Pouch 1L', 'quantity': '12 boxes', 'remarks': 'No issues'},
+        {'description': 'Dishwashing Liquid Concentrate, lemon, 500ml bottle', 'quantity': '48 bottles', 'remarks': 'Two dented'},
+    ],
+}
+
+
+def plain_round(template, fills):
+    t0 = time.perf_counter()
+    for _ in range(fills):
+        template.fill_bytes(SAMPLE_DATA, NULL_TIMER)
+    return (time.perf_counter() - t0) / fills
+
+
+def instrumented_round(template, fills, registry):
+    t0 = time.perf_counter()
+    for _ in range(fills):
+        timer = StageTimer()
+        template.fill_bytes(SAMPLE_DATA, timer)
+        timer.server_timing()
+        registry.inc('receipt_requests_total', endpoint='bench', status='200')
+        registry.observe('receipt_request_seconds', timer.elapsed(), endpoint='bench')
+        registry.observe_stages(timer)
+    return (time.perf_counter() - t0) / fills
+
+
+def instrumentation_only(stage_names, iterations, registry):
+    """Cost of the timer/registry calls of one fill, with no work inside the stages."""
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        timer = StageTimer()
+        for name in stage_names:
+            with timer.stage(name):
+                pass
+        timer.server_timing()
+        registry.inc('receipt_requests_total', endpoint='bench', status='200')
+        registry.observe('receipt_request_seconds', timer.elapsed(), endpoint='bench')
+        registry.observe_stages(timer)
+    return (time.perf_counter() - t0) / iterations
+
+
+def stage_sequence(data):
+    """The stages, in order, that one fill of data enters."""
+    drawn = sum(1 for text in receipt_engine.field_values(data).values() if text)
+    return ['template', 'open'] + ['fit', 'insert_text'] * drawn + ['save']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark instrumentation overhead.")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--fills", type=int, default=100, help="Fills per round")
+    args = parser.parse_args()
+
+    template = receipt_engine.get_template()
+    registry = MetricsRegistry()
+
+    # Warm both paths before measuring
+    plain_round(template, 10)
+    instrumented_round(template, 10, registry)
+
+    plain, instrumented = [], []
+    for _ in range(args.rounds):
+        plain.append(plain_round(template, args.fills))
+        instrumented.append(instrumented_round(template, args.fills, registry))
+
+    plain_ms = min(plain) * 1000
+    instrumented_ms = min(instrumented) * 1000
+    ab_overhead = (instrumented_ms - plain_ms) / plain_ms * 100
+
+    stages = stage_sequence(SAMPLE_DATA)
+    direct_ms = statistics.median(
+        instrumentation_only(stages, 2000, registry) for _ in range(5)) * 1000
+    direct_overhead = direct_ms / plain_ms * 100
+
+    print(f"plain fill:        {plain_ms:.3f} ms")
+    print(f"instrumented fill: {instrumented_ms:.3f} ms  (A/B {ab_overhead:+.2f}%)")
+    print(f"instrumentation:   {direct_ms * 1000:.1f} us for {len(stages)} stages + registry")
+    print(f"overhead:          {direct_overhead:.2f}%")
+    return 0 if direct_overhead < 1.0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+OCR seconds per page and label hit rate of FormAutofiller's field
+detection: the fixed method (whole pages at FULL_PAGE_DPI, pdf2image) vs.
+the adaptive one (text regions from a LOW_DPI render, OCRed as CROP_DPI
+crops).
+
+Each form is OCRed from scratch (the template cache is not used) for the
+keys of its data file. The hit rate is the share of keys whose label was
+found; for forms with a text layer the fill position is also checked
+against where the label really ends (median error in points).
+
+Needs the tesseract binary; the fixed method also needs poppler.
+
+Usage:
+    python benchmarks/bench_ocr.py --form test_form.pdf --data test_data.json --repeat 3
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import pytesseract  # noqa: E402
+
+import autofill  # noqa: E402
+
+
+def label_positions(doc, keys):
+    """Where each key's label ends on the text layer, as autofill would place the value."""
+    positions = {}
+    for page_num, page in enumerate(doc):
+        for key in keys:
+            for suffix in (":", ""):
+                rects = page.search_for(key + suffix)
+                if rects and key not in positions:
+                    rect = rects[0]
+                    positions[key] = (page_num, rect.x1 + 10, rect.y0 + rect.height * 0.8)
+    return positions
+
+
+def measure(pdf_path, keys, mode, repeat):
+    seconds = []
+    for _ in range(repeat):
+        with autofill.FormAutofiller(pdf_path, {key: "" for key in keys}, ocr_mode=mode) as agent:
+            try:
+                t0 = time.perf_counter()
+                field_map = agent._find_coordinates()
+                seconds.append((time.perf_counter() - t0) / len(agent.doc))
+            except SystemExit:
+                return None
+            truth = label_positions(agent.doc, keys)
+
+    found = {key: (int(page), coords) for page, fields in field_map.items() for key, coords in fields.items()}
+    errors = [max(abs(coords["x"] - truth[key][1]), abs(coords["y"] - truth[key][2]))
+              for key, (page, coords) in found.items() if key in truth and truth[key][0] == page]
+    return statistics.median(seconds), len(found) / len(keys), statistics.median(errors) if errors else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed vs. adaptive OCR benchmark.")
+    parser.add_argument("--form", action="append", help="PDF form (repeat with --data for more forms)")
+    parser.add_argument("--data", action="append", help="JSON data file whose keys are the form's labels")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    forms = args.form or [os.path.join(BASE_DIR, "test_form.pdf")]
+    data_files = args.data or [os.path.join(BASE_DIR, "test_data.json")]
+    if len(forms) != len(data_files):
+        parser.error("Give one --data per --form")
+
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        raise SystemExit("tesseract is not installed or not on PATH")
+    logging.getLogger("autofill").setLevel(logging.ERROR)
+
+    print(f"{'form':<28} {'method':<9} {'s/page':>8} {'hit rate':>9} {'pos err':>8}")
+    for pdf_path, data_file in zip(forms, data_files):
+        with open(data_file) as f:
+            keys = list(json.load(f))
+        for mode in ("fixed", "adaptive"):
+            result = measure(pdf_path, keys, mode, args.repeat)
+            name = os.path.basename(pdf_path)
+            if result is None:
+                print(f"{name:<28} {mode:<9} {'unavailable (pdf2image needs poppler)':>27}")
+                continue
+            seconds, hit_rate, error = result
+            error_text = f"{error:.1f}pt" if error is not None else "-"
+            print(f"{name:<28} {mode:<9} {seconds:>8.2f} {hit_rate:>9.0%} {error_text:>8}")
+    print(f"(fixed: {autofill.FULL_PAGE_DPI} DPI pages; adaptive: {autofill.LOW_DPI} DPI regions, "
+          f"{autofill.CROP_DPI} DPI crops; median of {args.repeat})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Per-page OCR latency of each OCR backend (ocr_backends.py) on a
+single-page form, where the per-image fixed cost of spawning tesseract
+matters most.
+
+A page is OCRed the way FormAutofiller does it: as the adaptive crops
+(one image per text region, binarized, with its page segmentation mode)
+or, with --fixed, as one whole-page image at FULL_PAGE_DPI. The first page
+is reported separately: it includes loading the model into a fresh engine,
+which the pooled backend pays only once per process.
+
+Usage:
+    python benchmarks/bench_ocr_backends.py --form test_form.pdf --pages 20
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import fitz  # noqa: E402
+import pytesseract  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import autofill  # noqa: E402
+import ocr_backends  # noqa: E402
+
+
+def page_images(page, fixed):
+    """(image, config) pairs to OCR for one page."""
+    if fixed:
+        return [(Image.fromarray(autofill.render_gray(page, autofill.FULL_PAGE_DPI)), "")]
+    return [(img, config) for _, img, config in autofill.page_crops(page)]
+
+
+def available(name):
+    if name == "tesserocr":
+        try:
+            import tesserocr  # noqa: F401
+        except ImportError:
+            return "tesserocr is not installed"
+        return None
+    if not shutil.which(pytesseract.pytesseract.tesseract_cmd):
+        return "tesseract is not on PATH"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR backend latency benchmark.")
+    parser.add_argument("--form", default=os.path.join(BASE_DIR, "test_form.pdf"))
+    parser.add_argument("--pages", type=int, default=20, help="Pages OCRed per backend after the first")
+    parser.add_argument("--backends", default=",".join(ocr_backends.BACKENDS))
+    parser.add_argument("--fixed", action="store_true", help="OCR the whole page instead of the adaptive crops")
+    args = parser.parse_args()
+
+    with fitz.open(args.form) as doc:
+        images = page_images(doc[0], args.fixed)
+    pixels = sum(img.width * img.height for img, _ in images)
+
+    print(f"{'backend':<12} {'first page':>11} {'p50':>9} {'p95':>9} {'words':>6}")
+    for name in args.backends.split(","):
+        reason = available(name)
+        if reason:
+            print(f"{name:<12} unavailable: {reason}")
+            continue
+        with ocr_backends.BACKENDS[name]() as backend:
+            samples = []
+            for _ in range(args.pages + 1):
+                t0 = time.perf_counter()
+                words = sum(sum(1 for text in backend.image_to_data(img, config)["text"] if text.strip())
+                            for img, config in images)
+                samples.append((time.perf_counter() - t0) * 1000)
+        first, rest = samples[0], sorted(samples[1:])
+        print(f"{name:<12} {first:>9.1f}ms {statistics.median(rest):>7.1f}ms "
+              f"{rest[max(0, int(len(rest) * 0.95) - 1)]:>7.1f}ms {words:>6}")
+    print(f"({os.path.basename(args.form)}: {len(images)} image(s), {pixels / 1e6:.2f} MP per page; "
+          f"{args.pages} pages per backend)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Latency of the /preview image while typing: a full re-render of the filled
+page per keystroke vs. the incremental renderer in receipt_preview.py
+(cached template raster, per-field patches, NumPy compositing).
+
+Each "keystroke" appends one character to an item description, so the
+incremental path renders one new patch and reuses the rest. Both paths
+encode the same grayscale PNG, so the difference is rasterization alone.
+
+Usage:
+    python benchmarks/bench_preview.py --keystrokes 200 --dpi 96
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import fitz  # noqa: E402
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import receipt_engine  # noqa: E402
+import receipt_preview  # noqa: E402
+
+FORM = {
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'item1_description': 'Hand Soap Starter Kit w/ Ribbon',
+    'item1_quantity': '36 boxes',
+    'item2_description': 'Dishwashing Liquid',
+    'item2_quantity': '12 bottles',
+}
+TYPED = 'Lemon scented, 500ml refill pouch with spout ' * 5
+
+
+def keystrokes(count):
+    for n in range(1, count + 1):
+        yield receipt_preview.form_data(dict(FORM, item3_description=TYPED[:n]))
+
+
+def encode(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def full_render(template, data, dpi):
+    with template.render(data) as doc:
+        pix = doc[0].get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72), colorspace=fitz.csGRAY, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+
+def measure(render, inputs):
+    raster, total = [], []
+    for data in inputs:
+        t0 = time.perf_counter()
+        pixels = render(data)
+        t1 = time.perf_counter()
+        encode(pixels)
+        t2 = time.perf_counter()
+        raster.append((t1 - t0) * 1000)
+        total.append((t2 - t0) * 1000)
+    return raster, total
+
+
+def summary(name, raster, total):
+    total_sorted = sorted(total)
+    p95 = total_sorted[int(len(total_sorted) * 0.95) - 1]
+    print(f"{name:<12} {statistics.median(raster):>9.2f}ms {statistics.median(total):>9.2f}ms {p95:>9.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preview rendering benchmark.")
+    parser.add_argument("--keystrokes", type=int, default=200)
+    parser.add_argument("--dpi", type=int, default=receipt_preview.DEFAULT_DPI)
+    args = parser.parse_args()
+
+    template = receipt_engine.get_template()
+    renderer = receipt_preview.PreviewRenderer(template)
+
+    t0 = time.perf_counter()
+    renderer.render(receipt_preview.form_data(FORM), args.dpi)
+    first_ms = (time.perf_counter() - t0) * 1000
+
+    inputs = list(keystrokes(args.keystrokes))
+    print(f"{'path':<12} {'raster p50':>11} {'total p50':>11} {'total p95':>11}")
+    summary('full', *measure(lambda data: full_render(template, data, args.dpi), inputs))
+    summary('incremental', *measure(lambda data: renderer.render(data, args.dpi), inputs))
+    print(f"(dpi {args.dpi}, {args.keystrokes} keystrokes; first incremental render with a cold "
+          f"cache: {first_ms:.1f}ms)")
+
+    worst = max(int(np.abs(renderer.render(data, args.dpi).astype(int)
+                           - full_render(template, data, args.dpi)).max())
+                for data in inputs[::max(1, len(inputs) // 10)])
+    print(f"max difference from the full render: {worst} grey levels")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Throughput of the filler's print-ready raster export
+(`delivery_receipt_filler.py --export`).
+
+First a per-stage breakdown per page (raster: cached template plus text
+patches, dither, encode; with a full-page render of the filled PDF for
+comparison), then pages/s for the whole batch on each pool configuration:
+serial, a thread pool and a process pool. Rendering holds the GIL, so only the
+process pool should scale with cores; threads overlap just the NumPy
+dithering and encoding.
+
+Usage:
+    python benchmarks/bench_raster_export.py --receipts 1000 --dpi 203 --format pbm
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import delivery_receipt_filler as filler  # noqa: E402
+import receipt_engine  # noqa: E402
+import receipt_preview  # noqa: E402
+
+TEMPLATE_PATH = os.path.join(BASE_DIR, 'delivery_receipt_template.pdf')
+
+
+def make_receipts(count):
+    return [{
+        'date': '01/30/2026',
+        'consignee': f'Consignee {i}',
+        'delivery_location': 'Simula PH, Glorietta 2, Makati',
+        'items': [
+            {'description': 'Hand Soap Starter Kit w/ Ribbon', 'quantity': f'{i % 90 + 1} boxes', 'remarks': 'No issues'},
+            {'description': 'Dishwashing Liquid', 'quantity': '12 bottles', 'remarks': 'No issues'},
+        ],
+    } for i in range(count)]
+
+
+def stage_breakdown(receipts, dpi, image_format):
+    """Median ms per stage and page, with the full-page render for comparison."""
+    template = receipt_engine.get_template(TEMPLATE_PATH)
+    renderer = receipt_preview.get_renderer(TEMPLATE_PATH)
+    renderer.raster(dpi)
+    stages = {'full render': [], 'raster': [], 'dither': [], 'encode': []}
+    # Each receipt has its own consignee and quantity, so those patches are rendered fresh
+    for data in receipts:
+        t0 = time.perf_counter()
+        with template.render(data) as doc:
+            doc[0].get_pixmap(dpi=dpi, colorspace=filler.fitz.csGRAY, alpha=False)
+        t1 = time.perf_counter()
+        gray = renderer.render(data, dpi)
+        t2 = time.perf_counter()
+        black = filler.dither(gray)
+        t3 = time.perf_counter()
+        filler.encode_raster(black, image_format, dpi)
+        t4 = time.perf_counter()
+        for name, seconds in zip(stages, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+            stages[name].append(seconds * 1000)
+    return {name: statistics.median(samples) for name, samples in stages.items()}, gray.shape
+
+
+def throughput(receipts, dpi, image_format, workers, pool):
+    t0 = time.perf_counter()
+    pages = sum(1 for _ in filler.export_rasters(receipts, TEMPLATE_PATH, dpi, image_format, workers, pool))
+    return pages / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raster export throughput benchmark.")
+    parser.add_argument("--receipts", type=int, default=1000)
+    parser.add_argument("--dpi", type=int, default=filler.DEFAULT_RASTER_DPI)
+    parser.add_argument("--format", choices=filler.RASTER_FORMATS, default="pbm")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    receipts = make_receipts(args.receipts)
+    stages, shape = stage_breakdown(receipts[:20], args.dpi, args.format)
+    print(f"Per page at {args.dpi} dpi ({shape[1]}x{shape[0]}): "
+          + ", ".join(f"{name} {ms:.1f}ms" for name, ms in stages.items()))
+
+    print(f"{'pool':<10} {'workers':>7} {'pages/s':>9}")
+    configs = dict.fromkeys([('thread', 1), ('thread', args.workers), ('process', args.workers)])
+    for pool, workers in configs:
+        rate = throughput(receipts, args.dpi, args.format, workers, pool)
+        print(f"{pool:<10} {workers:>7} {rate:>9.1f}")
+    print(f"({args.receipts} receipts, {args.format}, {os.cpu_count()} CPUs)")
+
+
+if __name__ == "__main__":
+    main()
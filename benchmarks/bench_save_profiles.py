@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Bytes per receipt vs. save latency for each output profile
+(receipt_engine.SAVE_PROFILES: default, compact, web).
+
+For every profile: size of a single filled receipt, median save time
+(tobytes alone) and whole fill time, and bytes per receipt in a merged
+batch as POST /api/receipts?format=pdf builds it. The one-off cost of
+compacting the template is reported separately, as it is paid once per
+process.
+
+Usage:
+    python benchmarks/bench_save_profiles.py --fills 200 --batch 50
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import fitz  # noqa: E402
+
+import receipt_engine  # noqa: E402
+
+RECEIPT = {
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'items': [{'description': 'Hand Soap Starter Kit w/ Ribbon', 'quantity': f'{i * 6} boxes', 'remarks': 'No issues'}
+              for i in range(1, 6)],
+}
+
+
+def receipt(n):
+    return dict(RECEIPT, consignee=f'Consignee {n}')
+
+
+def measure(template, profile, fills):
+    options = receipt_engine.save_options(profile)
+    save_ms, fill_ms = [], []
+    for n in range(fills):
+        t0 = time.perf_counter()
+        with template.render(receipt(n)) as doc:
+            t1 = time.perf_counter()
+            pdf_bytes = doc.tobytes(**options)
+            t2 = time.perf_counter()
+        save_ms.append((t2 - t1) * 1000)
+        fill_ms.append((t2 - t0) * 1000)
+    return len(pdf_bytes), statistics.median(save_ms), statistics.median(fill_ms)
+
+
+def merged_size(template, profile, batch):
+    options = receipt_engine.save_options(profile)
+    with fitz.open() as merged:
+        for n in range(batch):
+            with fitz.open(stream=template.fill_bytes(receipt(n), profile=profile), filetype='pdf') as doc:
+                merged.insert_pdf(doc)
+        t0 = time.perf_counter()
+        pdf_bytes = merged.tobytes(**dict(options, garbage=max(1, options.get('garbage', 0))))
+        save_ms = (time.perf_counter() - t0) * 1000
+    return len(pdf_bytes), save_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Output profile size/latency benchmark.")
+    parser.add_argument("--fills", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=50, help="Receipts per merged PDF")
+    args = parser.parse_args()
+
+    with open(receipt_engine.DEFAULT_TEMPLATE_PATH, 'rb') as f:
+        original = f.read()
+    t0 = time.perf_counter()
+    compacted = receipt_engine.compact_pdf(original)
+    compact_ms = (time.perf_counter() - t0) * 1000
+
+    print(f"{'profile':<9} {'bytes/receipt':>13} {'save p50':>10} {'fill p50':>10} "
+          f"{'merged bytes/receipt':>21} {'merged save':>12}")
+    for profile in receipt_engine.SAVE_PROFILES:
+        template = receipt_engine.get_template(profile=profile)
+        size, save_ms, fill_ms = measure(template, profile, args.fills)
+        merged, merged_ms = merged_size(template, profile, args.batch)
+        print(f"{profile:<9} {size:>13} {save_ms:>8.2f}ms {fill_ms:>8.2f}ms "
+              f"{merged / args.batch:>21.0f} {merged_ms:>10.1f}ms")
+
+    print(f"(template {len(original)} -> {len(compacted)} bytes compacted, once per process in "
+          f"{compact_ms:.0f}ms; linearized output {'on' if receipt_engine.linear_supported() else 'unavailable'} "
+          f"in PyMuPDF {fitz.VersionBind})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Drain rate of the spool-directory queue (spool_queue.py) with several
+worker processes on one box, and crash recovery.
+
+Queues --jobs receipt jobs into a fresh spool and drains it with each
+worker count, as independent `spool_queue.py worker --drain` processes
+(the way separate hosts would run them). With --kill, one worker is
+SIGKILLed mid-batch: its leased job must be reaped once the lease expires
+and still end up in the outbox exactly once.
+
+Usage:
+    python benchmarks/bench_spool.py --jobs 1000 --workers 1,4 --kill
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import spool_queue  # noqa: E402
+
+SPOOL_SCRIPT = os.path.join(BASE_DIR, 'spool_queue.py')
+
+
+def fill_spool(spool, jobs):
+    spool_queue.init_spool(spool)
+    for i in range(jobs):
+        spool_queue.enqueue(spool, {'kind': 'receipt', 'receipt': {
+            'consignee': f'Consignee {i}', 'delivery_location': 'Simula PH, Glorietta 2, Makati',
+            'items': [{'description': 'Hand Soap Starter Kit', 'quantity': f'{i % 90 + 1} boxes'}],
+        }})
+
+
+def drain(spool, workers, kill, env):
+    t0 = time.perf_counter()
+    procs = [subprocess.Popen([sys.executable, SPOOL_SCRIPT, 'worker', spool, '--drain'], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+             for _ in range(workers)]
+    if kill:
+        # Kill one worker once it is well into the batch
+        while spool_queue.status(spool)['finished'] < 50:
+            time.sleep(0.01)
+        procs[0].send_signal(signal.SIGKILL)
+    for proc in procs:
+        proc.wait()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spool queue drain benchmark.")
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated worker counts")
+    parser.add_argument("--kill", action="store_true", help="SIGKILL one worker mid-batch (needs 2+ workers)")
+    parser.add_argument("--lease", type=float, default=2.0, help="Lease seconds for the run")
+    args = parser.parse_args()
+
+    env = dict(os.environ, SPOOL_LEASE_SECONDS=str(args.lease))
+    print(f"{'workers':>7} {'seconds':>8} {'jobs/s':>8} {'finished':>9} {'retried':>8}")
+    for workers in dict.fromkeys(int(n) for n in args.workers.split(',')):
+        with tempfile.TemporaryDirectory() as spool:
+            fill_spool(spool, args.jobs)
+            kill = args.kill and workers > 1
+            seconds = drain(spool, workers, kill, env)
+            counts = spool_queue.status(spool)
+            outbox = os.path.join(spool, 'outbox')
+            records = [json.load(open(os.path.join(outbox, name))) for name in os.listdir(outbox) if name.endswith('.json')]
+            retried = sum(1 for record in records if record['attempts'] > 1)
+            pdfs = sum(1 for name in os.listdir(outbox) if name.endswith('.pdf'))
+            assert counts['incoming'] == counts['claimed'] == 0 and pdfs == args.jobs, counts
+            print(f"{workers:>7} {seconds:>8.2f} {args.jobs / seconds:>8.1f} {counts['finished']:>9} {retried:>8}"
+                  + ("  (one worker killed)" if kill else ""))
+    print(f"({args.jobs} receipt jobs, lease {args.lease}s, {os.cpu_count()} CPUs)")
+
+
+if __name__ == "__main__":
+    main()
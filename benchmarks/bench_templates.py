@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Many templates in one process: fill latency, cache hit rate and memory
+by template cache size.
+
+Generates --templates template definitions (each its own copy of the
+delivery receipt PDF, with a different number of item rows) in a
+temporary RECEIPT_TEMPLATES_DIR, then fills --fills receipts through
+template_registry, picking templates from a Zipf distribution (--skew;
+0 is uniform), as a process serving branch variants would see. For each
+cache size in --cache-sizes it reports the hit rate, p50/p95 fill time,
+the cost of a miss (a cold template load), bytes held by the cache and
+the process RSS.
+
+Usage:
+    python benchmarks/bench_templates.py --templates 40 --cache-sizes 4,16,64 --fills 2000
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import statistics
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import receipt_engine  # noqa: E402
+import template_registry  # noqa: E402
+from memory_watchdog import current_rss_kb  # noqa: E402
+
+RECEIPT = {
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'items': [{'description': 'Hand Soap Starter Kit w/ Ribbon', 'quantity': f'{i * 6} boxes', 'remarks': 'No issues'}
+              for i in range(1, 6)],
+}
+
+
+def write_templates(directory, count):
+    """count definitions; each has its own PDF copy so nothing is shared between them."""
+    ids = []
+    for n in range(count):
+        template_id = f'branch_{n:03d}'
+        shutil.copyfile(receipt_engine.DEFAULT_TEMPLATE_PATH, os.path.join(directory, f'{template_id}.pdf'))
+        definition = dict(receipt_engine.DEFAULT_LAYOUT, name=f'Branch {n}', pdf=f'{template_id}.pdf')
+        definition['table'] = dict(definition['table'], rows=definition['table']['rows'][:n % 5 + 1])
+        with open(os.path.join(directory, f'{template_id}.json'), 'w') as f:
+            json.dump(definition, f)
+        ids.append(template_id)
+    return ids
+
+
+def template_misses():
+    return receipt_engine.METRICS.counters.get(('receipt_cache_misses_total', (('cache', 'template'),)), 0)
+
+
+def zipf_weights(count, skew):
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(ids, picks, cache_size):
+    receipt_engine.MAX_TEMPLATES = cache_size
+    with receipt_engine._templates_lock:
+        receipt_engine._templates.clear()
+
+    hits, hit_ms, miss_ms = 0, [], []
+    for template_id in picks:
+        misses = template_misses()
+        t0 = time.perf_counter()
+        template_registry.get_template(template_id).fill_bytes(RECEIPT)
+        elapsed = (time.perf_counter() - t0) * 1000
+        if template_misses() == misses:
+            hits += 1
+            hit_ms.append(elapsed)
+        else:
+            miss_ms.append(elapsed)
+    all_ms = hit_ms + miss_ms
+    templates = receipt_engine.cached_templates()
+    return {
+        'cache_size': cache_size,
+        'hit_rate': hits / len(picks),
+        'p50_ms': statistics.median(all_ms),
+        'p95_ms': percentile(all_ms, 95),
+        'hit_ms': statistics.median(hit_ms) if hit_ms else None,
+        'miss_ms': statistics.median(miss_ms) if miss_ms else None,
+        'cached': len(templates),
+        'cached_kb': sum(template.nbytes() for template in templates) / 1024,
+        'rss_mb': (current_rss_kb() or 0) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Template registry cache benchmark.")
+    parser.add_argument("--templates", type=int, default=40)
+    parser.add_argument("--cache-sizes", default="4,16,64", help="Comma-separated RECEIPT_MAX_TEMPLATES values")
+    parser.add_argument("--fills", type=int, default=2000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of template popularity (0: uniform)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='templates_')
+    try:
+        template_registry.TEMPLATES_DIR = tmp
+        ids = write_templates(tmp, args.templates)
+        rng = random.Random(args.seed)
+        picks = rng.choices(ids, weights=zipf_weights(len(ids), args.skew), k=args.fills)
+        print(f"{args.templates} templates, {args.fills} fills, Zipf skew {args.skew}, "
+              f"{len(set(picks))} templates used")
+        print(f"{'cache':>6} {'hit rate':>9} {'p50 ms':>8} {'p95 ms':>8} {'hit ms':>8} {'miss ms':>8} "
+              f"{'cached':>7} {'cache KB':>9} {'RSS MB':>8}")
+        for cache_size in (int(size) for size in args.cache_sizes.split(',')):
+            result = run(ids, picks, cache_size)
+            print(f"{result['cache_size']:>6} {result['hit_rate']:>9.1%} {result['p50_ms']:>8.2f} "
+                  f"{result['p95_ms']:>8.2f} {result['hit_ms'] or 0:>8.2f} {result['miss_ms'] or 0:>8.2f} "
+                  f"{result['cached']:>7} {result['cached_kb']:>9.0f} {result['rss_mb']:>8.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
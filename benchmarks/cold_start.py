@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Cold-start harness for the Vercel function (api/index.py).
+
+Each trial starts a fresh interpreter, imports api/index.py and sends the
+first GET and POST through the Flask test client, so the numbers match what
+a new serverless instance pays. Lazy (RECEIPT_WARM_START=0) and warm
+(RECEIPT_WARM_START=1) startup are measured side by side.
+
+Usage:
+    python benchmarks/cold_start.py --trials 10
+    python benchmarks/cold_start.py --importtime   # top import costs too
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_FORM = {
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'item1_description': 'Hand Soap Starter Kit w/ Ribbon',
+    'item1_quantity': '36 boxes',
+    'item1_remarks': 'No issues',
+}
+
+
+def child():
+    """Runs inside the fresh interpreter and prints one JSON result line."""
+    import importlib.util
+
+    t0 = time.perf_counter()
+    spec = importlib.util.spec_from_file_location('api_index', os.path.join(BASE_DIR, 'api', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import_ms = (time.perf_counter() - t0) * 1000
+
+    client = module.app.test_client()
+
+    t0 = time.perf_counter()
+    response = client.get('/delivery-receipt')
+    first_get_ms = (time.perf_counter() - t0) * 1000
+    assert response.status_code == 200, response.status_code
+
+    t0 = time.perf_counter()
+    response = client.post('/delivery-receipt', data=SAMPLE_FORM)
+    first_post_ms = (time.perf_counter() - t0) * 1000
+    assert response.mimetype == 'application/pdf', response.data[:200]
+
+    t0 = time.perf_counter()
+    client.post('/delivery-receipt', data=SAMPLE_FORM)
+    second_post_ms = (time.perf_counter() - t0) * 1000
+
+    print(json.dumps({
+        'import_ms': import_ms,
+        'first_get_ms': first_get_ms,
+        'first_post_ms': first_post_ms,
+        'second_post_ms': second_post_ms,
+    }))
+
+
+def parse_importtime(stderr, top):
+    """Return the top cumulative entries from `python -X importtime` output."""
+    entries = []
+    for line in stderr.splitlines():
+        # "import time:       123 |        456 |   package.module"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append((int(cumulative_us), name.strip()))
+    entries.sort(reverse=True)
+    return entries[:top]
+
+
+def run_trial(warm, importtime=False):
+    env = dict(os.environ, RECEIPT_WARM_START='1' if warm else '0')
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += [os.path.abspath(__file__), '--child']
+
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+    total_ms = (time.perf_counter() - t0) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"Child failed:\n{proc.stderr}")
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['process_ms'] = total_ms
+    return result, proc.stderr
+
+
+def summarize(results):
+    summary = {}
+    for key in results[0]:
+        values = sorted(r[key] for r in results)
+        summary[key] = {
+            'p50': statistics.median(values),
+            'max': values[-1],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start cost of api/index.py.")
+    parser.add_argument("--trials", type=int, default=5, help="Fresh processes per mode")
+    parser.add_argument("--importtime", action="store_true", help="Also report the slowest imports")
+    parser.add_argument("--json", dest="json_path", help="Write the summary to this JSON file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    report = {}
+    for mode, warm in (('lazy', False), ('warm', True)):
+        results = [run_trial(warm)[0] for _ in range(args.trials)]
+        report[mode] = summarize(results)
+
+    columns = ['import_ms', 'first_get_ms', 'first_post_ms', 'second_post_ms', 'process_ms']
+    print(f"{'mode':<6}" + "".join(f"{c:>16}" for c in columns))
+    for mode, summary in report.items():
+        print(f"{mode:<6}" + "".join(f"{summary[c]['p50']:>16.1f}" for c in columns))
+    print(f"(p50 of {args.trials} fresh processes per mode, milliseconds)")
+
+    if args.importtime:
+        _, stderr = run_trial(True, importtime=True)
+        print("\nSlowest imports (cumulative, warm mode):")
+        for cumulative_us, name in parse_importtime(stderr, 15):
+            print(f"  {cumulative_us / 1000:>8.1f} ms  {name}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Saturation load test for the ASGI entry point (asgi.py).
+
+Drives the ASGI application in-process (no server or network needed)
+with an open-loop burst of receipt POSTs arriving faster than it can fill
+them, and reports latency percentiles for accepted requests and how many
+were shed with 503. It runs twice: with the configured admission limits
+and with an effectively unbounded queue, to show what admission control
+does to the p99.
+
+Usage:
+    python benchmarks/load_asgi.py --requests 400 --rate 400 --concurrency 2 --queue 4
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from urllib.parse import urlencode
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.chdir(BASE_DIR)
+
+import asgi  # noqa: E402
+
+FORM = urlencode({
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'item1_description': 'Hand Soap Starter Kit w/ Ribbon',
+    'item1_quantity': '36 boxes',
+    'item1_remarks': 'No issues',
+}).encode()
+
+
+async def one_request(application):
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'POST',
+        'scheme': 'http',
+        'path': '/delivery-receipt',
+        'query_string': b'',
+        'headers': [(b'content-type', b'application/x-www-form-urlencoded'),
+                    (b'content-length', str(len(FORM)).encode())],
+        'server': ('127.0.0.1', 5000),
+        'client': ('127.0.0.1', 40000),
+    }
+    sent = False
+    status = None
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': FORM, 'more_body': False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    t0 = time.perf_counter()
+    await application(scope, receive, send)
+    return status, time.perf_counter() - t0
+
+
+async def run_load(application, requests, rate):
+    """Open loop: requests arrive as a Poisson process at `rate` per second."""
+    tasks = []
+    for _ in range(requests):
+        tasks.append(asyncio.create_task(one_request(application)))
+        await asyncio.sleep(random.expovariate(rate))
+    return await asyncio.gather(*tasks)
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def report(label, results, wall):
+    ok = [latency for status, latency in results if status == 200]
+    shed = [latency for status, latency in results if status == 503]
+    other = len(results) - len(ok) - len(shed)
+    print(f"\n{label}")
+    print(f"  accepted {len(ok)}, shed {len(shed)} (503), other {other}, "
+          f"throughput {len(ok) / wall:.1f} receipts/s")
+    if ok:
+        print(f"  accepted latency ms  p50 {percentile(ok, 50) * 1000:8.1f}  "
+              f"p95 {percentile(ok, 95) * 1000:8.1f}  p99 {percentile(ok, 99) * 1000:8.1f}")
+    if shed:
+        print(f"  503 latency ms       p50 {statistics.median(shed) * 1000:8.2f}  "
+              f"max {max(shed) * 1000:8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Saturation load test for asgi.py.")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=300, help="Arrivals per second")
+    parser.add_argument("--concurrency", type=int, default=asgi.MAX_CONCURRENCY)
+    parser.add_argument("--queue", type=int, default=asgi.MAX_QUEUE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    cases = [
+        (f"admission control (concurrency={args.concurrency}, queue={args.queue})", args.queue),
+        (f"unbounded queue (concurrency={args.concurrency})", args.requests),
+    ]
+    for label, queue in cases:
+        random.seed(args.seed)
+        application = asgi.create_application(args.concurrency, queue)
+        # Warm the pool and template outside the measurement
+        asyncio.run(one_request(application))
+        t0 = time.perf_counter()
+        results = asyncio.run(run_load(application, args.requests, args.rate))
+        report(label, results, time.perf_counter() - t0)
+        application.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
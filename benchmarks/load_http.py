@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for POST /delivery-receipt, fully local.
+
+Starts the Flask app from app.py or the WSGI app from api/index.py in a
+server subprocess on 127.0.0.1 (werkzeug, threaded or forking), or points
+at a server you already run (--url, e.g. `python -m prefork`, with
+--server-pid to watch its memory). Then it sends form POSTs:
+
+- open loop (--rate N): arrivals at N requests/s on a Poisson schedule,
+  handled by at most --concurrency connections. Latency counts from the
+  scheduled arrival, so time spent waiting for a free connection is
+  included and an overloaded server can't hide it.
+- closed loop (--rate 0): each connection sends its next request as soon
+  as the previous one is answered.
+
+Payloads are drawn from a weighted mix (--mix small=6,full=2,long=1,unicode=1).
+The report has throughput, p50/p95/p99 latency, the error rate (anything
+but a 200 PDF) and the server's RSS (including worker processes) sampled
+over the run, per second and in total; --output saves it all as JSON.
+
+Usage:
+    python benchmarks/load_http.py --target app --rate 50 --concurrency 8 --duration 30
+    python benchmarks/load_http.py --target api --rate 0 --concurrency 4 --requests 500 --output api.json
+    python benchmarks/load_http.py --url http://127.0.0.1:8000 --server-pid $(pgrep -of prefork) --rate 100
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import itertools
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import http.client
+from urllib.parse import urlencode, urlsplit
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ITEMS = [
+    {'description': 'Hand Soap Starter Kit w/ Ribbon', 'quantity': '36 boxes', 'remarks': 'No issues'},
+    {'description': 'Hand Soap Refill Pouch 1L', 'quantity': '12 boxes', 'remarks': 'No issues'},
+    {'description': 'Dishwashing Liquid 500ml', 'quantity': '48 bottles', 'remarks': 'Two dented'},
+    {'description': 'Laundry Powder 2kg', 'quantity': '20 bags', 'remarks': 'No issues'},
+    {'description': 'Glass Cleaner Spray 750ml', 'quantity': '24 bottles', 'remarks': 'Sealed'},
+]
+
+
+def form(consignee, location, items):
+    fields = {'date': '01/30/2026', 'consignee': consignee, 'delivery_location': location}
+    for i, item in enumerate(items, 1):
+        fields.update({f'item{i}_description': item['description'], f'item{i}_quantity': item['quantity'],
+                       f'item{i}_remarks': item['remarks']})
+    return urlencode(fields).encode()
+
+
+PAYLOADS = {
+    'small': form('Simula PH', 'Simula PH, Glorietta 2, Makati', ITEMS[:1]),
+    'full': form('Simula PH', 'Simula PH, Glorietta 2, Makati', ITEMS),
+    'long': form('The Clean Room Trading and General Merchandise Corporation',
+                 'Unit 1203, Tower 2, Ayala Triangle Gardens, Paseo de Roxas corner Makati Avenue, Makati City',
+                 [dict(item, description=item['description'] + ', assorted scents, pack of 12 with display carton')
+                  for item in ITEMS]),
+    'unicode': form('Peñafrancia Café & Señor Niño Pâtisserie', 'Ortigas Ave., Pasig — São Paulo Bldg.', ITEMS[:3]),
+}
+
+SERVE = """
+import importlib.util, os, sys
+from werkzeug.serving import make_server
+target, port, processes = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+sys.path.insert(0, {base!r})
+path = os.path.join({base!r}, 'app.py' if target == 'app' else os.path.join('api', 'index.py'))
+spec = importlib.util.spec_from_file_location('load_target', path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+make_server('127.0.0.1', port, module.app, threaded=processes == 1, processes=processes).serve_forever()
+"""
+
+
+# ============ Server ============
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(target, processes, workdir):
+    port = free_port()
+    # The app writes its PDFs under outputs/ in the working directory
+    proc = subprocess.Popen([sys.executable, '-c', SERVE.format(base=BASE_DIR), target, str(port), str(processes)],
+                            cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"The {target} server exited with status {proc.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return proc, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise SystemExit(f"The {target} server did not come up")
+
+
+def tree_rss_kb(pid):
+    """RSS of a process and all its descendants, from /proc (Linux); None if unavailable."""
+    total, pending, found = 0, [pid], False
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+            found = True
+            for tid in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{tid}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, StopIteration):
+            # Exited while we looked (recycled workers do), or not Linux
+            continue
+    return total if found else None
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid, interval):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopping = threading.Event()
+        self.start_time = time.perf_counter()
+
+    def run(self):
+        while not self.stopping.is_set():
+            rss = tree_rss_kb(self.pid)
+            if rss is not None:
+                self.samples.append((time.perf_counter() - self.start_time, rss))
+            self.stopping.wait(self.interval)
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+
+
+# ============ Client ============
+
+def send(conn, body):
+    """POST one form; returns the HTTP status (0 on a connection error)."""
+    try:
+        conn.request('POST', '/delivery-receipt', body=body,
+                     headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        payload = response.read()
+        if response.status == 200 and not payload.startswith(b'%PDF'):
+            return -1
+        return response.status
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        return 0
+
+
+def choose_payloads(mix, count, rng):
+    names = list(mix)
+    return rng.choices(names, weights=[mix[name] for name in names], k=count)
+
+
+def run_load(url, args, start_time):
+    """Send the requests; returns [(sent at, latency s, status, payload name)]."""
+    parts = urlsplit(url)
+    rng = random.Random(args.seed)
+
+    def schedule():
+        # Open loop: Poisson arrival times; closed loop: send when ready
+        t = 0.0
+        for i in itertools.count():
+            if args.requests and i >= args.requests:
+                return
+            if args.rate:
+                t += rng.expovariate(args.rate)
+            yield (t if args.rate else None), choose_payloads(args.mix, 1, rng)[0]
+
+    work = schedule()
+    results = []
+    lock = threading.Lock()
+    deadline = start_time + args.duration if args.duration else None
+
+    def worker():
+        conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=args.timeout)
+        while True:
+            with lock:
+                arrival, name = next(work, (None, None))
+            if name is None:
+                break
+            if arrival is not None:
+                delay = start_time + arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                begin = start_time + arrival
+            else:
+                begin = time.perf_counter()
+            if deadline and begin > deadline:
+                break
+            status = send(conn, PAYLOADS[name])
+            with lock:
+                results.append((begin - start_time, time.perf_counter() - begin, status, name))
+        conn.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+# ============ Report ============
+
+def percentile(sorted_values, pct):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def summarize(results, elapsed, rss_samples):
+    ok = sorted(latency for _, latency, status, _ in results if status == 200)
+    report = {
+        'requests': len(results),
+        'elapsed_s': elapsed,
+        'throughput_rps': len(ok) / elapsed if elapsed else 0.0,
+        'error_rate': 1 - len(ok) / len(results) if results else 0.0,
+        'statuses': {},
+        'latency_ms': {},
+        'rss_kb': {},
+        'timeline': [],
+    }
+    for _, _, status, _ in results:
+        report['statuses'][str(status)] = report['statuses'].get(str(status), 0) + 1
+    if ok:
+        report['latency_ms'] = {'p50': percentile(ok, 50) * 1000, 'p95': percentile(ok, 95) * 1000,
+                                'p99': percentile(ok, 99) * 1000, 'max': ok[-1] * 1000,
+                                'mean': statistics.fmean(ok) * 1000}
+    if rss_samples:
+        values = [rss for _, rss in rss_samples]
+        report['rss_kb'] = {'start': values[0], 'peak': max(values), 'end': values[-1]}
+
+    for second in range(int(elapsed) + 1):
+        window = [r for r in results if second <= r[0] < second + 1]
+        latencies = sorted(latency for _, latency, status, _ in window if status == 200)
+        rss = [value for t, value in rss_samples if second <= t < second + 1]
+        report['timeline'].append({
+            'second': second,
+            'completed': len(latencies),
+            'errors': len(window) - len(latencies),
+            'p95_ms': percentile(latencies, 95) * 1000 if latencies else None,
+            'rss_kb': max(rss) if rss else None,
+        })
+    return report
+
+
+def print_report(report, args):
+    print(f"{'second':>6} {'done':>6} {'errors':>7} {'p95 ms':>8} {'RSS MB':>8}")
+    for row in report['timeline']:
+        p95 = f"{row['p95_ms']:.1f}" if row['p95_ms'] is not None else '-'
+        rss = f"{row['rss_kb'] / 1024:.1f}" if row['rss_kb'] is not None else '-'
+        print(f"{row['second']:>6} {row['completed']:>6} {row['errors']:>7} {p95:>8} {rss:>8}")
+
+    latency = report['latency_ms']
+    print(f"\n{report['requests']} requests in {report['elapsed_s']:.1f}s "
+          f"({'open loop at ' + str(args.rate) + '/s' if args.rate else 'closed loop'}, "
+          f"concurrency {args.concurrency})")
+    print(f"throughput  {report['throughput_rps']:.1f} req/s")
+    if latency:
+        print(f"latency     p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  p99 {latency['p99']:.1f}ms  "
+              f"max {latency['max']:.1f}ms")
+    print(f"errors      {report['error_rate']:.2%}  statuses {report['statuses']}")
+    if report['rss_kb']:
+        rss = report['rss_kb']
+        print(f"server RSS  {rss['start'] / 1024:.1f} MB at start, {rss['peak'] / 1024:.1f} MB peak, "
+              f"{rss['end'] / 1024:.1f} MB at end")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in PAYLOADS:
+            raise argparse.ArgumentTypeError(f"Unknown payload '{name}' (expected {', '.join(PAYLOADS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP load test for POST /delivery-receipt.")
+    parser.add_argument("--target", choices=("app", "api"), default="app", help="Server to start (app.py or api/index.py)")
+    parser.add_argument("--server-processes", type=int, default=1,
+                        help="Forked werkzeug server processes (1 = one threaded process)")
+    parser.add_argument("--url", help="Load an already running server instead of starting one")
+    parser.add_argument("--server-pid", type=int, help="With --url: the server pid whose RSS is sampled")
+    parser.add_argument("--rate", type=float, default=20.0, help="Arrivals per second; 0 for a closed loop")
+    parser.add_argument("--concurrency", type=int, default=4, help="Connections sending at once")
+    parser.add_argument("--requests", type=int, help="Requests to send (default 500 unless --duration is set)")
+    parser.add_argument("--duration", type=float, help="Stop sending after this many seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("small=6,full=2,long=1,unicode=1"),
+                        help=f"Weighted payload mix over {', '.join(PAYLOADS)}")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests sent first")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--sample-interval", type=float, default=0.25, help="Seconds between RSS samples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+    if args.requests is None and not args.duration:
+        args.requests = 500
+
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        if args.url:
+            url, pid = args.url, args.server_pid
+        else:
+            server, url = start_server(args.target, args.server_processes, workdir)
+            pid = server.pid
+        try:
+            parts = urlsplit(url)
+            warm = http.client.HTTPConnection(parts.hostname, parts.port, timeout=args.timeout)
+            for name in choose_payloads(args.mix, args.warmup, random.Random(args.seed + 1)):
+                send(warm, PAYLOADS[name])
+            warm.close()
+
+            sampler = RSSSampler(pid, args.sample_interval) if pid else None
+            if sampler:
+                sampler.start()
+            start_time = time.perf_counter()
+            results = run_load(url, args, start_time)
+            elapsed = time.perf_counter() - start_time
+            if sampler:
+                sampler.stop()
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    report = summarize(results, elapsed, sampler.samples if sampler else [])
+    report['config'] = vars(args)
+    print_report(report, args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
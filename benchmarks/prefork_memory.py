@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Per-worker memory and first-request latency of the preforking server,
+with the template preloaded in the master vs. today's lazy behaviour
+(each worker imports and warms up on its own, on first use).
+
+For each mode it starts `python -m prefork`, fires one concurrent wave of
+first requests (one per worker), then reads every worker's
+/proc/<pid>/smaps_rollup. RSS counts shared pages in full for every
+worker; PSS splits them between the processes sharing them and is the
+better measure of what each extra worker really costs.
+
+Linux only (uses /proc).
+
+Usage:
+    python benchmarks/prefork_memory.py --workers 4
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import http.client
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORM = urlencode({
+    'date': '01/30/2026',
+    'consignee': 'Simula PH',
+    'delivery_location': 'Simula PH, Glorietta 2, Makati',
+    'item1_description': 'Hand Soap Starter Kit w/ Ribbon',
+    'item1_quantity': '36 boxes',
+})
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Server did not start on port {port}")
+
+
+def worker_pids(master_pid):
+    with open(f'/proc/{master_pid}/task/{master_pid}/children') as f:
+        return [int(pid) for pid in f.read().split()]
+
+
+def memory_kb(pid):
+    """Rss, Pss and Private_Dirty in kB from smaps_rollup."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Private_Dirty:'):
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+
+def post_receipt(port):
+    t0 = time.perf_counter()
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    conn.request('POST', '/delivery-receipt', FORM,
+                 {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    assert response.status == 200, response.status
+    return (time.perf_counter() - t0) * 1000
+
+
+def measure(mode, workers, settle):
+    port = free_port()
+    env = dict(os.environ,
+               PREFORK_BIND=f'127.0.0.1:{port}',
+               PREFORK_WORKERS=str(workers),
+               PREFORK_PRELOAD='1' if mode == 'preload' else '0',
+               RECEIPT_WARM_START='1' if mode == 'preload' else '0')
+    proc = subprocess.Popen([sys.executable, '-m', 'prefork'], cwd=BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_port(port)
+        # Give every worker time to fork and reach accept()
+        time.sleep(settle)
+        with ThreadPoolExecutor(workers) as pool:
+            first = list(pool.map(post_receipt, [port] * workers))
+        steady = [post_receipt(port) for _ in range(workers * 3)]
+        memory = [memory_kb(pid) for pid in worker_pids(proc.pid)]
+        master = memory_kb(proc.pid)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return first, steady, memory, master
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefork memory and first-request latency report.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds to wait after the port opens")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'RSS/worker':>11} {'PSS/worker':>11} {'private':>9} {'master RSS':>11} "
+          f"{'1st req p50':>12} {'1st req max':>12} {'steady p50':>11}")
+    for mode in ('lazy', 'preload'):
+        first, steady, memory, master = measure(mode, args.workers, args.settle)
+        rss = statistics.mean(m['Rss'] for m in memory) / 1024
+        pss = statistics.mean(m['Pss'] for m in memory) / 1024
+        private = statistics.mean(m['Private_Dirty'] for m in memory) / 1024
+        print(f"{mode:<8} {rss:>9.1f}MB {pss:>9.1f}MB {private:>7.1f}MB {master['Rss'] / 1024:>9.1f}MB "
+              f"{statistics.median(first):>10.1f}ms {max(first):>10.1f}ms {statistics.median(steady):>9.1f}ms")
+    print(f"({args.workers} workers; memory read after the first wave and {args.workers * 3} more requests)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Memory soak test: many fills in one process, asserting memory stays flat.
+
+Fills receipts through one entry point for --fills iterations:
+
+- engine: ReceiptTemplate.fill_bytes directly
+- app: POST /delivery-receipt on app.py through Flask's test client
+  (outputs go to a temporary folder, emptied after every request)
+- api: POST /delivery-receipt on api/index.py through the test client
+
+With --fail-every N, every Nth fill raises inside draw_text_in_rect, half
+way through the page, so the error path (a document opened but never
+saved) runs thousands of times too.
+
+Every --sample-every fills it records RSS, live Python objects and open
+fitz documents. After --warmup fills (caches, allocator pools and the
+template variants settle), RSS growth is the least-squares slope over the
+remaining samples times their span, so one noisy sample can't fail or
+pass the run. Exits 1 if growth passes --max-growth-mb or open documents
+pile up.
+
+Usage:
+    python benchmarks/soak_memory.py                      # 100k engine fills
+    python benchmarks/soak_memory.py --target app --fills 20000 --fail-every 50 -o soak.json
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import importlib.util
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import fitz  # noqa: E402
+
+import receipt_engine  # noqa: E402
+from memory_watchdog import current_rss_kb  # noqa: E402
+
+ITEMS = [
+    {'description': 'Hand Soap Starter Kit w/ Ribbon', 'quantity': '36 boxes', 'remarks': 'No issues'},
+    {'description': 'Hand Soap Refill Pouch 1L', 'quantity': '12 boxes', 'remarks': 'No issues'},
+    {'description': 'Dishwashing Liquid 500ml', 'quantity': '48 bottles', 'remarks': 'Two dented'},
+    {'description': 'Laundry Powder 2kg', 'quantity': '20 bags', 'remarks': 'No issues'},
+    {'description': 'Glass Cleaner Spray 750ml', 'quantity': '24 bottles', 'remarks': 'Sealed'},
+]
+
+
+def receipt(n):
+    """Varied receipts: item count, consignee and numbers change with n."""
+    items = [dict(item, quantity=f'{(n + i) % 97 + 1} boxes') for i, item in enumerate(ITEMS[:n % 5 + 1])]
+    return {'date': '01/30/2026', 'consignee': f'Consignee {n % 1000}',
+            'delivery_location': f'Warehouse {n % 37}, Makati', 'items': items}
+
+
+def form(data):
+    fields = {'date': data['date'], 'consignee': data['consignee'], 'delivery_location': data['delivery_location']}
+    for i, item in enumerate(data['items'], 1):
+        fields.update({f'item{i}_description': item['description'], f'item{i}_quantity': item['quantity'],
+                       f'item{i}_remarks': item['remarks']})
+    return fields
+
+
+class InjectedFault(RuntimeError):
+    pass
+
+
+class Faults:
+    """Make draw_text_in_rect raise in the middle of every Nth fill."""
+
+    def __init__(self, every):
+        self.every = every
+        self.fills = 0
+        self.calls = 0
+        self.armed = False
+        self.original = receipt_engine.draw_text_in_rect
+        if every:
+            receipt_engine.draw_text_in_rect = self.draw
+
+    def next_fill(self):
+        self.fills += 1
+        self.calls = 0
+        self.armed = bool(self.every) and self.fills % self.every == 0
+
+    def draw(self, *args, **kwargs):
+        self.calls += 1
+        if self.armed and self.calls > 3:
+            self.armed = False
+            raise InjectedFault('injected fault')
+        return self.original(*args, **kwargs)
+
+
+def load_target(name, tmp):
+    """fill(data) -> True if a PDF came back."""
+    if name == 'engine':
+        template = receipt_engine.get_template()
+
+        def fill(data):
+            try:
+                return bool(template.fill_bytes(data))
+            except InjectedFault:
+                return False
+        return fill
+
+    if name == 'app':
+        import app as module
+        module.app.config['OUTPUT_FOLDER'] = tmp
+    else:
+        spec = importlib.util.spec_from_file_location('api_index', os.path.join(BASE_DIR, 'api', 'index.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    client = module.app.test_client()
+
+    def fill(data):
+        response = client.post('/delivery-receipt', data=form(data))
+        ok = response.mimetype == 'application/pdf'
+        response.close()
+        for entry in os.scandir(tmp):
+            os.unlink(entry.path)
+        return ok
+    return fill
+
+
+def open_documents():
+    return sum(1 for obj in gc.get_objects() if isinstance(obj, fitz.Document) and not obj.is_closed)
+
+
+def sample(fills, started):
+    return {
+        'fills': fills,
+        'seconds': round(time.perf_counter() - started, 2),
+        'rss_kb': current_rss_kb(),
+        'objects': len(gc.get_objects()),
+        'open_documents': open_documents(),
+    }
+
+
+def growth(samples, key):
+    """Fitted growth of samples[key] from the first sample to the last."""
+    if len(samples) < 3:
+        return 0.0
+    xs = [s['fills'] for s in samples]
+    slope, _ = statistics.linear_regression(xs, [s[key] for s in samples])
+    return slope * (xs[-1] - xs[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory soak test for the fill entry points.")
+    parser.add_argument("--target", choices=("engine", "app", "api"), default="engine")
+    parser.add_argument("--fills", type=int, default=100000)
+    parser.add_argument("--warmup", type=int, default=5000, help="Fills before growth is measured")
+    parser.add_argument("--sample-every", type=int, default=1000)
+    parser.add_argument("--fail-every", type=int, default=0, help="Make every Nth fill raise mid-draw (0: never)")
+    parser.add_argument("--max-growth-mb", type=float, default=8.0, help="Allowed RSS growth after warm-up")
+    parser.add_argument("-o", "--output", help="Write samples and the verdict as JSON")
+    args = parser.parse_args()
+
+    if current_rss_kb() is None:
+        raise SystemExit("Can't read this process's RSS on this platform")
+    if args.warmup + 3 * args.sample_every > args.fills:
+        parser.error("--fills must leave at least 3 samples after --warmup")
+
+    tmp = tempfile.mkdtemp(prefix='soak_')
+    try:
+        fill = load_target(args.target, tmp)
+        faults = Faults(args.fail_every)
+        print(f"{args.target}: {args.fills} fills, warm-up {args.warmup}, "
+              f"fault every {args.fail_every or 'never'}")
+        print(f"{'fills':>8} {'RSS MB':>8} {'objects':>9} {'open docs':>9} {'fills/s':>8}")
+
+        started = time.perf_counter()
+        samples, failures, last = [], 0, (0, started)
+        for n in range(1, args.fills + 1):
+            faults.next_fill()
+            if not fill(receipt(n)):
+                failures += 1
+            if n % args.sample_every == 0:
+                point = sample(n, started)
+                samples.append(point)
+                now = time.perf_counter()
+                rate = (n - last[0]) / (now - last[1])
+                last = (n, now)
+                print(f"{n:>8} {point['rss_kb'] / 1024:>8.1f} {point['objects']:>9} "
+                      f"{point['open_documents']:>9} {rate:>8.0f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    expected = faults.fills // args.fail_every if args.fail_every else 0
+    measured = [s for s in samples if s['fills'] > args.warmup]
+    rss_growth_mb = growth(measured, 'rss_kb') / 1024
+    objects_growth = growth(measured, 'objects')
+    leaked_documents = samples[-1]['open_documents']
+
+    problems = []
+    if rss_growth_mb > args.max_growth_mb:
+        problems.append(f"RSS grew {rss_growth_mb:.1f} MB after warm-up (limit {args.max_growth_mb} MB)")
+    if leaked_documents:
+        problems.append(f"{leaked_documents} fitz documents are still open")
+    if failures != expected:
+        problems.append(f"{failures} fills failed, {expected} faults were injected")
+
+    print(f"\nRSS {measured[0]['rss_kb'] / 1024:.1f} -> {measured[-1]['rss_kb'] / 1024:.1f} MB, "
+          f"fitted growth {rss_growth_mb:+.2f} MB over {measured[-1]['fills'] - measured[0]['fills']} fills; "
+          f"objects {objects_growth:+.0f}; failed fills {failures}")
+    print("FAIL: " + "; ".join(problems) if problems else "OK: memory is flat")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'target': args.target, 'fills': args.fills, 'warmup': args.warmup,
+                       'fail_every': args.fail_every, 'failures': failures,
+                       'rss_growth_mb': rss_growth_mb, 'objects_growth': objects_growth,
+                       'max_growth_mb': args.max_growth_mb, 'problems': problems,
+                       'samples': samples}, f, indent=2)
+        print(f"Wrote {args.output}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Visual regression check for filled delivery receipts.
+
+`record` fills a deterministic set of layout cases through the engine
+(ReceiptTemplate.fill_bytes, so variants and the save path are covered),
+rasterizes each output at low DPI and stores the rasters as goldens.
+`check` fills the same cases with the current code and compares them to
+the goldens, field by field, and exits 1 on drift.
+
+Only what the fill draws is compared: the template's scanned image is
+swapped for a blank one before rasterizing, which makes a render well under
+a millisecond and leaves the goldens almost all zeros (they compress to a
+few KB per case). For every field rect (padded by FIELD_PAD_PT) the check
+reports the pixels whose ink changed by more than --tolerance grey levels,
+the shift of the ink's centroid in points and the change in total ink.
+Pixels changed outside every field are reported as "(outside)". All fields
+of a case are measured at once: the per-field sums and moments are matrix
+products of the rasters with 0/1 row and column masks of the field rects.
+
+Cases vary the item count (0-5), text length (short, shrinking, down to the
+minimum font size), empty remarks, non-ASCII text and consignees from the
+directory (drawn from a pre-baked variant).
+
+Usage:
+    python benchmarks/visual_regression.py record               # before the change
+    python benchmarks/visual_regression.py check                # after it
+    python benchmarks/visual_regression.py record --cases 300 -o /tmp/wide.npz   # a wider sweep
+    python benchmarks/visual_regression.py check --profile compact --diff-dir drift/ --report drift.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import fitz  # noqa: E402
+import numpy as np  # noqa: E402
+
+import receipt_engine  # noqa: E402
+
+DEFAULT_GOLDENS = os.path.join(BASE_DIR, 'benchmarks', 'baselines', 'receipt_goldens.npz')
+DEFAULT_DPI = 36
+# The committed goldens: one case per item count (0-5)
+DEFAULT_CASES = 6
+# Drawn text may overhang its rect a little (descenders, the -8pt baseline lift)
+FIELD_PAD_PT = 4
+OUTSIDE = '(outside)'
+
+WORDS = ['Hand', 'Soap', 'Starter', 'Kit', 'Refill', 'Pouch', 'Dishwashing', 'Liquid', 'Laundry', 'Powder',
+         'Glass', 'Cleaner', 'Spray', 'assorted', 'scents', 'with', 'display', 'carton', 'lemon', 'lime',
+         'concentrate', 'squeeze', 'bottle', 'pack', 'of', '12', '500ml', '1L', '2kg', 'w/']
+ACCENTED = ['Peñafrancia', 'Café', 'Señor', 'Niño', 'Pâtisserie', 'São', 'Paulo', 'Zoë', 'Ångström', '—']
+CONSIGNEES = [('Simula PH', 'Simula PH, Glorietta 2, Makati'),
+              ('The Clean Room Trading', 'Unit 1203, Tower 2, Ayala Triangle Gardens, Paseo de Roxas, Makati City'),
+              ('Peñafrancia Café', 'Ortigas Ave., Pasig — São Paulo Bldg.')]
+# Words per text: short, medium, long enough to shrink the font, far past MIN_FONT_SIZE
+LENGTHS = (1, 4, 12, 40)
+
+
+# ============ Cases ============
+
+def make_cases(count, seed=0):
+    """`count` receipts cycling through the layout dimensions, with seeded text."""
+    rng = random.Random(seed)
+
+    def text(words, accented=False):
+        pool = WORDS + ACCENTED if accented else WORDS
+        return ' '.join(rng.choice(pool) for _ in range(words))
+
+    cases = []
+    for i in range(count):
+        accented = i % 7 == 3
+        if i % 4 == 0:
+            consignee, location = CONSIGNEES[i // 4 % len(CONSIGNEES)]
+        else:
+            consignee, location = text(LENGTHS[i % 3] + 1, accented), text(LENGTHS[i // 3 % 4] + 2, accented)
+        items = []
+        for row in range(i % (len(receipt_engine.TABLE_ROWS) + 1)):
+            length = LENGTHS[(i + row) % len(LENGTHS)]
+            items.append({
+                'description': text(length, accented),
+                'quantity': f"{rng.randint(1, 500)} {rng.choice(['boxes', 'bottles', 'bags', 'units'])}",
+                'remarks': '' if (i + row) % 5 == 0 else text(LENGTHS[(i + row) % 3], accented),
+            })
+        date = f"{1 + i % 12:02d}/{1 + i % 28:02d}/20{20 + i % 10}"
+        cases.append({'date': date, 'consignee': consignee, 'delivery_location': location, 'items': items})
+    return cases
+
+
+# ============ Rendering ============
+
+def blank_images(doc):
+    """Swap every image on page 1 for one white pixel, leaving only drawn text and vectors."""
+    for xref, *_ in doc[0].get_images(full=True):
+        doc.update_stream(xref, b'\xff', compress=0)
+        for key, value in (('Width', '1'), ('Height', '1'), ('ColorSpace', '/DeviceGray'),
+                           ('BitsPerComponent', '8'), ('Filter', 'null'), ('DecodeParms', 'null'),
+                           ('SMask', 'null'), ('Decode', 'null')):
+            doc.xref_set_key(xref, key, value)
+
+
+def ink(pdf_bytes, dpi):
+    """Ink coverage (255 - grey) of page 1 without its images, as uint8 rows."""
+    doc = fitz.open(stream=pdf_bytes, filetype='pdf')
+    try:
+        blank_images(doc)
+        pix = doc[0].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+        gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+        return 255 - gray
+    finally:
+        doc.close()
+
+
+def render_cases(cases, dpi, profile=None):
+    """(ink stack of shape (cases, h, w), field names, padded field rects in points)."""
+    compact = receipt_engine.output_profile(profile)[0]
+    template = receipt_engine.ReceiptTemplate(receipt_engine.DEFAULT_TEMPLATE_PATH, compact)
+    template.set_directory(dict(CONSIGNEES), 'visual-regression')
+
+    rasters = [ink(template.fill_bytes(data, profile=profile), dpi) for data in cases]
+    fields = [field for field, *_ in template.layout]
+    rects = np.array([tuple(rect + (-FIELD_PAD_PT, -FIELD_PAD_PT, FIELD_PAD_PT, FIELD_PAD_PT))
+                      for _, rect, *_ in template.layout])
+    return np.stack(rasters), fields, rects
+
+
+# ============ Comparison ============
+
+def pixel_boxes(rects, dpi, shape):
+    """Field rects (points) as clipped pixel bounds (x0, y0, x1, y1), inclusive-exclusive."""
+    boxes = np.rint(rects * dpi / 72).astype(np.int64)
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    return boxes
+
+
+def field_masks(boxes, shape):
+    """0/1 masks of the rows (height, boxes) and columns (width, boxes) each box spans."""
+    x0, y0, x1, y1 = boxes.T
+    ys = np.arange(shape[0])[:, None]
+    xs = np.arange(shape[1])[:, None]
+    return ((ys >= y0) & (ys < y1)).astype(np.float64), ((xs >= x0) & (xs < x1)).astype(np.float64)
+
+
+def field_moments(planes, rows, cols):
+    """Sum, x-moment and y-moment of each plane inside each box, each shape (planes, boxes).
+
+    plane @ cols sums every row across each box's columns; weighting those
+    row sums with the row masks finishes the box sums, all in BLAS.
+    """
+    boxes = cols.shape[1]
+    xs = np.arange(cols.shape[0])[:, None]
+    ys = np.arange(rows.shape[0])[:, None]
+    row_sums = planes @ np.hstack([cols, cols * xs])
+    mass = np.einsum('phb,hb->pb', row_sums[:, :, :boxes], rows)
+    x = np.einsum('phb,hb->pb', row_sums[:, :, boxes:], rows)
+    y = np.einsum('phb,hb->pb', row_sums[:, :, :boxes], rows * ys)
+    return mass, x, y
+
+
+def compare_case(golden, current, masks, covered, tolerance, px_per_pt):
+    """Per-field drift of one case: changed pixels, centroid shift (pt) and ink change."""
+    golden = golden.astype(np.float64)
+    current = current.astype(np.float64)
+    changed = np.abs(current - golden) > tolerance
+    mass, x, y = field_moments(np.stack([changed, golden, current]), *masks)
+    counts, g_mass, c_mass = mass
+    found = (g_mass > 0) & (c_mass > 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dx = np.where(found, x[2] / c_mass - x[1] / g_mass, 0.0) / px_per_pt
+        dy = np.where(found, y[2] / c_mass - y[1] / g_mass, 0.0) / px_per_pt
+        ink_change = np.where(g_mass > 0, c_mass / g_mass - 1, np.where(c_mass > 0, np.inf, 0.0))
+    return np.rint(counts).astype(np.int64), dx, dy, ink_change, int(changed[~covered].sum())
+
+
+def check_goldens(goldens, current, fields, boxes, tolerance, max_pixels, dpi):
+    """Drift records ({case, field, changed_px, dx_pt, dy_pt, ink_change}) past max_pixels."""
+    masks = field_masks(boxes, goldens.shape[1:])
+    covered = (masks[0] @ masks[1].T) > 0
+
+    drift = []
+    for case, (golden, raster) in enumerate(zip(goldens, current)):
+        if not np.any(golden != raster):
+            continue
+        counts, dx, dy, ink_change, outside = compare_case(golden, raster, masks, covered, tolerance, dpi / 72)
+        for f in np.flatnonzero(counts > max_pixels):
+            drift.append({'case': case, 'field': fields[f], 'changed_px': int(counts[f]),
+                          'dx_pt': float(dx[f]), 'dy_pt': float(dy[f]), 'ink_change': float(ink_change[f])})
+        if outside > max_pixels:
+            drift.append({'case': case, 'field': OUTSIDE, 'changed_px': outside,
+                          'dx_pt': 0.0, 'dy_pt': 0.0, 'ink_change': 0.0})
+    return drift
+
+
+def write_diff(path, golden, current):
+    """PNG of a case: ink only in the golden in red, only in the current render in blue."""
+    rgb = np.full(golden.shape + (3,), 255, dtype=np.uint8)
+    both = np.minimum(golden, current)
+    rgb -= both[..., None]
+    rgb[..., 1] -= np.maximum(golden, current) - both
+    rgb[..., 2] -= (golden - both)
+    rgb[..., 0] -= (current - both)
+    height, width = golden.shape
+    fitz.Pixmap(fitz.csRGB, width, height, np.ascontiguousarray(rgb).tobytes(), False).save(path)
+
+
+# ============ Commands ============
+
+def record_command(args):
+    cases = make_cases(args.cases, args.seed)
+    t0 = time.perf_counter()
+    rasters, fields, rects = render_cases(cases, args.dpi, args.profile)
+    elapsed = time.perf_counter() - t0
+
+    # savez_compressed would add the suffix itself, leaving args.output naming nothing
+    if not args.output.endswith('.npz'):
+        args.output += '.npz'
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    np.savez_compressed(args.output, ink=rasters, dpi=args.dpi, fields=np.array(fields), rects=rects,
+                        cases=json.dumps(cases), fitz_version=fitz.VersionBind)
+    print(f"Recorded {len(cases)} cases at {args.dpi} DPI in {elapsed:.2f}s "
+          f"({elapsed / len(cases) * 1000:.1f}ms each) to {args.output} ({os.path.getsize(args.output) // 1024} KB)")
+    return 0
+
+
+def check_command(args):
+    if not os.path.isfile(args.goldens):
+        print(f"No goldens at {args.goldens}; run `record` first")
+        return 1
+    with np.load(args.goldens) as stored:
+        goldens = stored['ink']
+        dpi = int(stored['dpi'])
+        fields = [str(field) for field in stored['fields']]
+        rects = stored['rects']
+        cases = json.loads(str(stored['cases']))
+        recorded_with = str(stored['fitz_version'])
+    if recorded_with != fitz.VersionBind:
+        print(f"Note: goldens were recorded with MuPDF {recorded_with}, this is {fitz.VersionBind}; "
+              f"anti-aliasing may differ slightly")
+
+    t0 = time.perf_counter()
+    current, _, _ = render_cases(cases, dpi, args.profile)
+    rendered = time.perf_counter()
+    if current.shape != goldens.shape:
+        print(f"Page raster changed from {goldens.shape[1:]} to {current.shape[1:]} pixels: page size differs")
+        return 1
+    boxes = pixel_boxes(rects, dpi, goldens.shape[1:])
+    drift = check_goldens(goldens, current, fields, boxes, args.tolerance, args.max_pixels, dpi)
+    compared = time.perf_counter()
+
+    if drift:
+        print(f"{'case':>5} {'field':<20} {'changed px':>10} {'dx pt':>7} {'dy pt':>7} {'ink':>8}")
+        for row in drift[:args.limit]:
+            print(f"{row['case']:>5} {row['field']:<20} {row['changed_px']:>10} {row['dx_pt']:>+7.2f} "
+                  f"{row['dy_pt']:>+7.2f} {row['ink_change']:>+8.1%}")
+        if len(drift) > args.limit:
+            print(f"... and {len(drift) - args.limit} more (see --report)")
+    drifted = sorted({row['case'] for row in drift})
+    print(f"{len(cases)} cases x {len(fields)} fields: {len(drift)} drifted fields in {len(drifted)} cases "
+          f"(render {(rendered - t0) / len(cases) * 1000:.1f}ms/case, compare {(compared - rendered) * 1000:.0f}ms total)")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'dpi': dpi, 'tolerance': args.tolerance, 'drift': drift,
+                       'cases': {str(case): cases[case] for case in drifted}}, f, indent=2)
+        print(f"Report written to {args.report}")
+    if args.diff_dir and drifted:
+        os.makedirs(args.diff_dir, exist_ok=True)
+        for case in drifted:
+            write_diff(os.path.join(args.diff_dir, f'case_{case:04d}.png'), goldens[case], current[case])
+        print(f"Diff images (red: golden only, blue: current only) written to {args.diff_dir}")
+    return 1 if drift else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Visual regression check for filled receipts.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="Render the cases and store them as goldens")
+    record_parser.add_argument("-o", "--output", default=DEFAULT_GOLDENS)
+    record_parser.add_argument("--cases", type=int, default=DEFAULT_CASES, help="Number of layout cases")
+    record_parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help="Raster resolution")
+    record_parser.add_argument("--seed", type=int, default=0)
+    record_parser.add_argument("--profile", choices=list(receipt_engine.SAVE_PROFILES), help="Output profile")
+
+    check_parser = commands.add_parser("check", help="Compare the current fills to the goldens")
+    check_parser.add_argument("goldens", nargs="?", default=DEFAULT_GOLDENS)
+    check_parser.add_argument("--tolerance", type=int, default=32, help="Grey levels of change ignored per pixel")
+    check_parser.add_argument("--max-pixels", type=int, default=0, help="Changed pixels allowed per field")
+    check_parser.add_argument("--profile", choices=list(receipt_engine.SAVE_PROFILES), help="Output profile")
+    check_parser.add_argument("--limit", type=int, default=40, help="Drift rows to print")
+    check_parser.add_argument("--report", help="Write the drift as JSON, with the drifted cases' data")
+    check_parser.add_argument("--diff-dir", help="Write a diff PNG per drifted case")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        return record_command(args)
+    return check_command(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Consignee Directory
+Server-side list of consignees and their delivery locations, loaded from
+CSV (name,location) or SQLite (table `consignees` with name and location
+columns), with an in-memory index for typeahead search.
+
+Search ranks, in order:
+1. names starting with the query,
+2. names with a word starting with the query,
+3. when nothing matched by prefix, fuzzy matches: each query word is
+   corrected against the vocabulary of name words by shared trigrams
+   ("simla" -> "simula"), and names holding every corrected word are
+   returned.
+
+Prefix lookups are a bisect on sorted keys, so they stay sub-millisecond
+at 100k entries. The trigram index covers distinct words rather than whole
+names, which keeps its posting lists short, and it is only consulted when
+the prefix passes find nothing.
+"""
+
+import os
+import csv
+import bisect
+import heapq
+import math
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+
+from receipt_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DIRECTORY_PATH = os.path.join(BASE_DIR, 'consignees.csv')
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+RESPONSE_CACHE_SIZE = 2048
+# Fraction of a query word's trigrams a vocabulary word must contain
+MIN_FUZZY_SCORE = 0.5
+# Vocabulary words tried per misspelt query word
+FUZZY_CORRECTIONS = 3
+# Corrections differ in length from the query word by at most this much
+FUZZY_LENGTH_SLACK = 2
+
+
+def normalize(text):
+    """Casefold, strip accents and collapse whitespace: 'Café  Niño' -> 'cafe nino'."""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ConsigneeDirectory(Mapping):
+    """Read-only {consignee: location} mapping with prefix and trigram search."""
+
+    def __init__(self, entries, version=None):
+        self.locations = {}
+        for name, location in entries:
+            name, location = name.strip(), location.strip()
+            if name:
+                self.locations[name] = location
+        self.names = list(self.locations)
+
+        if version is None:
+            digest = hashlib.sha256()
+            for name in self.names:
+                digest.update(f'{name}\x00{self.locations[name]}\x01'.encode())
+            version = digest.hexdigest()
+        self.version = version
+
+        self._build_index()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _build_index(self):
+        normalized = [normalize(name) for name in self.names]
+        self.normalized = normalized
+
+        # Whole-name and per-word prefix indexes, both sorted (key, id)
+        self.name_keys = sorted((key, i) for i, key in enumerate(normalized))
+        self.word_keys = sorted({(word, i) for i, key in enumerate(normalized) for word in key.split()})
+
+        # Ordered by length so every posting list is too, and can be cut
+        # down to words of similar length with a bisect
+        self.vocabulary = sorted({word for word, _ in self.word_keys}, key=lambda word: (len(word), word))
+        self.vocabulary_lengths = [len(word) for word in self.vocabulary]
+        postings = {}
+        for w, word in enumerate(self.vocabulary):
+            for gram in trigrams(word):
+                postings.setdefault(gram, []).append(w)
+        self.trigram_postings = postings
+
+    # Mapping interface (used by the fill engine for pre-baked variants)
+
+    def __getitem__(self, name):
+        return self.locations[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    # ============ Search ============
+
+    @staticmethod
+    def _prefix_range(keys, query):
+        start = bisect.bisect_left(keys, (query,))
+        # U+FFFF sorts after any character that can follow the prefix
+        end = bisect.bisect_left(keys, (query + '\uffff',), lo=start)
+        return start, end
+
+    def _prefix_matches(self, keys, query, limit, seen):
+        start, end = self._prefix_range(keys, query)
+        matches = []
+        for position in range(start, end):
+            i = keys[position][1]
+            if i not in seen:
+                seen.add(i)
+                matches.append(i)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def _corrections(self, word):
+        """Vocabulary words sharing most of word's trigrams, best first."""
+        grams = trigrams(word)
+        need = math.ceil(MIN_FUZZY_SCORE * len(grams))
+        lo = bisect.bisect_left(self.vocabulary_lengths, len(word) - FUZZY_LENGTH_SLACK)
+        hi = bisect.bisect_right(self.vocabulary_lengths, len(word) + FUZZY_LENGTH_SLACK)
+        counts = Counter()
+        for gram in grams:
+            posting = self.trigram_postings.get(gram)
+            if posting:
+                counts.update(posting[bisect.bisect_left(posting, lo):bisect.bisect_left(posting, hi)])
+
+        scored = sorted((-shared, abs(self.vocabulary_lengths[w] - len(word)), self.vocabulary[w])
+                        for w, shared in counts.items() if shared >= need)
+        return [(candidate, -shared / len(grams)) for shared, _, candidate in scored[:FUZZY_CORRECTIONS]]
+
+    def _word_range(self, word):
+        start = bisect.bisect_left(self.word_keys, (word,))
+        return start, bisect.bisect_left(self.word_keys, (word, len(self.names)), lo=start)
+
+    def _fuzzy_matches(self, query, limit):
+        words = query.split()
+        # Words too short for trigrams are only used as prefix filters
+        short = [word for word in words if len(word) < 3]
+        corrections = [dict(self._corrections(word)) for word in words if len(word) >= 3]
+        if not corrections or not all(corrections):
+            return []
+
+        # Seed candidates from the query word whose corrections cover the fewest
+        # names, then check the remaining words against each candidate's words
+        ranges = [{word: self._word_range(word) for word in found} for found in corrections]
+        seed = min(range(len(ranges)), key=lambda n: sum(end - start for start, end in ranges[n].values()))
+        scores = {}
+        for word, (start, end) in ranges[seed].items():
+            score = corrections[seed][word]
+            for position in range(start, end):
+                i = self.word_keys[position][1]
+                scores[i] = max(score, scores.get(i, 0))
+
+        ranked = []
+        for i, score in scores.items():
+            name_words = self.normalized[i].split()
+            for n, found in enumerate(corrections):
+                if n != seed:
+                    best = max(found.get(word, 0) for word in name_words)
+                    if not best:
+                        break
+                    score += best
+            else:
+                if all(any(word.startswith(prefix) for word in name_words) for prefix in short):
+                    # Best total correction score, then shorter names (fewer unmatched words)
+                    ranked.append((-score, len(self.normalized[i]), self.normalized[i], i))
+        return [entry[-1] for entry in heapq.nsmallest(limit, ranked)]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return up to `limit` entry ids best matching query."""
+        query = normalize(query)
+        limit = max(1, min(limit, MAX_LIMIT))
+        if not query:
+            return [i for _, i in self.name_keys[:limit]]
+
+        seen = set()
+        results = self._prefix_matches(self.name_keys, query, limit, seen)
+        if len(results) < limit:
+            results += self._prefix_matches(self.word_keys, query, limit - len(results), seen)
+        if not results:
+            # Only when nothing starts with the query: likely a typo
+            results = self._fuzzy_matches(query, limit)
+        return results
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        """Search results as [{'name', 'location'}], memoized per (query, limit)."""
+        key = (normalize(query), limit)
+        with self._cache_lock:
+            results = self._cache.get(key)
+            if results is not None:
+                self._cache.move_to_end(key)
+        if results is not None:
+            METRICS.inc('receipt_cache_hits_total', cache='consignee_search')
+            return results
+
+        METRICS.inc('receipt_cache_misses_total', cache='consignee_search')
+
+        results = [{'name': self.names[i], 'location': self.locations[self.names[i]]}
+                   for i in self.search(query, limit)]
+        with self._cache_lock:
+            self._cache[key] = results
+            while len(self._cache) > RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return results
+
+
+# ============ Loading ============
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield row.get('name') or '', row.get('location') or ''
+
+
+def read_sqlite(path, table='consignees'):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        yield from conn.execute(f'SELECT name, location FROM {table}')
+    finally:
+        conn.close()
+
+
+def load_directory(path):
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        entries = list(read_sqlite(path))
+    else:
+        entries = list(read_csv(path))
+    directory = ConsigneeDirectory(entries)
+    logger.info(f"Loaded {len(directory)} consignees from {path}")
+    return directory
+
+
+_directories = {}
+
+
+def get_directory(path=DEFAULT_DIRECTORY_PATH):
+    """Return the loaded directory for path, reloading it if the file changed."""
+    cached = _directories.get(path)
+    stat = os.stat(path)
+    fingerprint = (stat.st_mtime_ns, stat.st_size)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    directory = load_directory(path)
+    _directories[path] = (fingerprint, directory)
+    return directory
@@ -2,12 +2,31 @@
 """
 Delivery Receipt PDF Filler
 A tool to autofill the delivery receipt template with user-provided information.
+
+Run without arguments for the interactive prompts, or export a batch of
+receipts as print-ready 1-bit images for thermal and label printers:
+
+    python delivery_receipt_filler.py --export receipts.json --format pbm --dpi 203 --out outputs/raster
+    python delivery_receipt_filler.py --export receipts.json --out - | lpr   # PBM stream on stdout
 """
 
-import fitz  # PyMuPDF
 import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 
+if __name__ == "__main__":
+    # fitz prints a deprecation notice on stdout when first imported, which
+    # would corrupt a PBM stream written there (export workers inherit this);
+    # run_export() redirects later messages
+    os.environ.setdefault("PYMUPDF_MESSAGE", "fd:2")
+
+import fitz  # PyMuPDF
+import numpy as np
+
 # Define the field positions based on the template analysis
 # These are the positions where we'll place the new text (replacing the old text)
 FIELD_POSITIONS = {
@@ -185,89 +204,258 @@ def fill_pdf(data, template_path, output_path):
     
     # Open the template
     doc = fitz.open(template_path)
-    page = doc[0]
-    
-    # Define colors
-    white = fitz.pdfcolor["white"]
-    black = fitz.pdfcolor["black"]
-    
-    # Font settings
-    font_name = "helv"  # Helvetica
-    font_size = 10
-    
-    # Helper function to replace text area
-    def cover_and_write(rect, new_text, font_size=10):
-        """Cover the original text with white and write new text."""
-        # Create a white rectangle to cover the original text
-        shape = page.new_shape()
-        shape.draw_rect(rect)
-        shape.finish(fill=white, color=white)
-        shape.commit()
-        
-        # Write the new text
-        text_point = fitz.Point(rect.x0, rect.y1 - 2)  # Position at bottom-left of rect
-        page.insert_text(text_point, new_text, fontname=font_name, fontsize=font_size, color=black)
-    
-    # 1. Replace the date at the top (after "Date: ")
-    date_rect = fitz.Rect(95, 108, 220, 126)
-    cover_and_write(date_rect, data['date'])
-    
-    # 2. Replace the consignee (after "Consignee: ")
-    consignee_rect = fitz.Rect(130, 176, 400, 193)
-    cover_and_write(consignee_rect, data['consignee'])
-    
-    # 3. Replace the delivery location (after "Delivery Location: ")
-    location_rect = fitz.Rect(165, 191, 540, 208)
-    cover_and_write(location_rect, data['delivery_location'])
-    
-    # 4. Replace the date at the bottom (with underscores)
-    date_bottom_rect = fitz.Rect(72, 522, 220, 540)
-    date_with_underscores = f" ______{data['date']}_______ "
-    cover_and_write(date_bottom_rect, date_with_underscores)
-    
-    # 5. Replace items in the table
-    for i, item in enumerate(data['items'][:2]):  # Max 2 items
-        row = TABLE_ROWS[i]
-        y_top = row['y_start'] - 2
-        y_bottom = row['y_end'] + 2
-        
-        # Item description (with number prefix)
-        desc_rect = fitz.Rect(
-            TABLE_COLUMNS['item_description']['x_start'],
-            y_top,
-            TABLE_COLUMNS['item_description']['x_end'],
-            y_bottom
-        )
-        cover_and_write(desc_rect, f"{i + 1}. {item['description']}")
-        
-        # Quantity
-        qty_rect = fitz.Rect(
-            TABLE_COLUMNS['quantity']['x_start'],
-            y_top,
-            TABLE_COLUMNS['quantity']['x_end'],
-            y_bottom
-        )
-        cover_and_write(qty_rect, item['quantity'])
-        
-        # Remarks
-        remarks_rect = fitz.Rect(
-            TABLE_COLUMNS['remarks']['x_start'],
-            y_top,
-            TABLE_COLUMNS['remarks']['x_end'],
-            y_bottom
-        )
-        cover_and_write(remarks_rect, item['remarks'])
-    
-    # Save the modified PDF
-    doc.save(output_path)
-    doc.close()
+    try:
+        page = doc[0]
+
+        # Define colors
+        white = fitz.pdfcolor["white"]
+        black = fitz.pdfcolor["black"]
+
+        # Font settings
+        font_name = "helv"  # Helvetica
+        font_size = 10
+
+        # Helper function to replace text area
+        def cover_and_write(rect, new_text, font_size=10):
+            """Cover the original text with white and write new text."""
+            # Create a white rectangle to cover the original text
+            shape = page.new_shape()
+            shape.draw_rect(rect)
+            shape.finish(fill=white, color=white)
+            shape.commit()
+
+            # Write the new text
+            text_point = fitz.Point(rect.x0, rect.y1 - 2)  # Position at bottom-left of rect
+            page.insert_text(text_point, new_text, fontname=font_name, fontsize=font_size, color=black)
+
+        # 1. Replace the date at the top (after "Date: ")
+        date_rect = fitz.Rect(95, 108, 220, 126)
+        cover_and_write(date_rect, data['date'])
+
+        # 2. Replace the consignee (after "Consignee: ")
+        consignee_rect = fitz.Rect(130, 176, 400, 193)
+        cover_and_write(consignee_rect, data['consignee'])
+
+        # 3. Replace the delivery location (after "Delivery Location: ")
+        location_rect = fitz.Rect(165, 191, 540, 208)
+        cover_and_write(location_rect, data['delivery_location'])
+
+        # 4. Replace the date at the bottom (with underscores)
+        date_bottom_rect = fitz.Rect(72, 522, 220, 540)
+        date_with_underscores = f" ______{data['date']}_______ "
+        cover_and_write(date_bottom_rect, date_with_underscores)
+
+        # 5. Replace items in the table
+        for i, item in enumerate(data['items'][:2]):  # Max 2 items
+            row = TABLE_ROWS[i]
+            y_top = row['y_start'] - 2
+            y_bottom = row['y_end'] + 2
+
+            # Item description (with number prefix)
+            desc_rect = fitz.Rect(
+                TABLE_COLUMNS['item_description']['x_start'],
+                y_top,
+                TABLE_COLUMNS['item_description']['x_end'],
+                y_bottom
+            )
+            cover_and_write(desc_rect, f"{i + 1}. {item['description']}")
+
+            # Quantity
+            qty_rect = fitz.Rect(
+                TABLE_COLUMNS['quantity']['x_start'],
+                y_top,
+                TABLE_COLUMNS['quantity']['x_end'],
+                y_bottom
+            )
+            cover_and_write(qty_rect, item['quantity'])
+
+            # Remarks
+            remarks_rect = fitz.Rect(
+                TABLE_COLUMNS['remarks']['x_start'],
+                y_top,
+                TABLE_COLUMNS['remarks']['x_end'],
+                y_bottom
+            )
+            cover_and_write(remarks_rect, item['remarks'])
+
+        # Save the modified PDF
+        doc.save(output_path)
+    finally:
+        doc.close()
     
     return output_path
 
 
+# ============ Raster Export ============
+
+RASTER_FORMATS = ('pbm', 'png')
+DEFAULT_RASTER_DPI = 203  # Most thermal and label printers are 203 dpi
+
+
+def bayer_matrix(order=3):
+    """Ordered-dither index matrix of size 2**order (values 0 .. 4**order - 1)."""
+    matrix = np.zeros((1, 1), dtype=np.int32)
+    for _ in range(order):
+        matrix = np.block([[4 * matrix, 4 * matrix + 2],
+                           [4 * matrix + 3, 4 * matrix + 1]])
+    return matrix
+
+
+BAYER_THRESHOLDS = (bayer_matrix() + 0.5) * 256 / 64
+_threshold_cache = {}
+
+
+def dither(gray):
+    """Ordered (Bayer 8x8) dither of a grayscale page; True where a dot is printed."""
+    height, width = gray.shape
+    thresholds = _threshold_cache.get((height, width))
+    if thresholds is None:
+        reps = (-(-height // 8), -(-width // 8))
+        thresholds = _threshold_cache[(height, width)] = np.tile(BAYER_THRESHOLDS, reps)[:height, :width]
+    return gray < thresholds
+
+
+def encode_raster(black, image_format, dpi=DEFAULT_RASTER_DPI):
+    """Encode a 1-bit page as binary PBM (P4) or 1-bit PNG."""
+    height, width = black.shape
+    if image_format == 'pbm':
+        # P4 rows are packed MSB first and padded to whole bytes, which is what packbits does
+        return f"P4\n{width} {height}\n".encode() + np.packbits(black, axis=1).tobytes()
+
+    import io
+    from PIL import Image
+    # Pillow's "1" mode stores set bits as white
+    image = Image.frombytes('1', (width, height), np.packbits(~black, axis=1).tobytes())
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', dpi=(dpi, dpi))
+    return buffer.getvalue()
+
+
+def rasterize_receipt(data, template_path, dpi=DEFAULT_RASTER_DPI, image_format='pbm'):
+    """Fill one receipt and return page 1 as print-ready image bytes.
+
+    Receipts are drawn by the shared engine, whose layout matches the
+    current template, through the preview renderer (receipt_preview.py):
+    the template is rasterized once per process and DPI and only the text
+    is rendered per receipt, instead of resampling the scanned template
+    image for every page.
+    """
+    import receipt_preview
+
+    gray = receipt_preview.get_renderer(template_path).render(data, dpi)
+    return encode_raster(dither(gray), image_format, dpi)
+
+
+def export_rasters(receipts, template_path, dpi=DEFAULT_RASTER_DPI, image_format='pbm',
+                   workers=None, pool='process', ordered=False):
+    """Rasterize receipts in parallel, yielding (index, image bytes) as pages finish.
+
+    PyMuPDF holds the GIL while it renders, so a process pool is what
+    actually scales with cores; pool='thread' only overlaps the NumPy
+    dithering and encoding. At most two pages per worker are in flight, so
+    memory stays flat however long the batch is. With `ordered`, pages come
+    back in input order (for a single print stream).
+    """
+    workers = workers or os.cpu_count() or 1
+    executor_class = ProcessPoolExecutor if pool == 'process' else ThreadPoolExecutor
+    with executor_class(workers) as executor:
+        pending = {}
+        next_index = 0
+        while next_index < len(receipts) or pending:
+            while next_index < len(receipts) and len(pending) < workers * 2:
+                future = executor.submit(rasterize_receipt, receipts[next_index], template_path,
+                                         dpi, image_format)
+                pending[future] = next_index
+                next_index += 1
+
+            if ordered:
+                future = next(iter(pending))
+                wait([future])
+                done = [future]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def load_receipts(path):
+    """Read receipts from a JSON array (or {"receipts": [...]}); '-' reads stdin."""
+    if path == '-':
+        payload = json.load(sys.stdin)
+    else:
+        with open(path, encoding='utf-8') as f:
+            payload = json.load(f)
+    if isinstance(payload, dict):
+        payload = payload.get('receipts', [])
+
+    today = datetime.now().strftime("%m/%d/%Y")
+    receipts = []
+    for obj in payload:
+        receipts.append({
+            'date': obj.get('date') or today,
+            'consignee': obj.get('consignee', ''),
+            'delivery_location': obj.get('delivery_location', ''),
+            'items': [{
+                'description': item.get('description', ''),
+                'quantity': item.get('quantity') or '1 unit',
+                'remarks': item.get('remarks') or 'No issues',
+            } for item in obj.get('items', [])],
+        })
+    return receipts
+
+
+def run_export(args, template_path):
+    """Export mode: write one image per receipt, or a PBM stream to stdout."""
+    receipts = load_receipts(args.export)
+    to_stdout = args.out == '-'
+    if to_stdout and args.format != 'pbm':
+        print("❌ ERROR: only PBM can be streamed to stdout", file=sys.stderr)
+        return 1
+    if to_stdout:
+        # Keep PyMuPDF's warnings out of the image stream
+        fitz.set_messages(stream=sys.stderr)
+    else:
+        os.makedirs(args.out, exist_ok=True)
+
+    start = time.perf_counter()
+    pages = 0
+    for index, image in export_rasters(receipts, template_path, args.dpi, args.format,
+                                       args.workers, args.pool, ordered=to_stdout):
+        if to_stdout:
+            # Concatenated PBM images are a valid multi-page stream
+            sys.stdout.buffer.write(image)
+        else:
+            with open(os.path.join(args.out, f'receipt_{index + 1:04d}.{args.format}'), 'wb') as f:
+                f.write(image)
+        pages += 1
+        if pages % 100 == 0:
+            print(f"   {pages}/{len(receipts)} pages", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    rate = pages / elapsed if elapsed else 0.0
+    print(f"✅ Exported {pages} pages at {args.dpi} dpi in {elapsed:.1f}s ({rate:.1f} pages/s)",
+          file=sys.stderr)
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fill delivery receipts interactively or export them as images.")
+    parser.add_argument("--export", metavar="RECEIPTS_JSON", help="Rasterize the receipts in this JSON file ('-' for stdin)")
+    parser.add_argument("--format", choices=RASTER_FORMATS, default="pbm", help="Image format (default: pbm)")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_RASTER_DPI, help=f"Resolution (default: {DEFAULT_RASTER_DPI})")
+    parser.add_argument("--out", default=os.path.join("outputs", "raster"), help="Output directory, or '-' for a PBM stream on stdout")
+    parser.add_argument("--workers", type=int, help="Parallel workers (default: CPU count)")
+    parser.add_argument("--pool", choices=("process", "thread"), default="process", help="Worker pool (default: process)")
+    return parser.parse_args()
+
+
 def main():
     """Main function to run the delivery receipt filler."""
+    args = parse_args()
     template_path = os.path.join(os.path.dirname(__file__), 'delivery_receipt_template.pdf')
+    if args.export:
+        return run_export(args, template_path)
     output_dir = os.path.join(os.path.dirname(__file__), 'outputs')
     
     # Create output directory if it doesn't exist
@@ -1,5 +1,5 @@
 import fitz
-import pytesseract
+from ocr_backends import get_backend
 from PIL import Image
 import io
 
@@ -12,8 +12,8 @@ def find_anchors(pdf_path):
     img_data = pix.tobytes("png")
     img = Image.open(io.BytesIO(img_data))
     
-    # Use pytesseract to get text data with bounding boxes
-    data = pytesseract.image_to_data(img, output_type=pytesseract.Output.DICT)
+    # Get text data with bounding boxes from the pooled OCR backend
+    data = get_backend().image_to_data(img)
     
     anchors = {}
     target_words = ["Date:", "Consignee:", "Location:", "Item", "Description"]
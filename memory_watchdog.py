@@ -0,0 +1,82 @@
+"""
+Memory Watchdog
+Decides when a long-running worker should recycle itself: after a number
+of requests, or once its resident memory passes a ceiling. Fragmentation
+in MuPDF's and Python's allocators makes RSS creep up under sustained load
+even without leaks, and a fresh worker forked from a warm master (or a
+re-exec'd daemon) starts from a clean heap.
+
+The request limit gets a random jitter so workers started together don't
+all recycle at the same moment.
+
+Usage:
+    watchdog = Watchdog(max_requests=10000, max_rss_mb=512, jitter=500)
+    app = watchdog.wrap(app)      # counts WSGI requests
+    ...
+    reason = watchdog.expired()   # None, or why the worker should go
+"""
+
+import os
+import sys
+import random
+import threading
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_KB = os.sysconf('SC_PAGE_SIZE') // 1024 if hasattr(os, 'sysconf') else 4
+
+
+def current_rss_kb():
+    """Resident set size of this process in KB, or None where it can't be read.
+
+    Linux reads /proc/self/statm (cheap enough to check per request);
+    elsewhere the peak RSS from getrusage stands in, which only errs
+    towards recycling early.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_KB
+    except (OSError, IndexError, ValueError):
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+class Watchdog:
+    """Request counter and RSS ceiling for one worker process; 0 disables a limit."""
+
+    def __init__(self, max_requests=0, max_rss_mb=0, jitter=0):
+        self.max_requests = max_requests + random.randint(0, jitter) if max_requests else 0
+        self.max_rss_kb = max_rss_mb * 1024
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.max_requests or self.max_rss_kb)
+
+    def tick(self):
+        with self._lock:
+            self.requests += 1
+
+    def expired(self):
+        """Why this worker should be recycled now, or None."""
+        if self.max_requests and self.requests >= self.max_requests:
+            return f'served {self.requests} requests (limit {self.max_requests})'
+        if self.max_rss_kb:
+            rss = current_rss_kb()
+            if rss is not None and rss > self.max_rss_kb:
+                return f'RSS {rss // 1024} MB is over the {self.max_rss_kb // 1024} MB ceiling'
+        return None
+
+    def wrap(self, app):
+        """A WSGI app that counts its requests on this watchdog."""
+        def counted(environ, start_response):
+            self.tick()
+            return app(environ, start_response)
+        return counted
@@ -0,0 +1,196 @@
+"""
+OCR backends for field detection.
+
+pytesseract runs every image through a fresh `tesseract` process: it
+writes the image and the TSV result to temp files, and the process loads
+the language model again each time. On a single-page form that fixed cost
+is most of the OCR time. The backends here all answer `image_to_data`
+with the same word boxes as `pytesseract.image_to_data(...,
+output_type=Output.DICT)`:
+
+- `tesserocr`: long-lived engines in this process through the tesserocr
+  bindings, pooled so that threads can OCR at once (the bindings release
+  the GIL). The model is loaded once per engine.
+- `pipe`: the tesseract CLI fed over stdin/stdout; still one process per
+  image, but no temp files and no image encoding to PNG.
+- `pytesseract`: the original path, kept as the fallback.
+
+`get_backend()` picks one by name (or `AUTOFILL_OCR_BACKEND`); "auto" uses
+tesserocr when it is installed and pytesseract otherwise. Backends are
+cached per process, so the engine pool outlives individual forms.
+"""
+
+import io
+import os
+import re
+import queue
+import shlex
+import logging
+import functools
+import threading
+import subprocess
+from typing import Dict, List, Tuple
+
+import pytesseract
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = os.environ.get("AUTOFILL_OCR_BACKEND", "auto")
+DEFAULT_LANG = os.environ.get("AUTOFILL_OCR_LANG", "eng")
+# Tesseract's own default page segmentation mode (fully automatic)
+DEFAULT_PSM = 3
+
+
+def parse_tsv(tsv: str) -> Dict[str, List]:
+    """Tesseract TSV (with its header row) in pytesseract's Output.DICT layout."""
+    rows = [row.split("\t") for row in tsv.strip("\n").split("\n")]
+    if len(rows) < 2:
+        return {}
+    header = rows.pop(0)
+    result = {column: [] for column in header}
+    for row in rows:
+        # The text cell is missing when a row's text is empty
+        row += [""] * (len(header) - len(row))
+        for column, value in zip(header, row):
+            if column == "text":
+                result[column].append(value)
+            else:
+                result[column].append(int(float(value)))
+    return result
+
+
+def parse_config(config: str) -> Tuple[int, List[Tuple[str, str]]]:
+    """(page segmentation mode, [(variable, value)]) from a pytesseract config string."""
+    psm = DEFAULT_PSM
+    match = re.search(r"--psm\s+(\d+)", config)
+    if match:
+        psm = int(match.group(1))
+    variables = re.findall(r"-c\s+(\w+)=(\S+)", config)
+    return psm, variables
+
+
+class OCRBackend:
+    """Word boxes for an image, as pytesseract.image_to_data returns them."""
+
+    name = "base"
+
+    def image_to_data(self, img: Image.Image, config: str = "") -> Dict[str, List]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PytesseractBackend(OCRBackend):
+    name = "pytesseract"
+
+    def __init__(self, lang: str = DEFAULT_LANG):
+        self.lang = lang
+
+    def image_to_data(self, img: Image.Image, config: str = "") -> Dict[str, List]:
+        return pytesseract.image_to_data(img, lang=self.lang, config=config, output_type=pytesseract.Output.DICT)
+
+
+class PipeBackend(OCRBackend):
+    """The tesseract CLI reading the image from stdin and writing TSV to stdout."""
+
+    name = "pipe"
+
+    def __init__(self, lang: str = DEFAULT_LANG, cmd: str = None):
+        self.lang = lang
+        self.cmd = cmd or pytesseract.pytesseract.tesseract_cmd
+
+    def image_to_data(self, img: Image.Image, config: str = "") -> Dict[str, List]:
+        if img.mode not in ("L", "RGB"):
+            img = img.convert("RGB")
+        # PNM is the cheapest format for Tesseract to read: no compression
+        buf = io.BytesIO()
+        img.save(buf, format="PPM")
+        result = subprocess.run([self.cmd, "stdin", "stdout", "-l", self.lang, *shlex.split(config), "tsv"],
+                                input=buf.getvalue(), capture_output=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"tesseract failed: {result.stderr.decode(errors='replace').strip()}")
+        return parse_tsv(result.stdout.decode("utf-8"))
+
+
+class TesserocrBackend(OCRBackend):
+    """A pool of in-process Tesseract engines (tesserocr bindings).
+
+    Engines are created on demand, up to `size`, and reused; a caller
+    waits for an idle engine once all of them are busy.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str = DEFAULT_LANG, size: int = None):
+        import tesserocr
+
+        self.tesserocr = tesserocr
+        self.lang = lang
+        self.size = size or os.cpu_count() or 1
+        self.idle = queue.LifoQueue()
+        self.engines = []
+        self.lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.engines) < self.size:
+                engine = self.tesserocr.PyTessBaseAPI(lang=self.lang)
+                self.engines.append(engine)
+                return engine
+        return self.idle.get()
+
+    def image_to_data(self, img: Image.Image, config: str = "") -> Dict[str, List]:
+        psm, variables = parse_config(config)
+        engine = self._acquire()
+        try:
+            # Engines are shared, so the mode is set on every call
+            engine.SetPageSegMode(psm)
+            for name, value in variables:
+                engine.SetVariable(name, value)
+            engine.SetImage(img)
+            engine.Recognize()
+            # GetTSVText has no header row
+            header = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n"
+            return parse_tsv(header + engine.GetTSVText(0))
+        finally:
+            self.idle.put(engine)
+
+    def close(self):
+        with self.lock:
+            for engine in self.engines:
+                engine.End()
+            self.engines = []
+
+
+BACKENDS = {
+    "tesserocr": TesserocrBackend,
+    "pipe": PipeBackend,
+    "pytesseract": PytesseractBackend,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_backend(name: str = None, lang: str = DEFAULT_LANG) -> OCRBackend:
+    """The process-wide backend called `name` ("auto" prefers tesserocr)."""
+    name = name or DEFAULT_BACKEND
+    if name == "auto":
+        try:
+            return TesserocrBackend(lang)
+        except ImportError:
+            logger.debug("tesserocr is not installed; using pytesseract")
+            return PytesseractBackend(lang)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend '{name}' (expected auto, {', '.join(BACKENDS)}).")
+    return BACKENDS[name](lang)
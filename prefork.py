@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Preforking production server for the delivery receipt app.
+
+The master binds the listening socket, imports the WSGI app and warms
+the fill engine (template parse, font metrics, compiled layout), then
+forks the workers. Workers inherit that state copy-on-write, so memory
+does not grow with every worker re-parsing the template and no worker
+pays for warm-up on its first request. Dead workers are replaced.
+
+With MAX_REQUESTS or MAX_RSS_MB set, a worker finishes its current request
+and exits once it passes either limit (see memory_watchdog.py), and the
+master forks a fresh one from the warm state.
+
+Usage:
+    python -m prefork                          # settings from prefork_config.py
+    python -m prefork --config my_settings --workers 8 --bind 0.0.0.0:8000
+"""
+
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import logging
+import argparse
+import importlib
+
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: [%(process)d] %(message)s')
+logger = logging.getLogger(__name__)
+
+SETTINGS = ('BIND', 'WORKERS', 'APP', 'PRELOAD', 'BACKLOG', 'MAX_REQUESTS', 'MAX_REQUESTS_JITTER', 'MAX_RSS_MB')
+INT_SETTINGS = ('WORKERS', 'BACKLOG', 'MAX_REQUESTS', 'MAX_REQUESTS_JITTER', 'MAX_RSS_MB')
+
+
+def load_config(module_name):
+    """Read settings from a config module, then apply PREFORK_* env overrides."""
+    module = importlib.import_module(module_name)
+    config = {name: getattr(module, name) for name in SETTINGS if hasattr(module, name)}
+    for name in SETTINGS:
+        value = os.environ.get(f'PREFORK_{name}')
+        if value is None:
+            continue
+        if name in INT_SETTINGS:
+            value = int(value)
+        elif name == 'PRELOAD':
+            value = value.lower() not in ('0', 'false', 'no')
+        config[name] = value
+    return config
+
+
+def load_app(spec):
+    module_name, _, attribute = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attribute or 'app')
+
+
+def warm_up():
+    """Build everything workers should share before they are forked."""
+    import receipt_engine
+    receipt_engine.get_template()
+
+
+def bind_socket(bind, backlog):
+    host, _, port = bind.rpartition(':')
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host or '0.0.0.0', int(port)))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_main(sock, config, app):
+    """Serve requests on the inherited socket until told to stop."""
+    from werkzeug.serving import BaseWSGIServer
+    from memory_watchdog import Watchdog
+
+    if app is None:
+        app = load_app(config['APP'])
+    watchdog = Watchdog(config.get('MAX_REQUESTS', 0), config.get('MAX_RSS_MB', 0),
+                        config.get('MAX_REQUESTS_JITTER', 0))
+    if watchdog.enabled:
+        app = watchdog.wrap(app)
+
+    host, port = sock.getsockname()[:2]
+    server = BaseWSGIServer(host, port, app, fd=sock.fileno())
+    server.timeout = 1.0
+
+    running = True
+
+    def stop(signum, frame):
+        nonlocal running
+        running = False
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the master handles Ctrl-C
+
+    logger.info("Worker ready")
+    while running:
+        server.handle_request()
+        if watchdog.enabled:
+            reason = watchdog.expired()
+            if reason:
+                logger.info(f"Recycling worker: {reason}")
+                break
+    server.server_close()
+
+
+def spawn_worker(sock, config, app):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            worker_main(sock, config, app)
+        except Exception:
+            logger.exception("Worker crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def serve(config):
+    sock = bind_socket(config['BIND'], config['BACKLOG'])
+
+    app = None
+    if config['PRELOAD']:
+        t0 = time.perf_counter()
+        app = load_app(config['APP'])
+        warm_up()
+        # Keep the shared objects out of the collector's reach so workers'
+        # GC passes don't touch (and copy) their pages
+        gc.collect()
+        gc.freeze()
+        logger.info(f"Preloaded {config['APP']} in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    workers = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    logger.info(f"Listening on http://{config['BIND']} with {config['WORKERS']} workers")
+    while not stopping:
+        while len(workers) < config['WORKERS']:
+            workers.add(spawn_worker(sock, config, app))
+
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid:
+            workers.discard(pid)
+            if not stopping and status == 0:
+                logger.info(f"Worker {pid} recycled, replacing it")
+            elif not stopping:
+                logger.warning(f"Worker {pid} exited with status {status}, replacing it")
+        else:
+            time.sleep(0.2)
+
+    logger.info("Shutting down workers")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preforking server for the delivery receipt app.")
+    parser.add_argument("--config", default="prefork_config", help="Settings module (default: prefork_config)")
+    parser.add_argument("--bind", help="host:port to listen on")
+    parser.add_argument("--workers", type=int, help="Worker processes")
+    parser.add_argument("--app", help="WSGI app as module:attribute")
+    parser.add_argument("--no-preload", action="store_true", help="Let each worker load the app itself")
+    parser.add_argument("--max-requests", type=int, help="Recycle a worker after this many requests (0: never)")
+    parser.add_argument("--max-rss-mb", type=int, help="Recycle a worker once its RSS passes this many MB (0: never)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    config = load_config(args.config)
+    if args.bind:
+        config['BIND'] = args.bind
+    if args.workers:
+        config['WORKERS'] = args.workers
+    if args.app:
+        config['APP'] = args.app
+    if args.no_preload:
+        config['PRELOAD'] = False
+    if args.max_requests is not None:
+        config['MAX_REQUESTS'] = args.max_requests
+    if args.max_rss_mb is not None:
+        config['MAX_RSS_MB'] = args.max_rss_mb
+
+    serve(config)
+
+
+if __name__ == "__main__":
+    main()
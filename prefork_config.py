@@ -0,0 +1,34 @@
+"""
+Settings for the preforking server (`python -m prefork`).
+
+Every value can be overridden with an environment variable named
+PREFORK_<SETTING>, e.g. PREFORK_WORKERS=8, or by pointing --config at
+another module with the same names.
+"""
+
+import os
+
+# Address the master binds before forking; workers share the socket
+BIND = '127.0.0.1:8000'
+
+# Worker processes to fork
+WORKERS = os.cpu_count() or 1
+
+# WSGI application as "module:attribute"
+APP = 'api.index:app'
+
+# Import the app, parse the template, build font metrics and compile the
+# layout in the master so workers share them copy-on-write. False gives
+# the old behaviour: each worker imports and warms up on its own.
+PRELOAD = True
+
+# Listen backlog of the shared socket
+BACKLOG = 128
+
+# Recycle a worker after this many requests, plus a random 0..MAX_REQUESTS_JITTER
+# so workers don't all restart at once (0: never)
+MAX_REQUESTS = 0
+MAX_REQUESTS_JITTER = 0
+
+# Recycle a worker once its resident memory passes this many MB (0: never)
+MAX_RSS_MB = 0
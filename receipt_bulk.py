@@ -0,0 +1,291 @@
+"""
+Bulk Receipt API
+POST /api/receipts takes a JSON array of receipts, fills them on a worker
+pool with a warm template and streams the results back as a ZIP (one PDF
+per receipt, written as each one finishes) or as a single merged PDF.
+
+At most `window` receipts are in flight at once, so memory is bounded by
+the window and not by the batch size.
+"""
+
+import os
+import io
+import json
+import logging
+import zipfile
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import fitz  # PyMuPDF
+
+import receipt_engine
+import template_registry
+from receipt_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# "process" fills in parallel; "thread" is the fallback where processes are
+# not available (e.g. serverless runtimes without /dev/shm)
+POOL_KIND = os.environ.get('RECEIPT_POOL', 'process')
+POOL_WORKERS = int(os.environ.get('RECEIPT_POOL_WORKERS', '0')) or os.cpu_count() or 1
+MAX_BATCH = int(os.environ.get('RECEIPT_MAX_BATCH', '1000'))
+MAX_ITEMS = len(receipt_engine.TABLE_ROWS)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ReceiptValidationError(ValueError):
+    pass
+
+
+def validate_receipt(obj, today=None, max_items=MAX_ITEMS):
+    """Normalize one JSON receipt the same way the HTML form is read."""
+    if not isinstance(obj, dict):
+        raise ReceiptValidationError('Receipt must be a JSON object.')
+
+    today = today or datetime.now().strftime("%m/%d/%Y")
+    consignee = str(obj.get('consignee') or '').strip()
+    delivery_location = str(obj.get('delivery_location') or '').strip()
+    if not consignee:
+        raise ReceiptValidationError('Please enter a consignee name.')
+    if not delivery_location:
+        raise ReceiptValidationError('Please enter a delivery location.')
+
+    raw_items = obj.get('items') or []
+    if not isinstance(raw_items, list):
+        raise ReceiptValidationError('items must be a list.')
+
+    items = []
+    for raw in raw_items:
+        if not isinstance(raw, dict):
+            raise ReceiptValidationError('Each item must be a JSON object.')
+        desc = str(raw.get('description') or '').strip()
+        if desc:
+            items.append({
+                'description': desc,
+                'quantity': str(raw.get('quantity') or '').strip() or '1 unit',
+                'remarks': str(raw.get('remarks') or '').strip() or 'No issues'
+            })
+
+    if not max_items:
+        if items:
+            raise ReceiptValidationError('This template has no item table.')
+    elif not items:
+        raise ReceiptValidationError('Please add at least one item.')
+    elif len(items) > max_items:
+        raise ReceiptValidationError(f'At most {max_items} items fit on a receipt.')
+
+    return {
+        'date': str(obj.get('date') or '').strip() or today,
+        'consignee': consignee,
+        'delivery_location': delivery_location,
+        'items': items
+    }
+
+
+def receipt_filename(index, data):
+    consignee = data['consignee'].replace(" ", "_").replace("/", "-")
+    return f'{index + 1:04d}_Delivery_Receipt_{consignee}_{data["date"].replace("/", "-")}.pdf'
+
+
+# ============ Worker Pool ============
+
+def _warm_worker(template_path):
+    receipt_engine.get_template(template_path)
+
+
+def _fill_one(template_path, data, profile=None, template_id=None):
+    return template_registry.get_template(template_id, profile, template_path).fill_bytes(data, profile=profile)
+
+
+_pool = None
+
+
+def get_pool(template_path):
+    """Return the shared (executor, workers), creating it on first use."""
+    global _pool
+    if _pool is None:
+        executor = None
+        if POOL_KIND == 'process':
+            try:
+                executor = ProcessPoolExecutor(POOL_WORKERS, initializer=_warm_worker,
+                                               initargs=(template_path,))
+            except (OSError, NotImplementedError, ImportError) as e:
+                logger.warning(f"Process pool unavailable ({e}), falling back to threads")
+        if executor is None:
+            executor = ThreadPoolExecutor(POOL_WORKERS)
+        _pool = (executor, POOL_WORKERS)
+    return _pool
+
+
+def fill_many(receipts, template_path, window=None, ordered=False, profile=None, template_id=None):
+    """Fill receipts on the pool, yielding (index, pdf_bytes or exception).
+
+    Results come back as each one finishes, or in input order when
+    `ordered` is set. Either way no more than `window` receipts (default:
+    2 per worker) are held between submission and being yielded.
+    """
+    executor, workers = get_pool(template_path)
+    window = window or workers * 2
+    pending = {}
+    next_index = 0
+
+    while next_index < len(receipts) or pending:
+        while next_index < len(receipts) and len(pending) < window:
+            future = executor.submit(_fill_one, template_path, receipts[next_index], profile, template_id)
+            pending[future] = next_index
+            next_index += 1
+
+        if ordered:
+            # dicts keep insertion order, so the first key is the oldest receipt
+            future = next(iter(pending))
+            wait([future])
+            done = [future]
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            index = pending.pop(future)
+            error = future.exception()
+            yield index, (error if error is not None else future.result())
+
+
+# ============ Streaming Output ============
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile writes into and we drain."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(receipts, template_path, window=None, profile=None, template_id=None):
+    """Yield a ZIP archive chunk by chunk, one entry per finished receipt."""
+    sink = _ChunkSink()
+    errors = []
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, result in fill_many(receipts, template_path, window, profile=profile, template_id=template_id):
+            if isinstance(result, Exception):
+                logger.error(f"Error generating receipt {index}: {result}")
+                METRICS.inc('receipt_errors_total', endpoint='bulk_receipts')
+                errors.append({'index': index, 'error': str(result)})
+                continue
+            archive.writestr(receipt_filename(index, receipts[index]), result)
+            METRICS.inc('receipt_bulk_receipts_total', format='zip')
+            yield sink.drain()
+
+        if errors:
+            archive.writestr('errors.json', json.dumps(errors, indent=2))
+    yield sink.drain()
+
+
+def merged_pdf(receipts, template_path, window=None, profile=None, template_id=None):
+    """Fill receipts into one merged PDF, in input order; returns its bytes.
+
+    A PDF cannot be written out before its last page exists, so the merged
+    document is held until the end; only the per-receipt results are
+    bounded by the window. Use the ZIP format for big batches. Raises
+    RuntimeError on the first receipt that fails, before anything is sent.
+    """
+    with fitz.open() as merged:
+        for index, result in fill_many(receipts, template_path, window, ordered=True, profile=profile,
+                                       template_id=template_id):
+            if isinstance(result, Exception):
+                METRICS.inc('receipt_errors_total', endpoint='bulk_receipts')
+                raise RuntimeError(f"Receipt {index} failed: {result}") from result
+            with fitz.open(stream=result, filetype='pdf') as doc:
+                merged.insert_pdf(doc)
+            METRICS.inc('receipt_bulk_receipts_total', format='pdf')
+
+        # At least garbage=1 to drop what insert_pdf leaves unused; the compact
+        # profiles' garbage=4 also stores the template image once for all pages
+        options = receipt_engine.save_options(profile)
+        return merged.tobytes(**dict(options, garbage=max(1, options.get('garbage', 0))))
+
+
+def stream_chunks(data):
+    for start in range(0, len(data), STREAM_CHUNK_SIZE):
+        yield data[start:start + STREAM_CHUNK_SIZE]
+
+
+def _count_bytes(chunks):
+    for chunk in chunks:
+        if not chunk:
+            continue
+        METRICS.inc('receipt_bytes_out_total', len(chunk), endpoint='bulk_receipts')
+        yield chunk
+
+
+# ============ Route ============
+
+def install(app, template_path):
+    """Register POST /api/receipts on a Flask app."""
+    from flask import request, jsonify, Response
+
+    def bulk_receipts():
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            output_format = payload.get('format', request.args.get('format', 'zip'))
+            profile = payload.get('profile', request.args.get('profile'))
+            template_id = payload.get('template', request.args.get('template'))
+            payload = payload.get('receipts')
+        else:
+            output_format = request.args.get('format', 'zip')
+            profile = request.args.get('profile')
+            template_id = request.args.get('template')
+
+        if not isinstance(payload, list) or not payload:
+            return jsonify(error='Expected a non-empty JSON array of receipts.'), 400
+        if len(payload) > MAX_BATCH:
+            return jsonify(error=f'At most {MAX_BATCH} receipts per request.'), 413
+        if output_format not in ('zip', 'pdf'):
+            return jsonify(error='format must be "zip" or "pdf".'), 400
+        if profile is not None and profile not in receipt_engine.SAVE_PROFILES:
+            return jsonify(error=f'profile must be one of {", ".join(receipt_engine.SAVE_PROFILES)}.'), 400
+        try:
+            template = template_registry.get_template(template_id, profile, template_path)
+        except template_registry.TemplateError as e:
+            return jsonify(error=str(e)), 400
+
+        receipts, errors = [], []
+        for index, obj in enumerate(payload):
+            try:
+                receipts.append(validate_receipt(obj, max_items=template.max_items))
+            except ReceiptValidationError as e:
+                errors.append({'index': index, 'error': str(e)})
+        if errors:
+            return jsonify(errors=errors), 400
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        if output_format == 'pdf':
+            # Filled before the response starts, so a failure still gets an error status
+            try:
+                pdf_bytes = merged_pdf(receipts, template_path, profile=profile, template_id=template_id)
+            except RuntimeError as e:
+                logger.error(f"Error generating merged receipts: {e}")
+                return jsonify(error=str(e)), 500
+            body, mimetype = stream_chunks(pdf_bytes), 'application/pdf'
+        else:
+            body, mimetype = stream_zip(receipts, template_path, profile=profile,
+                                        template_id=template_id), 'application/zip'
+
+        return Response(
+            _count_bytes(body),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="Delivery_Receipts_{timestamp}.{output_format}"'
+            }
+        )
+
+    app.add_url_rule('/api/receipts', 'bulk_receipts', bulk_receipts, methods=['POST'])
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Resident fill daemon on a Unix domain socket.
+
+Shell and cron pipelines that start Python per receipt pay for interpreter
+startup, the PyMuPDF import and the template parse on every call, which
+is far more than the fill itself. The daemon pays for them once and then
+fills receipts sent over a Unix socket by the `fill` client below, which
+starts in the time of a bare interpreter: the engine and PyMuPDF are only
+imported by the daemon.
+
+Protocol: each message is a 4-byte big-endian length followed by that many
+bytes. A request is a JSON object:
+
+    {"receipt": {...}, "output": "/abs/path.pdf", "profile": "compact"}
+
+`receipt` has the same fields as the bulk API. With `output` (a file, or a
+directory to name the file in as the bulk ZIP does, numbered by "index")
+the daemon writes the PDF there and answers {"ok": true, "path", "size"};
+without it, it answers {"ok": true, "size", "attached": true} followed by
+one more message with the PDF bytes. Failures answer {"ok": false, "error"}.
+{"op": "ping"} answers with the daemon's pid and fill count. A connection
+may carry any number of requests, one after the other.
+
+With --max-requests or --max-rss-mb the daemon recycles itself once it
+passes either limit (see memory_watchdog.py): it stops accepting, finishes
+the requests in flight, closes its connections and re-executes itself on
+the same listening socket, so clients queued on it are served by the fresh
+process. The `fill` client reconnects and resends when its connection is
+closed that way.
+
+Usage:
+    python receipt_daemon.py serve [--socket /tmp/receipt_filler.sock] [--profile compact] [--max-rss-mb 512]
+    python receipt_daemon.py fill receipt.json > receipt.pdf
+    python receipt_daemon.py fill receipts.ndjson -o outputs/     # array or NDJSON, one path per line
+    python receipt_daemon.py ping
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import struct
+import logging
+import argparse
+
+from receipt_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.environ.get('RECEIPT_DAEMON_SOCKET', '/tmp/receipt_filler.sock')
+# Set across a recycling re-exec: the listening socket's file descriptor
+LISTEN_FD_ENV = 'RECEIPT_DAEMON_LISTEN_FD'
+RECONNECT_ATTEMPTS = 5
+HEADER = struct.Struct('>I')
+# Receipts are small; anything bigger is not a receipt
+MAX_REQUEST_BYTES = 1024 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+# ============ Framing ============
+
+def recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_message(sock, max_size=None):
+    """The next message's bytes, or None once the peer has closed the connection."""
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if max_size is not None and size > max_size:
+        raise ProtocolError(f'Message of {size} bytes exceeds the {max_size} byte limit.')
+    payload = recv_exact(sock, size)
+    if payload is None:
+        raise ProtocolError('Connection closed mid-message.')
+    return payload
+
+
+def send_message(sock, payload):
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def send_json(sock, obj):
+    send_message(sock, json.dumps(obj).encode('utf-8'))
+
+
+# ============ Server ============
+
+class FillDaemon:
+    """Fills requests from socket connections with a warm template."""
+
+    def __init__(self, profile=None, watchdog=None):
+        import threading
+        import receipt_engine
+        import receipt_bulk
+        import consignee_directory
+        from memory_watchdog import Watchdog
+
+        self.engine = receipt_engine
+        self.bulk = receipt_bulk
+        self.directory = consignee_directory
+        self.consignees_path = os.environ.get('RECEIPT_CONSIGNEES', consignee_directory.DEFAULT_DIRECTORY_PATH)
+        self.profile = profile
+        self.fills = 0
+        self.watchdog = watchdog or Watchdog()
+        # Set once the watchdog trips: connections close after their current request
+        self.recycling = threading.Event()
+        self.connections = set()
+        self._connections_lock = threading.Lock()
+        # Parse the template and bake the consignee variants before the first request
+        self.refresh_directory()
+        receipt_engine.get_template(profile=profile)
+
+    def refresh_directory(self):
+        """Register the consignee directory; a no-op until its file changes."""
+        if os.path.exists(self.consignees_path):
+            directory = self.directory.get_directory(self.consignees_path)
+            self.engine.set_directory(directory, directory.version)
+
+    def fill(self, request):
+        """Answer one request: (response dict, PDF bytes to send after it or None)."""
+        if request.get('op', 'fill') == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'fills': self.fills}, None
+
+        data = self.bulk.validate_receipt(request.get('receipt'))
+        profile = request.get('profile') or self.profile
+        self.refresh_directory()
+        # Reloads the template if its file changed
+        template = self.engine.get_template(profile=profile)
+
+        output = request.get('output')
+        if output:
+            if os.path.isdir(output):
+                output = os.path.join(output, self.bulk.receipt_filename(int(request.get('index', 0)), data))
+            template.fill_file(data, output, profile=profile)
+            self.fills += 1
+            return {'ok': True, 'path': output, 'size': os.path.getsize(output)}, None
+
+        pdf_bytes = template.fill_bytes(data, profile=profile)
+        self.fills += 1
+        return {'ok': True, 'size': len(pdf_bytes), 'attached': True}, pdf_bytes
+
+    def check_watchdog(self):
+        if self.watchdog.enabled and not self.recycling.is_set():
+            reason = self.watchdog.expired()
+            if reason:
+                logger.info(f"Recycling daemon: {reason}")
+                self.recycling.set()
+
+    def add_connection(self, conn):
+        with self._connections_lock:
+            self.connections.add(conn)
+
+    def close_connections(self):
+        """Stop reading from every connection: requests already sent are still
+        served, idle handlers see end-of-file, and later sends fail, so clients
+        retry on the next daemon."""
+        with self._connections_lock:
+            for conn in self.connections:
+                try:
+                    conn.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass
+
+    def handle(self, conn):
+        """Serve requests on one connection until the client closes it (or the daemon recycles)."""
+        try:
+            self._serve_connection(conn)
+        finally:
+            with self._connections_lock:
+                self.connections.discard(conn)
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    payload = recv_message(conn, MAX_REQUEST_BYTES)
+                except ProtocolError as e:
+                    send_json(conn, {'ok': False, 'error': str(e)})
+                    return
+                if payload is None:
+                    return
+
+                t0 = time.perf_counter()
+                pdf_bytes = None
+                try:
+                    request = json.loads(payload)
+                    if not isinstance(request, dict):
+                        raise ValueError('Request must be a JSON object.')
+                    response, pdf_bytes = self.fill(request)
+                except (ValueError, OSError) as e:
+                    # ReceiptValidationError and JSONDecodeError are ValueErrors
+                    METRICS.inc('receipt_errors_total', endpoint='daemon')
+                    response = {'ok': False, 'error': str(e)}
+                except Exception as e:
+                    logger.exception("Error filling receipt")
+                    METRICS.inc('receipt_errors_total', endpoint='daemon')
+                    response = {'ok': False, 'error': f'An error occurred: {e}'}
+                METRICS.inc('receipt_requests_total', endpoint='daemon', status='200' if response['ok'] else '400')
+                METRICS.observe('receipt_request_seconds', time.perf_counter() - t0, endpoint='daemon')
+                self.watchdog.tick()
+                self.check_watchdog()
+
+                try:
+                    send_json(conn, response)
+                    if pdf_bytes is not None:
+                        send_message(conn, pdf_bytes)
+                except OSError:
+                    return  # the client went away
+                if self.recycling.is_set():
+                    return
+
+
+def bind_unix_socket(path, mode=0o600):
+    """Listen on path, replacing a stale socket file but not a live daemon's."""
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)
+        else:
+            raise SystemExit(f"Another daemon is already listening on {path}")
+        finally:
+            probe.close()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o777 & ~mode)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(old_umask)
+    sock.listen(64)
+    return sock
+
+
+def serve(path=DEFAULT_SOCKET, profile=None, threads=4, max_requests=0, max_rss_mb=0, listen_fd=None):
+    """Run the daemon until SIGTERM or SIGINT, or until its watchdog trips.
+
+    Returns None after a shutdown, or the still-open listening socket when
+    the daemon should be recycled (main re-executes on it).
+    """
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from memory_watchdog import Watchdog
+
+    t0 = time.perf_counter()
+    daemon = FillDaemon(profile, Watchdog(max_requests, max_rss_mb))
+    if listen_fd is not None:
+        sock = socket.socket(fileno=listen_fd)
+    else:
+        sock = bind_unix_socket(path)
+    sock.settimeout(1.0)
+    logger.info(f"Warm in {(time.perf_counter() - t0) * 1000:.0f} ms, listening on {path}")
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Connections are served on a small pool, so a slow client can't block
+    # the others; fills themselves mostly hold the GIL
+    with ThreadPoolExecutor(threads) as executor:
+        while not stopping.is_set() and not daemon.recycling.is_set():
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                # Memory can pass the ceiling between requests too (idle threads, caches)
+                daemon.check_watchdog()
+                continue
+            conn.settimeout(None)
+            daemon.add_connection(conn)
+            executor.submit(daemon.handle, conn)
+        daemon.recycling.set()
+        daemon.close_connections()
+
+    if not stopping.is_set():
+        return sock
+    logger.info("Shutting down")
+    sock.close()
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# ============ Client ============
+
+def connect(path=DEFAULT_SOCKET):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sock.close()
+        raise SystemExit(f"No fill daemon on {path}; start one with: python receipt_daemon.py serve")
+    return sock
+
+
+def request(sock, obj):
+    """Send one request; returns (response dict, PDF bytes or None).
+
+    Raises ConnectionError if the daemon closed the connection first
+    (it does so when it recycles); the request can be resent on a new one.
+    """
+    send_json(sock, obj)
+    payload = recv_message(sock)
+    if payload is None:
+        raise ConnectionError('The daemon closed the connection.')
+    response = json.loads(payload)
+    pdf_bytes = recv_message(sock) if response.get('attached') else None
+    return response, pdf_bytes
+
+
+def read_receipts(path):
+    """Receipts from a JSON object, a JSON array or NDJSON; '-' reads stdin."""
+    text = sys.stdin.read() if path == '-' else open(path, encoding='utf-8').read()
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    return parsed if isinstance(parsed, list) else [parsed]
+
+
+def fill_command(args):
+    receipts = read_receipts(args.input)
+    if len(receipts) > 1:
+        if not args.output:
+            raise SystemExit("Several receipts need -o DIRECTORY")
+        if os.path.exists(args.output) and not os.path.isdir(args.output):
+            raise SystemExit(f"{args.output} is not a directory; several receipts need -o DIRECTORY")
+        # The daemon names each receipt's file only when its output is a directory
+        os.makedirs(args.output, exist_ok=True)
+
+    failures = 0
+    sock = connect(args.socket)
+    try:
+        for index, receipt in enumerate(receipts):
+            message = {'receipt': receipt, 'index': index}
+            if args.profile:
+                message['profile'] = args.profile
+            if args.output:
+                # The daemon resolves paths against its own working directory
+                message['output'] = os.path.abspath(args.output)
+            for attempt in range(RECONNECT_ATTEMPTS):
+                try:
+                    response, pdf_bytes = request(sock, message)
+                    break
+                except (ConnectionError, ProtocolError):
+                    # The daemon recycled under us; its successor listens on the same socket
+                    if attempt == RECONNECT_ATTEMPTS - 1:
+                        raise
+                    sock.close()
+                    time.sleep(0.05 * attempt)
+                    sock = connect(args.socket)
+            if not response.get('ok'):
+                failures += 1
+                print(f"receipt {index}: {response.get('error')}", file=sys.stderr)
+            elif pdf_bytes is not None:
+                sys.stdout.buffer.write(pdf_bytes)
+            else:
+                print(response['path'])
+    finally:
+        sock.close()
+    return 1 if failures else 0
+
+
+def ping_command(args):
+    with connect(args.socket) as sock:
+        response, _ = request(sock, {'op': 'ping'})
+    print(json.dumps(response))
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident delivery receipt fill daemon and client.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run the daemon")
+    serve_parser.add_argument("--profile", help="Default output profile (default/compact/web)")
+    serve_parser.add_argument("--threads", type=int, default=4, help="Connections served at once")
+    serve_parser.add_argument("--max-requests", type=int, default=0, help="Recycle after this many requests (0: never)")
+    serve_parser.add_argument("--max-rss-mb", type=int, default=0, help="Recycle once RSS passes this many MB (0: never)")
+
+    fill_parser = commands.add_parser("fill", help="Fill receipts through a running daemon")
+    fill_parser.add_argument("input", nargs="?", default="-", help="JSON object, array or NDJSON file, or - for stdin")
+    fill_parser.add_argument("-o", "--output", help="Output PDF file or directory (default: PDF to stdout)")
+    fill_parser.add_argument("--profile", help="Output profile for these receipts")
+
+    commands.add_parser("ping", help="Check that the daemon is up")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        logging.basicConfig(level=logging.INFO, format='%(levelname)s: [%(process)d] %(message)s')
+        listen_fd = os.environ.pop(LISTEN_FD_ENV, None)
+        sock = serve(args.socket, args.profile, args.threads, args.max_requests, args.max_rss_mb,
+                     int(listen_fd) if listen_fd else None)
+        if sock is not None:
+            # A fresh interpreter on the same socket: nothing to unlink, no gap in accepting
+            sock.set_inheritable(True)
+            os.environ[LISTEN_FD_ENV] = str(sock.fileno())
+            os.execv(sys.executable, [sys.executable, os.path.abspath(__file__)] + sys.argv[1:])
+        return 0
+    if args.command == "fill":
+        return fill_command(args)
+    return ping_command(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Receipt Edits
+Correct individual fields of an already filled receipt PDF without
+re-filling it from the template.
+
+Only the edited fields' text is removed (with a redaction limited to text,
+so the scanned template image and line art are untouched) and redrawn, and
+the change is written with an incremental save: the original bytes stay as
+they are and a small update section is appended. Every edit is therefore a
+new revision of the same file, and the old ones remain recoverable.
+
+Changes use the receipt data names:
+    {"item3_quantity": "40 boxes", "consignee": "Simula PH", "date": "02/01/2026"}
+`date` updates both dates, and `itemN_description` gets its "N. " prefix,
+as when the receipt was filled.
+"""
+
+import os
+import shutil
+import logging
+import tempfile
+
+import fitz  # PyMuPDF
+
+import receipt_engine
+from receipt_metrics import METRICS, NULL_TIMER, current_timer
+
+logger = logging.getLogger(__name__)
+
+# Page area kept from redaction around a line: only a thin band inside its
+# line box is marked, so lines above and below (whose boxes can overlap the
+# field's rectangle) are never hit
+REDACT_BAND = (0.4, 0.2)  # from baseline - 0.4 * size to baseline - 0.2 * size
+
+# Text extraction without the scanned template image, which would
+# otherwise be decoded and embedded in the result (~40ms a page)
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+
+class ReceiptEditError(ValueError):
+    """The requested edit does not apply to this receipt."""
+
+
+def layout_values(changes):
+    """Map receipt-level changes to {layout field: text to draw}."""
+    fields = {entry[0] for entry in receipt_engine.compile_layout()}
+    values = {}
+    for name, text in changes.items():
+        if not isinstance(text, str):
+            raise ReceiptEditError(f'"{name}" must be a string.')
+        text = text.strip()
+        if name == 'date':
+            values['date'] = values['date_bottom'] = text
+        elif name.startswith('item') and name.endswith('_description') and name in fields:
+            row = name[len('item'):-len('_description')]
+            values[name] = f"{row}. {text}" if text else ''
+        elif name in fields and name != 'date_bottom':
+            values[name] = text
+        else:
+            raise ReceiptEditError(f'Unknown field "{name}".')
+    return values
+
+
+def page_spans(page):
+    """All text spans on a page."""
+    return [span for block in page.get_text('dict', flags=TEXT_FLAGS)['blocks']
+            for line in block.get('lines', ()) for span in line['spans']]
+
+
+def field_spans(spans, metrics, entry):
+    """The spans that were drawn for a layout field.
+
+    A field's text sits on a baseline inside its rectangle that depends
+    only on the (possibly shrunk) font size, so spans are matched by their
+    baseline, and by their start (left aligned) or middle (centred).
+    """
+    _, rect, align, font_size = entry
+    lowest = receipt_engine.place_text(metrics, rect, '', align, receipt_engine.MIN_FONT_SIZE)[0].y
+    highest = receipt_engine.place_text(metrics, rect, '', align, font_size)[0].y
+    matched = []
+    for span in spans:
+        x, y = span['origin']
+        if not lowest - 0.01 <= y <= highest + 0.01:
+            continue
+        if align == 'center':
+            x0, _, x1, _ = span['bbox']
+            if abs((x0 + x1) / 2 - (rect.x0 + rect.x1) / 2) <= 1:
+                matched.append(span)
+        elif rect.x0 <= x <= rect.x1:
+            matched.append(span)
+    return matched
+
+
+def apply_edits(doc, changes, page_number=0, template=None, timer=NULL_TIMER):
+    """Replace the text of the changed fields on one page of an open document.
+
+    Returns [{'field', 'old', 'new'}] for the fields that were edited.
+    """
+    if not 0 <= page_number < doc.page_count:
+        raise ReceiptEditError(f'Page {page_number} does not exist.')
+    template = template or receipt_engine.get_template()
+    values = layout_values(changes)
+    page = doc[page_number]
+    entries = [entry for entry in template.layout if entry[0] in values]
+    order = {entry[0]: i for i, entry in enumerate(template.layout)}
+
+    edits = []
+    with timer.stage('redact'):
+        spans = page_spans(page)
+        # Text shrunk to MIN_FONT_SIZE can still overflow its rect into a
+        # neighbouring field (a long description into the quantity column).
+        # Redacting it removes that field's glyphs too, so any field a
+        # redaction reaches is redacted as well and redrawn with its text.
+        pending, redrawn = list(entries), set()
+        while pending:
+            entry = pending.pop()
+            redrawn.add(entry[0])
+            matched = field_spans(spans, template.metrics, entry)
+            old = ' '.join(span['text'] for span in matched)
+            if entry[0] in values:
+                edits.append({'field': entry[0], 'old': old, 'new': values[entry[0]]})
+            else:
+                values[entry[0]] = old
+                entries.append(entry)
+            for span in matched:
+                bbox = fitz.Rect(span['bbox'])
+                y, size = span['origin'][1], span['size']
+                band = fitz.Rect(bbox.x0, y - REDACT_BAND[0] * size, bbox.x1, y - REDACT_BAND[1] * size)
+                page.add_redact_annot(band)
+                pending.extend(other for other in template.layout
+                               if other[0] not in redrawn and other not in pending and band.intersects(other[1]))
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_NONE,
+                              graphics=fitz.PDF_REDACT_LINE_ART_NONE)
+        edits.sort(key=lambda edit: order[edit['field']])
+
+    template.draw(page, entries, values, timer)
+    return edits
+
+
+def edit_file(path, changes, page_number=0, timer=NULL_TIMER):
+    """Edit a receipt PDF in place with an incremental save.
+
+    Returns (edits, bytes appended, revision count after the edit).
+    """
+    size_before = os.path.getsize(path)
+    with fitz.open(path) as doc:
+        if not doc.can_save_incrementally():
+            raise ReceiptEditError('This PDF cannot be updated incrementally (damaged or encrypted).')
+        edits = apply_edits(doc, changes, page_number, timer=timer)
+        with timer.stage('save'):
+            doc.saveIncr()
+    with fitz.open(path) as doc:
+        revisions = doc.version_count
+    METRICS.inc('receipt_edits_total', amount=len(edits))
+    return edits, os.path.getsize(path) - size_before, revisions
+
+
+def edit_bytes(pdf_bytes, changes, page_number=0, timer=NULL_TIMER):
+    """Edit an in-memory receipt PDF; returns (edited bytes, edits).
+
+    PyMuPDF can only save incrementally to the file a document came from,
+    so the bytes take a round trip through a temporary file.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='receipt_edit_')
+    try:
+        path = os.path.join(tmp_dir, 'receipt.pdf')
+        with open(path, 'wb') as f:
+            f.write(pdf_bytes)
+        edits, _, _ = edit_file(path, changes, page_number, timer)
+        with open(path, 'rb') as f:
+            return f.read(), edits
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def install(app, output_folder=None):
+    """Register the edit routes on a Flask app.
+
+    POST /api/receipts/edit takes a multipart upload (`file`, `changes` as a
+    JSON object, optional `page`) and returns the edited PDF. With an
+    output_folder, POST /api/outputs/<filename>/edit also edits a receipt
+    the app saved there, in place, from a JSON body {"changes": {...}, "page": 0}.
+    """
+    import json
+    from flask import request, jsonify, Response, abort
+    from werkzeug.utils import secure_filename
+
+    def parse_changes(raw):
+        changes = json.loads(raw) if isinstance(raw, str) else raw
+        if not isinstance(changes, dict) or not changes:
+            raise ReceiptEditError('changes must be a non-empty JSON object.')
+        return changes
+
+    def edit_upload():
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify(error='Upload the receipt PDF as "file".'), 400
+        try:
+            changes = parse_changes(request.form.get('changes', ''))
+            page_number = request.form.get('page', 0, type=int)
+            pdf_bytes, edits = edit_bytes(upload.read(), changes, page_number, current_timer())
+        except (ReceiptEditError, json.JSONDecodeError) as e:
+            return jsonify(error=str(e)), 400
+        except (RuntimeError, fitz.FileDataError) as e:
+            logger.error(f"Error editing uploaded receipt: {e}")
+            METRICS.inc('receipt_errors_total', endpoint='edit_upload')
+            return jsonify(error='Could not edit this PDF.'), 400
+
+        return Response(pdf_bytes, mimetype='application/pdf', headers={
+            'Content-Disposition': f'attachment; filename="{secure_filename(upload.filename or "receipt.pdf")}"',
+            'X-Receipt-Edits': json.dumps(edits),
+        })
+
+    app.add_url_rule('/api/receipts/edit', 'edit_upload', edit_upload, methods=['POST'])
+
+    if output_folder is None:
+        return
+
+    def edit_output(filename):
+        path = os.path.join(output_folder, secure_filename(filename))
+        if not filename.endswith('.pdf') or not os.path.isfile(path):
+            abort(404)
+        payload = request.get_json(silent=True) or {}
+        try:
+            changes = parse_changes(payload.get('changes'))
+            edits, appended, revisions = edit_file(path, changes, int(payload.get('page', 0)), current_timer())
+        except (ReceiptEditError, ValueError) as e:
+            return jsonify(error=str(e)), 400
+        return jsonify(filename=os.path.basename(path), edits=edits, bytes_appended=appended,
+                       size=os.path.getsize(path), revisions=revisions)
+
+    app.add_url_rule('/api/outputs/<filename>/edit', 'edit_output', edit_output, methods=['POST'])
@@ -0,0 +1,529 @@
+"""
+Delivery Receipt Fill Engine
+Shared layout and drawing code for the Flask app (app.py) and the Vercel
+function (api/index.py).
+
+Everything that does not depend on the request - the template bytes, the
+font metrics and the field rectangles - lives on a ReceiptTemplate that is
+built once per process and reused for every fill.
+
+Field rectangles come from a layout definition (DEFAULT_LAYOUT for the
+delivery receipt; template_registry.py loads others from JSON). Warm
+templates are kept in an LRU bounded by count, by bytes held and,
+optionally, by the process's RSS.
+"""
+
+import os
+import zlib
+import logging
+import functools
+import itertools
+import threading
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+
+from receipt_metrics import METRICS, NULL_TIMER
+from memory_watchdog import current_rss_kb
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TEMPLATE_PATH = os.path.join(BASE_DIR, 'delivery_receipt_template.pdf')
+
+# Define the field positions based on the template analysis
+TABLE_ROWS = [
+    {'y_start': 275, 'y_end': 309},  # Row 1
+    {'y_start': 309, 'y_end': 343},  # Row 2
+    {'y_start': 343, 'y_end': 377},  # Row 3
+    {'y_start': 377, 'y_end': 411},  # Row 4
+    {'y_start': 411, 'y_end': 445},  # Row 5
+]
+
+TABLE_COLUMNS = {
+    'item_description': {'x_start': 45, 'x_end': 325},
+    'quantity': {'x_start': 335, 'x_end': 425},
+    'remarks': {'x_start': 435, 'x_end': 615}
+}
+
+
+def _columns(x):
+    return [TABLE_COLUMNS[x]['x_start'], TABLE_COLUMNS[x]['x_end']]
+
+
+# Layout definition of the delivery receipt. Fields draw data[source]
+# (source defaults to the field name); table rows draw one receipt item
+# each, as fields item<n>_<source>, with each cell padded vertically.
+# template_registry.py reads other templates' definitions from JSON in the
+# same shape.
+DEFAULT_LAYOUT = {
+    'fields': [
+        # Date (Top) - after "Date: "
+        {'field': 'date', 'rect': [80, 76, 250, 92], 'font_size': 16},
+        # Consignee - after "Consignee: "
+        {'field': 'consignee', 'rect': [115, 163, 400, 183], 'font_size': 16},
+        # Delivery Location - after "Delivery Location: "
+        {'field': 'delivery_location', 'rect': [155, 182, 540, 198], 'font_size': 16},
+        # Date (Bottom) - sits on the line under "Date:"
+        {'field': 'date_bottom', 'source': 'date', 'rect': [50, 680, 250, 700]},
+    ],
+    'table': {
+        'rows': [[row['y_start'], row['y_end']] for row in TABLE_ROWS],
+        'padding': 2,
+        'columns': [
+            {'source': 'description', 'x': _columns('item_description'), 'format': '{n}. {value}'},
+            {'source': 'quantity', 'x': _columns('quantity'), 'align': 'center'},
+            {'source': 'remarks', 'x': _columns('remarks')},
+        ],
+    },
+    'font_size': 14,
+}
+
+FONT_NAME = "helv"  # Helvetica
+MIN_FONT_SIZE = 6
+BLACK = fitz.pdfcolor["black"]
+
+# Fields that depend only on the consignee; known (consignee, location)
+# pairs get a template variant with these already drawn
+PREBAKED_FIELDS = ('consignee', 'delivery_location')
+# Warm templates kept per process, and the template and variant bytes they
+# may hold between them; the least recently used go first
+MAX_TEMPLATES = int(os.environ.get('RECEIPT_MAX_TEMPLATES', '16'))
+TEMPLATE_CACHE_BYTES = int(os.environ.get('RECEIPT_TEMPLATE_CACHE_MB', '128')) * 1024 * 1024
+# Past this RSS, loading a template drops every other one (0: no limit)
+TEMPLATE_RSS_LIMIT_KB = int(os.environ.get('RECEIPT_TEMPLATE_RSS_MB', '0')) * 1024
+MAX_VARIANTS = int(os.environ.get('RECEIPT_MAX_VARIANTS', '256'))
+# Variants baked when a directory is registered; the rest are baked on first use
+EAGER_VARIANTS = int(os.environ.get('RECEIPT_EAGER_VARIANTS', '32'))
+
+# Output profiles: name -> (fill from the compacted template, save options).
+# "compact" trades a little CPU per save for smaller files (garbage=4 also
+# merges identical streams, so a merged batch stores the template image
+# once); "web" is the same without object streams and linearized for fast
+# web view, where this MuPDF still supports it (see save_options)
+SAVE_PROFILES = {
+    'default': (False, {}),
+    'compact': (True, {'garbage': 4, 'deflate': True, 'use_objstms': 1}),
+    'web': (True, {'garbage': 4, 'deflate': True, 'linear': True}),
+}
+DEFAULT_PROFILE = os.environ.get('RECEIPT_SAVE_PROFILE', 'default')
+
+
+@functools.lru_cache(maxsize=None)
+def font_metrics(font_name=FONT_NAME):
+    """FontMetrics shared by every template drawing in font_name."""
+    return FontMetrics(font_name)
+
+
+class FontMetrics:
+    """Advance widths at font size 1, so text fitting is plain arithmetic.
+
+    Latin-1 is measured up front; anything else is measured on first use.
+    """
+
+    def __init__(self, font_name=FONT_NAME):
+        self.font = fitz.Font(font_name)
+        self.widths = {chr(c): self.font.text_length(chr(c), fontsize=1) for c in range(32, 256)}
+
+    def text_length(self, text, fontsize):
+        widths = self.widths
+        total = 0.0
+        for ch in text:
+            width = widths.get(ch)
+            if width is None:
+                width = widths[ch] = self.font.text_length(ch, fontsize=1)
+            total += width
+        return total * fontsize
+
+
+def compile_layout(definition=DEFAULT_LAYOUT):
+    """Build the list of (field, rect, align, font_size) drawn on the receipt."""
+    font_size = definition.get('font_size', 14)
+    layout = [(entry['field'], fitz.Rect(entry['rect']), entry.get('align', 'left'),
+               entry.get('font_size', font_size))
+              for entry in definition.get('fields', [])]
+
+    table = definition.get('table')
+    if table:
+        padding = table.get('padding', 0)
+        for i, (y_start, y_end) in enumerate(table['rows'], 1):
+            for column in table['columns']:
+                rect = fitz.Rect(column['x'][0], y_start - padding, column['x'][1], y_end + padding)
+                layout.append((f"item{i}_{column['source']}", rect, column.get('align', 'left'),
+                               column.get('font_size', table.get('font_size', font_size))))
+
+    return layout
+
+
+def field_values(data, definition=DEFAULT_LAYOUT):
+    """Flatten receipt data into {field: text} using the layout field names."""
+    values = {entry['field']: data.get(entry.get('source', entry['field']))
+              for entry in definition.get('fields', [])}
+
+    table = definition.get('table')
+    if table:
+        for i, item in enumerate(data.get('items', [])[:len(table['rows'])], 1):
+            for column in table['columns']:
+                value = item.get(column['source'])
+                if value and 'format' in column:
+                    value = column['format'].format(n=i, value=value)
+                values[f"item{i}_{column['source']}"] = value
+    return values
+
+
+def fit_text(metrics, text, rect, font_size):
+    """Shrink the font in 0.5pt steps until text fits the rect (2px padding each side)."""
+    current_font_size = font_size
+    text_width = metrics.text_length(text, current_font_size)
+    rect_width = rect.width - 4
+
+    while text_width > rect_width and current_font_size > MIN_FONT_SIZE:
+        current_font_size -= 0.5
+        text_width = metrics.text_length(text, current_font_size)
+
+    return current_font_size, text_width
+
+
+def place_text(metrics, rect, text, align="left", font_size=14):
+    """Baseline origin, font size and width of text drawn in rect."""
+    current_font_size, text_width = fit_text(metrics, text, rect, font_size)
+
+    # Lift text up larger amount for larger font (-8)
+    y_pos = rect.y1 - ((rect.height - current_font_size) / 2) - 8
+
+    if align == "center":
+        x_pos = rect.x0 + (rect.width - text_width) / 2
+    else:  # left
+        x_pos = rect.x0 + 2  # Left padding
+
+    return fitz.Point(x_pos, y_pos), current_font_size, text_width
+
+
+def text_bbox(metrics, rect, text, align="left", font_size=14):
+    """Area the drawn text can cover (it may extend past rect vertically)."""
+    point, current_font_size, text_width = place_text(metrics, rect, text, align, font_size)
+    font = metrics.font
+    return fitz.Rect(point.x, point.y - font.ascender * current_font_size,
+                     point.x + text_width, point.y - font.descender * current_font_size)
+
+
+def draw_text_in_rect(shape, metrics, rect, text, align="left", font_size=14, timer=NULL_TIMER):
+    """Draw text in a rectangle with auto-scaling and alignment.
+
+    Text goes onto a Shape so a whole receipt is committed to the page's
+    content stream once instead of once per field.
+    """
+    if not text:
+        return
+
+    with timer.stage('fit'):
+        point, current_font_size, _ = place_text(metrics, rect, text, align, font_size)
+
+    with timer.stage('insert_text'):
+        shape.insert_text(point, text, fontname=FONT_NAME,
+                          fontsize=current_font_size, color=BLACK)
+
+
+# ============ Output Profiles ============
+
+@functools.lru_cache(maxsize=None)
+def linear_supported():
+    """Whether this MuPDF can still write linearized PDFs (dropped in 1.26)."""
+    doc = fitz.open()
+    doc.new_page()
+    try:
+        doc.tobytes(linear=True)
+        return True
+    except Exception as e:  # MuPDF raises its own error classes here
+        logger.warning(f"Linearized output unavailable, \"web\" saves without it: {e}")
+        return False
+    finally:
+        doc.close()
+
+
+def output_profile(profile=None):
+    """(compact template, save options) for a profile name (default: RECEIPT_SAVE_PROFILE)."""
+    profile = profile or DEFAULT_PROFILE
+    if profile not in SAVE_PROFILES:
+        raise ValueError(f'Unknown output profile "{profile}", expected one of {", ".join(SAVE_PROFILES)}.')
+    return SAVE_PROFILES[profile]
+
+
+def save_options(profile=None):
+    """Document.save/tobytes options for an output profile."""
+    options = output_profile(profile)[1]
+    if options.get('linear') and not linear_supported():
+        options = {key: value for key, value in options.items() if key != 'linear'}
+    return options
+
+
+def compact_pdf(pdf_bytes):
+    """The template rewritten to render identically in fewer bytes.
+
+    Scans are often stored as RGB with an ICC profile and an opaque soft
+    mask although every pixel is grey: those become one DeviceGray channel
+    without the mask. Embedded fonts are subset to the glyphs the template
+    uses (filled text is Helvetica, which is never embedded), and unused
+    objects are dropped.
+    """
+    with fitz.open(stream=pdf_bytes, filetype='pdf') as doc:
+        for page in doc:
+            for xref, smask, *_ in page.get_images(full=True):
+                pix = fitz.Pixmap(doc, xref)
+                if pix.n != 3 or 'RGB' not in pix.colorspace.name:
+                    continue
+                samples = pix.samples
+                gray = samples[::3]
+                if gray != samples[1::3] or gray != samples[2::3]:
+                    continue
+                doc.update_stream(xref, zlib.compress(gray, 9), compress=0)
+                doc.xref_set_key(xref, 'Filter', '/FlateDecode')
+                doc.xref_set_key(xref, 'DecodeParms', 'null')
+                doc.xref_set_key(xref, 'ColorSpace', '/DeviceGray')
+                if smask and set(fitz.Pixmap(doc, smask).samples) == {255}:
+                    doc.xref_set_key(xref, 'SMask', 'null')
+        doc.subset_fonts()
+        return doc.tobytes(garbage=3, deflate=True)
+
+
+# ============ Templates ============
+
+class ReceiptTemplate:
+    """A parsed receipt template, its font metrics and compiled layout.
+
+    The template is partially evaluated ahead of time:
+    - the base copy already has Helvetica installed in the page resources,
+      so per-request drawing skips the font setup;
+    - known (consignee, location) pairs from the consignee directory get a
+      variant with those two fields drawn, so a request for that pair only
+      draws the date and item rows.
+
+    Variants are kept in an LRU of MAX_VARIANTS and rebuilt when the
+    directory version changes; a changed template file means a new
+    ReceiptTemplate (see get_template) and therefore fresh variants.
+
+    A compact template is built from compact_pdf(template) for the
+    "compact" and "web" output profiles.
+
+    definition is the layout (DEFAULT_LAYOUT's shape). Variants are only
+    baked when it draws the consignee and delivery location as themselves.
+    """
+
+    def __init__(self, path=DEFAULT_TEMPLATE_PATH, compact=False, definition=DEFAULT_LAYOUT):
+        self.path = path
+        self.compact = compact
+        self.definition = definition
+        stat = os.stat(path)
+        self.fingerprint = (stat.st_mtime_ns, stat.st_size)
+        with open(path, 'rb') as f:
+            self.pdf_bytes = f.read()
+        if compact:
+            self.pdf_bytes = compact_pdf(self.pdf_bytes)
+
+        # Parse once up front so a broken template fails at startup, not per request
+        with fitz.open(stream=self.pdf_bytes, filetype='pdf') as doc:
+            self.page_rect = doc[0].rect
+
+        self.metrics = font_metrics()
+        self.layout = compile_layout(definition)
+        self.variant_layout = [entry for entry in self.layout if entry[0] not in PREBAKED_FIELDS]
+        sources = {entry['field']: entry.get('source', entry['field']) for entry in definition.get('fields', [])}
+        self.prebaked = all(sources.get(field) == field for field in PREBAKED_FIELDS)
+        self.max_items = len(definition['table']['rows']) if definition.get('table') else 0
+
+        self.directory = {}
+        self.directory_version = None
+        self.variants = OrderedDict()
+        self._variants_lock = threading.Lock()
+        self.base = self._bake({})
+
+    def open(self, prepared=None):
+        """Open a fresh in-memory copy of the template, or of a baked (bytes, font_infos)."""
+        if prepared is None:
+            return fitz.open(stream=self.pdf_bytes, filetype='pdf')
+
+        pdf_bytes, font_infos = prepared
+        doc = fitz.open(stream=pdf_bytes, filetype='pdf')
+        # PyMuPDF keeps per-document font metrics in FontInfos and rebuilds
+        # them (~1.5ms) for every new document; the baked copy's are identical
+        if hasattr(doc, 'FontInfos'):
+            doc.FontInfos.extend([xref, dict(info)] for xref, info in font_infos)
+        return doc
+
+    def filled(self, page_number, layout, values, prepared=None, timer=NULL_TIMER):
+        """open() with values drawn on a page; the document is closed if drawing fails.
+
+        Callers own the returned document: use it as a context manager.
+        """
+        with timer.stage('open'):
+            doc = self.open(prepared)
+        try:
+            self.draw(doc[page_number], layout, values, timer)
+        except BaseException:
+            doc.close()
+            raise
+        return doc
+
+    def draw(self, page, layout, values, timer=NULL_TIMER):
+        shape = page.new_shape()
+        for field, rect, align, font_size in layout:
+            draw_text_in_rect(shape, self.metrics, rect, values.get(field), align, font_size, timer)
+        with timer.stage('insert_text'):
+            shape.commit()
+
+    def _bake(self, values):
+        """Template bytes with the font installed and `values` drawn, plus its font infos."""
+        with self.open() as doc:
+            page = doc[0]
+            page.insert_font(fontname=FONT_NAME)
+            layout = [entry for entry in self.layout if entry[0] in values]
+            if layout:
+                self.draw(page, layout, values)
+            font_infos = [[xref, dict(info)] for xref, info in getattr(doc, 'FontInfos', [])]
+            # No garbage collection, so xrefs in the bytes match font_infos
+            return doc.tobytes(), font_infos
+
+    # ============ Consignee Variants ============
+
+    def set_directory(self, directory, version):
+        """Use a {consignee: location} mapping; pre-bake the first EAGER_VARIANTS of it."""
+        if version == self.directory_version:
+            return
+        with self._variants_lock:
+            self.variants.clear()
+            self.directory = directory
+            self.directory_version = version
+        if not self.prebaked:
+            return
+        for consignee in itertools.islice(directory, min(EAGER_VARIANTS, MAX_VARIANTS)):
+            self.variant(consignee, directory[consignee])
+
+    def variant(self, consignee, location):
+        """The baked variant for a directory pair, or None for unknown pairs."""
+        if not self.prebaked:
+            return None
+        key = (consignee, location)
+        with self._variants_lock:
+            prepared = self.variants.get(key)
+            if prepared is not None:
+                self.variants.move_to_end(key)
+        if prepared is not None:
+            METRICS.inc('receipt_cache_hits_total', cache='variant')
+            return prepared
+
+        # Only pairs from the directory are cached, so arbitrary input can't flush it
+        if self.directory.get(consignee) != location:
+            return None
+
+        METRICS.inc('receipt_cache_misses_total', cache='variant')
+        prepared = self._bake({'consignee': consignee, 'delivery_location': location})
+        with self._variants_lock:
+            self.variants[key] = prepared
+            while len(self.variants) > MAX_VARIANTS:
+                self.variants.popitem(last=False)
+        return prepared
+
+    # ============ Filling ============
+
+    def render(self, data, timer=NULL_TIMER):
+        """Return an open document with the receipt data drawn on page 1.
+
+        The caller closes it (with self.render(data) as doc: ...).
+        """
+        values = field_values(data, self.definition)
+        variant = self.variant(data.get('consignee'), data.get('delivery_location'))
+        layout = self.layout if variant is None else self.variant_layout
+        return self.filled(0, layout, values, variant or self.base, timer)
+
+    def fill_bytes(self, data, timer=NULL_TIMER, profile=None):
+        options = save_options(profile)
+        with self.render(data, timer) as doc:
+            with timer.stage('save'):
+                return doc.tobytes(**options)
+
+    def fill_file(self, data, output_path, timer=NULL_TIMER, profile=None):
+        options = save_options(profile)
+        with self.render(data, timer) as doc:
+            with timer.stage('save'):
+                doc.save(output_path, **options)
+        return output_path
+
+    def nbytes(self):
+        """Template and variant bytes this template keeps in memory."""
+        with self._variants_lock:
+            variants = sum(len(pdf_bytes) for pdf_bytes, _ in self.variants.values())
+        return len(self.pdf_bytes) + len(self.base[0]) + variants
+
+
+# ============ Template Cache ============
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+_directory = ({}, None)
+
+
+def set_directory(directory, version):
+    """Register the consignee directory used for pre-baked template variants.
+
+    version must change whenever the directory contents do.
+    """
+    global _directory
+    _directory = (directory, version)
+    with _templates_lock:
+        templates = list(_templates.values())
+    for template in templates:
+        template.set_directory(directory, version)
+
+
+def get_template(path=DEFAULT_TEMPLATE_PATH, profile=None, definition=None, template_id=None):
+    """Return the warm ReceiptTemplate for path, reloading it if the file changed.
+
+    Profiles that fill from the compacted template share one of their own.
+    template_registry passes a layout definition and its template_id;
+    a changed definition also means a reload.
+    """
+    definition = definition or DEFAULT_LAYOUT
+    compact = output_profile(profile)[0]
+    key = (path, compact, template_id)
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+    if template is not None:
+        stat = os.stat(path)
+        if template.fingerprint == (stat.st_mtime_ns, stat.st_size) and template.definition == definition:
+            METRICS.inc('receipt_cache_hits_total', cache='template')
+            return template
+        logger.info(f"Template changed, reloading: {template_id or path}")
+
+    METRICS.inc('receipt_cache_misses_total', cache='template')
+    template = ReceiptTemplate(path, compact, definition)
+    template.set_directory(*_directory)
+    with _templates_lock:
+        _templates[key] = template
+        _templates.move_to_end(key)
+        _evict_templates()
+    return template
+
+
+def cached_templates():
+    """The warm templates currently cached, least recently used first."""
+    with _templates_lock:
+        return list(_templates.values())
+
+
+def _evict_templates():
+    """Drop least recently used templates (never the newest) while over a limit."""
+    while len(_templates) > 1:
+        if len(_templates) > MAX_TEMPLATES:
+            reason = 'count'
+        elif sum(template.nbytes() for template in _templates.values()) > TEMPLATE_CACHE_BYTES:
+            reason = 'bytes'
+        elif TEMPLATE_RSS_LIMIT_KB and (current_rss_kb() or 0) > TEMPLATE_RSS_LIMIT_KB:
+            # Freed memory rarely shows in RSS at once, so this empties the cache
+            reason = 'rss'
+        else:
+            return
+        key, _ = _templates.popitem(last=False)
+        METRICS.inc('receipt_cache_evictions_total', cache='template', reason=reason)
+        logger.info(f"Evicted template {key[2] or key[0]} ({reason} limit)")
@@ -0,0 +1,220 @@
+"""
+Receipt Metrics
+Per-request stage timers, surfaced as a Server-Timing header, and a
+process-wide registry of counters and latency histograms served in
+Prometheus text format on /metrics.
+
+Counters live per process; when several workers serve the app each one
+reports its own numbers.
+"""
+
+import time
+import threading
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; receipts normally land in the 5-50ms range
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+METRIC_HELP = {
+    'receipt_requests_total': ('counter', 'HTTP requests handled, by endpoint and status.'),
+    'receipt_errors_total': ('counter', 'Receipt generation failures, by endpoint.'),
+    'receipt_bytes_out_total': ('counter', 'Response body bytes sent, by endpoint.'),
+    'receipt_bulk_receipts_total': ('counter', 'Receipts filled through the bulk API, by output format.'),
+    'receipt_cache_hits_total': ('counter', 'Cache hits, by cache.'),
+    'receipt_cache_misses_total': ('counter', 'Cache misses, by cache.'),
+    'receipt_cache_evictions_total': ('counter', 'Cache evictions, by cache and the limit that forced them.'),
+    'receipt_rejected_total': ('counter', 'Requests refused with 503 by admission control.'),
+    'receipt_edits_total': ('counter', 'Fields changed in existing receipts with incremental saves.'),
+    'receipt_autofill_jobs_total': ('counter', 'Background autofill jobs, by state reached (queued, done, failed).'),
+    'receipt_request_seconds': ('histogram', 'Request latency, by endpoint.'),
+    'receipt_stage_seconds': ('histogram', 'Time spent per fill stage.'),
+}
+
+
+class _Stage:
+    __slots__ = ('stages', 'name', 'start')
+
+    def __init__(self, stages, name):
+        self.stages = stages
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.stages[self.name] = self.stages.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+class StageTimer:
+    """Accumulates wall time per named stage for a single request.
+
+    Usage:
+        with timer.stage('save'):
+            doc.save(path)
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    def stage(self, name):
+        return _Stage(self.stages, name)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self, total=None):
+        """Format the stages as a Server-Timing header value (milliseconds)."""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        parts.append(f"total;dur={(self.elapsed() if total is None else total) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+class NullTimer:
+    """Stand-in used when nobody is collecting timings."""
+
+    _stage = _NullStage()
+    stages = {}
+
+    def stage(self, name):
+        return self._stage
+
+
+NULL_TIMER = NullTimer()
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_stages(self, timer):
+        for stage, seconds in timer.stages.items():
+            self.observe('receipt_stage_seconds', seconds, stage=stage)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count)) for key, h in self.histograms.items())
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described and name in METRIC_HELP:
+                kind, help_text = METRIC_HELP[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+def current_timer():
+    """The StageTimer of the Flask request being handled, if any."""
+    from flask import g, has_request_context
+    if has_request_context():
+        return g.get('stage_timer', NULL_TIMER)
+    return NULL_TIMER
+
+
+def install(app, registry=METRICS):
+    """Time every request of a Flask app and serve the registry on /metrics."""
+    from flask import g, request, Response
+
+    @app.before_request
+    def _start_stage_timer():
+        g.stage_timer = StageTimer()
+
+    @app.after_request
+    def _record_request(response):
+        timer = g.pop('stage_timer', None)
+        if timer is None:
+            return response
+
+        elapsed = timer.elapsed()
+        endpoint = request.endpoint or 'unknown'
+        if timer.stages:
+            response.headers['Server-Timing'] = timer.server_timing(elapsed)
+
+        registry.inc('receipt_requests_total', endpoint=endpoint, status=str(response.status_code))
+        registry.observe('receipt_request_seconds', elapsed, endpoint=endpoint)
+        registry.observe_stages(timer)
+        if response.content_length:
+            registry.inc('receipt_bytes_out_total', response.content_length, endpoint=endpoint)
+        return response
+
+    def metrics():
+        return Response(registry.render(), mimetype=PROMETHEUS_CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    return registry
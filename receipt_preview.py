@@ -0,0 +1,236 @@
+"""
+Live Receipt Preview
+GET /preview renders the receipt as an image from the same query fields
+as the form, fast enough to refresh while typing.
+
+Instead of rasterizing the filled page on every request, the blank
+template is rasterized once per DPI, and each field's text is rendered on
+its own onto a transparent page, clipped to the area the text covers, into
+a coverage patch cached by (field, text, dpi). A request then only renders
+the fields whose text changed and blends the patches onto a copy of the
+template raster with MuPDF's own arithmetic for black text over a
+backdrop. The result differs from a full get_pixmap of the filled page by
+at most a few grey levels on anti-aliased glyph edges.
+
+(The template is a scanned image, so patches must not contain it: MuPDF
+resamples an image differently near a clip edge.)
+
+NumPy and Pillow are imported on first use so they stay out of the app's
+cold start.
+"""
+
+import io
+import os
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import fitz  # PyMuPDF
+
+import receipt_engine
+import template_registry
+from receipt_metrics import METRICS, NULL_TIMER, current_timer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DPI = 96
+MIN_DPI = 36
+MAX_DPI = 200
+MAX_PATCHES = int(os.environ.get('RECEIPT_PREVIEW_PATCHES', '512'))
+# Template rasters kept, most recently used first; each is up to ~3.7MB at MAX_DPI
+MAX_RASTERS = int(os.environ.get('RECEIPT_PREVIEW_RASTERS', '4'))
+FORMATS = {'png': 'image/png', 'webp': 'image/webp'}
+
+# The template is black and white, so one channel carries everything and
+# is a third of the pixels to composite and encode
+COLORSPACE = fitz.csGRAY
+
+# Pixels added around a field's text box for anti-aliasing
+CLIP_MARGIN = 1
+
+
+def form_data(form, today=None, template=None):
+    """Receipt data from form fields, with the same defaults as the form POST.
+
+    Reads as many item rows as template (a ReceiptTemplate) has; the
+    delivery receipt's by default.
+    """
+    rows = template.max_items if template is not None else len(receipt_engine.TABLE_ROWS)
+    items = []
+    for i in range(1, rows + 1):
+        desc = form.get(f'item{i}_description', '').strip()
+        if desc:
+            items.append({
+                'description': desc,
+                'quantity': form.get(f'item{i}_quantity', '1 unit').strip() or '1 unit',
+                'remarks': form.get(f'item{i}_remarks', 'No issues').strip() or 'No issues'
+            })
+    return {
+        'date': form.get('date', '').strip() or today or datetime.now().strftime("%m/%d/%Y"),
+        'consignee': form.get('consignee', '').strip(),
+        'delivery_location': form.get('delivery_location', '').strip(),
+        'items': items,
+    }
+
+
+def pixmap_array(pix):
+    import numpy as np
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+
+class PreviewRenderer:
+    """Cached template rasters and per-field patches for one ReceiptTemplate."""
+
+    def __init__(self, template):
+        self.template = template
+        self.blank = self._blank_page()
+        self.rasters = OrderedDict()
+        self.patches = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _blank_page(self):
+        """An empty page the template's size with the font installed, as (bytes, font_infos)."""
+        with fitz.open() as doc:
+            page = doc.new_page(width=self.template.page_rect.width, height=self.template.page_rect.height)
+            page.insert_font(fontname=receipt_engine.FONT_NAME)
+            font_infos = [[xref, dict(info)] for xref, info in getattr(doc, 'FontInfos', [])]
+            return doc.tobytes(), font_infos
+
+    @staticmethod
+    def matrix(dpi):
+        return fitz.Matrix(dpi / 72, dpi / 72)
+
+    def raster(self, dpi):
+        """The blank template at dpi as a read-only (h, w) grayscale array."""
+        with self._lock:
+            raster = self.rasters.get(dpi)
+            if raster is not None:
+                self.rasters.move_to_end(dpi)
+        if raster is not None:
+            METRICS.inc('receipt_cache_hits_total', cache='preview_raster')
+            return raster
+
+        METRICS.inc('receipt_cache_misses_total', cache='preview_raster')
+        with self.template.open(self.template.base) as doc:
+            pix = doc[0].get_pixmap(matrix=self.matrix(dpi), colorspace=COLORSPACE, alpha=False)
+        raster = pixmap_array(pix).copy()
+        raster.flags.writeable = False
+        with self._lock:
+            self.rasters[dpi] = raster
+            while len(self.rasters) > MAX_RASTERS:
+                self.rasters.popitem(last=False)
+        return raster
+
+    def patch(self, entry, text, dpi):
+        """(x, y, alpha) for one field: the text's coverage, clipped to its box."""
+        import numpy as np
+
+        field, rect, align, font_size = entry
+        key = (field, text, dpi)
+        with self._lock:
+            patch = self.patches.get(key)
+            if patch is not None:
+                self.patches.move_to_end(key)
+        if patch is not None:
+            METRICS.inc('receipt_cache_hits_total', cache='preview_patch')
+            return patch
+
+        METRICS.inc('receipt_cache_misses_total', cache='preview_patch')
+        template = self.template
+        matrix = self.matrix(dpi)
+        # Snap the clip to whole pixels so no glyph pixel is cut partway
+        bbox = receipt_engine.text_bbox(template.metrics, rect, text, align, font_size) & template.page_rect
+        pixels = (bbox * matrix).irect + (-CLIP_MARGIN, -CLIP_MARGIN, CLIP_MARGIN, CLIP_MARGIN)
+        clip = fitz.Rect(pixels) * ~matrix
+
+        with template.filled(0, [entry], {field: text}, self.blank) as doc:
+            pix = doc[0].get_pixmap(matrix=matrix, clip=clip, colorspace=COLORSPACE, alpha=True)
+        alpha = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 2)[..., 1]
+
+        patch = (pix.x, pix.y, alpha.copy())
+
+        with self._lock:
+            self.patches[key] = patch
+            while len(self.patches) > MAX_PATCHES:
+                self.patches.popitem(last=False)
+        return patch
+
+    def render(self, data, dpi=DEFAULT_DPI, timer=NULL_TIMER):
+        """The filled receipt at dpi as an (h, w) grayscale array."""
+        import numpy as np
+
+        with timer.stage('rasterize'):
+            canvas = self.raster(dpi).copy()
+            values = receipt_engine.field_values(data, self.template.definition)
+            patches = [self.patch(entry, values[entry[0]], dpi)
+                       for entry in self.template.layout if values.get(entry[0])]
+
+        with timer.stage('composite'):
+            # Black text over the backdrop, as MuPDF blends it: alpha is
+            # scaled to 0-256 (a + a >> 7), then backdrop * (256 - alpha) >> 8
+            for x, y, alpha in patches:
+                height, width = alpha.shape
+                alpha = alpha.astype(np.uint16)
+                region = canvas[y:y + height, x:x + width]
+                region[...] = (region * (256 - (alpha + (alpha >> 7)))) >> 8
+        return canvas
+
+    def render_image(self, data, dpi=DEFAULT_DPI, image_format='png', timer=NULL_TIMER):
+        """The filled receipt encoded as PNG or WebP bytes."""
+        from PIL import Image
+
+        canvas = self.render(data, dpi, timer)
+        with timer.stage('encode'):
+            buffer = io.BytesIO()
+            image = Image.fromarray(canvas)
+            if image_format == 'webp':
+                image.save(buffer, format='WEBP', quality=80, method=0)
+            else:
+                # Fast zlib level: the image is thrown away on the next keystroke
+                image.save(buffer, format='PNG', compress_level=1)
+        return buffer.getvalue()
+
+
+_renderers = {}
+
+
+def get_renderer(template_path=receipt_engine.DEFAULT_TEMPLATE_PATH, template_id=None):
+    """PreviewRenderer for the current template; a reloaded template gets a fresh one.
+
+    Renderers follow the engine's template cache: one whose template was
+    evicted there is dropped on the next miss.
+    """
+    template = template_registry.get_template(template_id, None, template_path)
+    key = (template_path, template_id)
+    renderer = _renderers.get(key)
+    if renderer is None or renderer.template is not template:
+        live = set(map(id, receipt_engine.cached_templates()))
+        for stale in [k for k, r in list(_renderers.items()) if id(r.template) not in live]:
+            _renderers.pop(stale, None)
+        renderer = _renderers[key] = PreviewRenderer(template)
+    return renderer
+
+
+def install(app, template_path):
+    """Register GET /preview on a Flask app."""
+    from flask import request, jsonify, Response
+
+    def preview():
+        image_format = request.args.get('format', 'png')
+        if image_format not in FORMATS:
+            return jsonify(error='format must be "png" or "webp".'), 400
+        dpi = request.args.get('dpi', DEFAULT_DPI, type=int)
+        dpi = max(MIN_DPI, min(dpi, MAX_DPI))
+
+        timer = current_timer()
+        try:
+            with timer.stage('template'):
+                renderer = get_renderer(template_path, request.args.get('template') or None)
+        except template_registry.TemplateError as e:
+            return jsonify(error=str(e)), 400
+        image = renderer.render_image(form_data(request.args, template=renderer.template), dpi, image_format, timer)
+        return Response(image, mimetype=FORMATS[image_format],
+                        headers={'Cache-Control': 'no-store'})
+
+    app.add_url_rule('/preview', 'preview', preview)
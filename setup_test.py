@@ -1,4 +1,19 @@
+import os
+import json
+import argparse
+
 import fitz
+import numpy as np
+
+# Label text for generated forms; a number suffix keeps every label unique
+LABELS = [
+    "Full Name", "Date of Birth", "Student ID", "Address", "City", "Postal Code",
+    "Phone", "Email", "Employer", "Position", "Start Date", "Emergency Contact",
+    "Relationship", "Nationality", "Passport No", "Tax ID", "Bank Account", "Program",
+    "Year Level", "Section", "Adviser", "Remarks", "Reference No", "Signature Date",
+]
+MAX_ROWS_PER_COLUMN = 40
+MAX_COLUMNS = 3
 
 def create_test_pdf():
     doc = fitz.open()
@@ -29,7 +44,83 @@ def create_test_data():
         json.dump(data, f, indent=2)
     print("Created test_data.json")
 
+def rasterize_page(page, dpi, noise, rng):
+    """A greyscale scan of the page as PNG bytes, with Gaussian noise of `noise` (0-1) if set."""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    gray = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    if noise:
+        gray = np.clip(gray + rng.normal(0, noise * 255, gray.shape), 0, 255).astype(np.uint8)
+    return fitz.Pixmap(fitz.csGRAY, pix.width, pix.height, np.ascontiguousarray(gray).tobytes(), False).tobytes("png")
+
+def generate_form(pdf_path, pages=1, keys=3, raster=0.0, noise=0.0, dpi=150, seed=0):
+    """
+    Writes a form of `pages` pages with `keys` labels each and returns its data.
+
+    A `raster` share of the pages (0-1) is replaced by an image-only scan at
+    `dpi`, with `noise` added; the rest keep their text layer.
+    """
+    if keys > MAX_ROWS_PER_COLUMN * MAX_COLUMNS:
+        raise ValueError(f"At most {MAX_ROWS_PER_COLUMN * MAX_COLUMNS} labels fit on a page")
+    rng = np.random.default_rng(seed)
+    width = len(str(pages * keys))
+    rows = min(keys, MAX_ROWS_PER_COLUMN)
+    columns = -(-keys // rows)
+
+    doc = fitz.open()
+    data = {}
+    for page_num in range(pages):
+        page = doc.new_page()
+        spacing = min(50, (page.rect.height - 140) / rows)
+        column_width = (page.rect.width - 100) / columns
+        text_writer = fitz.TextWriter(page.rect)
+        for k in range(keys):
+            i = page_num * keys + k
+            label = f"{LABELS[i % len(LABELS)]} {i + 1:0{width}d}"
+            column, row = divmod(k, rows)
+            text_writer.append((50 + column * column_width, 100 + row * spacing), f"{label}:", fontsize=12)
+            data[label] = f"Value {i + 1}"
+        text_writer.write_text(page)
+
+    scanned = rng.random(pages) < raster
+    if scanned.any():
+        out = fitz.open()
+        for page_num, page in enumerate(doc):
+            if scanned[page_num]:
+                out.new_page(width=page.rect.width, height=page.rect.height).insert_image(
+                    page.rect, stream=rasterize_page(page, dpi, noise, rng))
+            else:
+                out.insert_pdf(doc, from_page=page_num, to_page=page_num)
+        doc = out
+
+    doc.save(pdf_path, garbage=3, deflate=True)
+    return data
+
+def generate_corpus(out_dir, pages, keys, raster=0.0, noise=0.0, dpi=150, seed=0):
+    """Writes form_<pages>x<keys>.pdf and its .json data file; returns both paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.join(out_dir, f"form_{pages}x{keys}")
+    data = generate_form(f"{stem}.pdf", pages, keys, raster, noise, dpi, seed)
+    with open(f"{stem}.json", "w") as f:
+        json.dump(data, f, indent=2)
+    return f"{stem}.pdf", f"{stem}.json"
+
 if __name__ == "__main__":
-    create_test_pdf()
-    create_test_data()
-    print("\nNow run: python autofill.py test_form.pdf test_data.json")
+    parser = argparse.ArgumentParser(description="Create test forms for autofill.py.")
+    parser.add_argument("--pages", type=int, help="Generate a form with this many pages")
+    parser.add_argument("--keys", type=int, default=3, help="Labels per page")
+    parser.add_argument("--raster", type=float, default=0.0, help="Share of pages rasterized to image-only scans (0-1)")
+    parser.add_argument("--noise", type=float, default=0.0, help="Gaussian noise on scanned pages (0-1)")
+    parser.add_argument("--dpi", type=int, default=150, help="Resolution of scanned pages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="corpus", help="Directory for generated forms")
+    args = parser.parse_args()
+
+    if args.pages:
+        pdf_path, data_path = generate_corpus(args.out, args.pages, args.keys, args.raster,
+                                              args.noise, args.dpi, args.seed)
+        print(f"Created {pdf_path} and {data_path}")
+        print(f"\nNow run: python autofill.py {pdf_path} {data_path}")
+    else:
+        create_test_pdf()
+        create_test_data()
+        print("\nNow run: python autofill.py test_form.pdf test_data.json")
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Spool-directory work queue for receipt fills and FormAutofiller jobs.
+
+Several hosts sharing a directory (e.g. an NFS mount) drain one batch
+without a broker. The spool holds:
+
+    incoming/   queued jobs, <job id>.json
+    claimed/    jobs being worked on, <job id>@<worker id>.json
+    outbox/     results: <job id>.json (status record) and <job id>.pdf
+    failed/     jobs that used up their attempts
+    tmp/        files being written, renamed into place when complete
+
+Every state change is a rename within the spool, which is atomic on local
+filesystems and on NFS:
+
+- enqueue: write tmp/<id>.json, rename into incoming/.
+- claim: rename incoming/<id>.json to claimed/<id>@<worker>.json. Only one
+  worker's rename succeeds; the others get FileNotFoundError and move on.
+- lease: the claimed file is the lease. Its mtime is the last heartbeat,
+  refreshed every LEASE_SECONDS / 4 while the job runs, and the lease
+  expires LEASE_SECONDS after it. (The file is touched just before the
+  claim, so it never carries the stale enqueue time.)
+- reap: any worker renames claimed files with an expired lease back into
+  incoming/, so a crashed or partitioned worker's jobs run again. Hosts'
+  clocks must agree to well within LEASE_SECONDS.
+- finish: write the PDF and then the status record into outbox/, then
+  remove the lease. Reaping also clears dead workers' partial files in
+  tmp/. A job whose lease was reaped meanwhile is still published, so
+  delivery is at-least-once and outputs are named by job id: a job that
+  runs twice overwrites its own result.
+
+Job kinds:
+    {"kind": "receipt", "receipt": {...}, "profile": "compact"}
+    {"kind": "autofill", "pdf": "/shared/form.pdf", "data": {...}}
+
+Usage:
+    python spool_queue.py enqueue /mnt/spool receipts.json          # JSON array or NDJSON
+    python spool_queue.py enqueue /mnt/spool --autofill form.pdf data.json
+    python spool_queue.py worker /mnt/spool --processes 4 [--drain]
+    python spool_queue.py status /mnt/spool
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import signal
+import logging
+import argparse
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+SPOOL_DIRS = ('incoming', 'claimed', 'outbox', 'failed', 'tmp')
+LEASE_SECONDS = float(os.environ.get('SPOOL_LEASE_SECONDS', '60'))
+MAX_ATTEMPTS = int(os.environ.get('SPOOL_MAX_ATTEMPTS', '3'))
+POLL_SECONDS = 0.5
+JOB_KINDS = ('receipt', 'autofill')
+
+
+# ============ Spool Layout ============
+
+def init_spool(spool):
+    for name in SPOOL_DIRS:
+        os.makedirs(os.path.join(spool, name), exist_ok=True)
+
+
+def new_job_id():
+    # Time first, so a sorted listing is roughly FIFO
+    return f'{time.time_ns():x}-{uuid.uuid4().hex[:8]}'
+
+
+def write_atomic(spool, path, payload):
+    """Write bytes to path via tmp/, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.join(spool, 'tmp'))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def enqueue(spool, job):
+    """Queue one job dict; returns its id."""
+    if job.get('kind') not in JOB_KINDS:
+        raise ValueError(f'Job kind must be one of {", ".join(JOB_KINDS)}.')
+    job = dict(job, id=job.get('id') or new_job_id(), attempts=0, enqueued=time.time())
+    write_atomic(spool, os.path.join(spool, 'incoming', f"{job['id']}.json"), json.dumps(job).encode('utf-8'))
+    return job['id']
+
+
+def status(spool):
+    counts = {}
+    for name in ('incoming', 'claimed', 'failed'):
+        counts[name] = sum(1 for entry in os.listdir(os.path.join(spool, name)) if entry.endswith('.json'))
+    counts['finished'] = sum(1 for entry in os.listdir(os.path.join(spool, 'outbox')) if entry.endswith('.json'))
+    return counts
+
+
+# ============ Claims and Leases ============
+
+def claim_next(spool, worker_id):
+    """Claim the oldest queued job; returns (lease path, job) or None."""
+    incoming = os.path.join(spool, 'incoming')
+    for entry in sorted(os.listdir(incoming)):
+        if not entry.endswith('.json'):
+            continue
+        source = os.path.join(incoming, entry)
+        lease = os.path.join(spool, 'claimed', f'{entry[:-len(".json")]}@{worker_id}.json')
+        try:
+            os.utime(source)  # the lease starts now, not at enqueue time
+            os.rename(source, lease)
+        except FileNotFoundError:
+            # Another worker won; over NFS a retried rename can also report
+            # this after succeeding, so check before giving up
+            if not os.path.exists(lease):
+                continue
+        with open(lease) as f:
+            job = json.load(f)
+        job['attempts'] = job.get('attempts', 0) + 1
+        job['worker'] = worker_id
+        write_atomic(spool, lease, json.dumps(job).encode('utf-8'))
+        return lease, job
+    return None
+
+
+def reap_expired(spool, now=None):
+    """Requeue claimed jobs whose lease expired; returns how many."""
+    now = now or time.time()
+    claimed = os.path.join(spool, 'claimed')
+    reaped = 0
+    for entry in os.listdir(claimed):
+        if not entry.endswith('.json'):
+            continue
+        lease = os.path.join(claimed, entry)
+        try:
+            if now - os.stat(lease).st_mtime < LEASE_SECONDS:
+                continue
+            job_id = entry.partition('@')[0]
+            os.rename(lease, os.path.join(spool, 'incoming', f'{job_id}.json'))
+        except FileNotFoundError:
+            continue  # finished or reaped by someone else meanwhile
+        logger.warning(f"Lease expired, requeued {job_id} (was {entry.partition('@')[2][:-len('.json')]})")
+        reaped += 1
+
+    # Partial outputs of dead workers: job outputs are named after their
+    # lease, and write_atomic's files only live for a moment
+    leases = {entry[:-len('.json')] for entry in os.listdir(claimed)}
+    tmp = os.path.join(spool, 'tmp')
+    for entry in os.listdir(tmp):
+        path = os.path.join(tmp, entry)
+        try:
+            if os.path.splitext(entry)[0] not in leases and now - os.stat(path).st_mtime >= LEASE_SECONDS:
+                os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return reaped
+
+
+class Heartbeat(threading.Thread):
+    """Keeps a lease fresh while its job runs."""
+
+    def __init__(self, lease):
+        super().__init__(daemon=True)
+        self.lease = lease
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(LEASE_SECONDS / 4):
+            try:
+                os.utime(self.lease)
+            except FileNotFoundError:
+                logger.warning(f"Lost lease {os.path.basename(self.lease)}; the job will run again elsewhere")
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+# ============ Jobs ============
+
+def run_receipt(job, output_path):
+    import receipt_bulk
+    import receipt_engine
+
+    data = receipt_bulk.validate_receipt(job.get('receipt'))
+    profile = job.get('profile')
+    receipt_engine.get_template(profile=profile).fill_file(data, output_path, profile=profile)
+
+
+def run_autofill(job, output_path):
+    """Fill the job's PDF straight into output_path; the form itself is only read."""
+    from autofill import FormAutofiller
+
+    # A RasterizeError (a RuntimeError) fails the job like any other error
+    with FormAutofiller(job['pdf'], job.get('data') or {}) as agent:
+        filled = agent.run(output_path)
+    if filled is None:
+        raise RuntimeError('FormAutofiller found no fields to fill.')
+
+
+JOB_RUNNERS = {'receipt': run_receipt, 'autofill': run_autofill}
+
+
+def finish(spool, lease, job, record, state):
+    """Publish the status record and move the lease to its final state.
+
+    state is 'done', 'failed' (kept in failed/) or 'retry' (back to
+    incoming/ for another attempt; no record is published).
+    """
+    if state != 'retry':
+        write_atomic(spool, os.path.join(spool, 'outbox', f"{job['id']}.json"), json.dumps(record).encode('utf-8'))
+    try:
+        if state == 'done':
+            os.unlink(lease)
+        else:
+            os.rename(lease, os.path.join(spool, 'incoming' if state == 'retry' else 'failed', f"{job['id']}.json"))
+    except FileNotFoundError:
+        pass  # reaped meanwhile; the requeued copy will overwrite this result
+
+
+def process(spool, lease, job):
+    """Run a claimed job and publish its result to the outbox."""
+    job_id = job['id']
+    record = {'id': job_id, 'kind': job.get('kind'), 'worker': job['worker'],
+              'attempts': job['attempts'], 'started': time.time()}
+
+    if job['attempts'] > MAX_ATTEMPTS:
+        # Claimed and lost this often: it keeps taking its worker down
+        record.update(ok=False, error=f'Gave up after {MAX_ATTEMPTS} attempts.', finished=time.time())
+        finish(spool, lease, job, record, 'failed')
+        return record
+
+    heartbeat = Heartbeat(lease)
+    heartbeat.start()
+    tmp_path = os.path.join(spool, 'tmp', os.path.basename(lease)[:-len('.json')] + '.pdf')
+    try:
+        runner = JOB_RUNNERS.get(job.get('kind'))
+        if runner is None:
+            raise ValueError(f'Unknown job kind "{job.get("kind")}".')
+        runner(job, tmp_path)
+        # Renamed into place so the PDF appears whole
+        os.replace(tmp_path, os.path.join(spool, 'outbox', f'{job_id}.pdf'))
+        record.update(ok=True, output=f'{job_id}.pdf')
+        state = 'done'
+    except ValueError as e:
+        # Bad input fails the same way every time
+        logger.error(f"Job {job_id} rejected: {e}")
+        record.update(ok=False, error=str(e))
+        state = 'failed'
+    except Exception as e:
+        logger.error(f"Job {job_id} failed (attempt {job['attempts']} of {MAX_ATTEMPTS}): {e}")
+        record.update(ok=False, error=str(e))
+        state = 'retry' if job['attempts'] < MAX_ATTEMPTS else 'failed'
+    finally:
+        heartbeat.stop()
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    record['finished'] = time.time()
+    finish(spool, lease, job, record, state)
+    return record
+
+
+# ============ Workers ============
+
+def worker_loop(spool, drain=False):
+    """Claim and run jobs until stopped (or, with drain, until the spool is empty).
+
+    SIGTERM and SIGINT let the current job finish before the worker exits.
+    """
+    import receipt_engine
+
+    worker_id = f'{socket.gethostname()}-{os.getpid()}'
+    stopping = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stopping.set())
+    receipt_engine.get_template()
+    logger.info(f"Worker {worker_id} draining {spool}")
+
+    done = 0
+    next_reap = 0.0
+    while not stopping.is_set():
+        if time.time() >= next_reap:
+            reap_expired(spool)
+            next_reap = time.time() + LEASE_SECONDS / 4
+
+        claimed = claim_next(spool, worker_id)
+        if claimed is None:
+            # Leased jobs can still come back if their worker dies
+            if drain and not os.listdir(os.path.join(spool, 'claimed')):
+                break
+            stopping.wait(POLL_SECONDS)
+            continue
+
+        process(spool, *claimed)
+        done += 1
+
+    logger.info(f"Worker {worker_id} stopping after {done} jobs")
+    return done
+
+
+def run_workers(spool, processes, drain=False):
+    """Run worker_loop in several processes on this host."""
+    if processes <= 1:
+        worker_loop(spool, drain)
+        return
+
+    import multiprocessing
+    workers = [multiprocessing.Process(target=worker_loop, args=(spool, drain)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    # Ctrl-C reaches the workers too; they finish their jobs and exit
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: [worker.terminate() for worker in workers])
+    for worker in workers:
+        worker.join()
+
+
+# ============ CLI ============
+
+def read_jobs(path):
+    """Receipt jobs from a JSON array or NDJSON file of receipts ('-' reads stdin)."""
+    text = sys.stdin.read() if path == '-' else open(path, encoding='utf-8').read()
+    try:
+        parsed = json.loads(text)
+        items = parsed if isinstance(parsed, list) else [parsed]
+    except json.JSONDecodeError:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    # Already-formed jobs pass through; bare receipts become receipt jobs
+    return [item if item.get('kind') in JOB_KINDS else {'kind': 'receipt', 'receipt': item} for item in items]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spool-directory work queue for receipt and autofill jobs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Queue jobs")
+    enqueue_parser.add_argument("spool")
+    enqueue_parser.add_argument("jobs", nargs="?", default="-", help="Receipts or jobs: JSON array or NDJSON (- for stdin)")
+    enqueue_parser.add_argument("--autofill", nargs=2, metavar=("PDF", "DATA_JSON"), help="Queue a FormAutofiller job")
+    enqueue_parser.add_argument("--profile", help="Output profile for receipt jobs")
+
+    worker_parser = commands.add_parser("worker", help="Drain the spool")
+    worker_parser.add_argument("spool")
+    worker_parser.add_argument("--processes", type=int, default=1, help="Worker processes on this host")
+    worker_parser.add_argument("--drain", action="store_true", help="Exit once no jobs are queued or leased")
+
+    status_parser = commands.add_parser("status", help="Count jobs by state")
+    status_parser.add_argument("spool")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: [%(process)d] %(message)s')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    init_spool(args.spool)
+
+    if args.command == "enqueue":
+        if args.autofill:
+            pdf_path, data_path = args.autofill
+            with open(data_path) as f:
+                jobs = [{'kind': 'autofill', 'pdf': os.path.abspath(pdf_path), 'data': json.load(f)}]
+        else:
+            jobs = read_jobs(args.jobs)
+        for job in jobs:
+            if args.profile and job['kind'] == 'receipt':
+                job['profile'] = args.profile
+            print(enqueue(args.spool, job))
+    elif args.command == "worker":
+        run_workers(args.spool, args.processes, args.drain)
+    else:
+        print(json.dumps(status(args.spool)))
+
+
+if __name__ == "__main__":
+    main()
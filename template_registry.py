@@ -0,0 +1,225 @@
+"""
+Template Registry
+Receipt templates by ID. Besides the built-in delivery receipt, each
+template is a PDF plus a layout definition in receipt_templates/<id>.json
+(or the directory named by RECEIPT_TEMPLATES_DIR):
+
+    {
+      "name": "Return Slip",
+      "pdf": "return_slip.pdf",
+      "font_size": 14,
+      "fields": [
+        {"field": "date", "rect": [80, 76, 250, 92], "font_size": 16},
+        {"field": "consignee", "rect": [115, 163, 400, 183]},
+        {"field": "date_bottom", "source": "date", "rect": [50, 680, 250, 700]}
+      ],
+      "table": {
+        "rows": [[275, 309], [309, 343], [343, 377]],
+        "padding": 2,
+        "columns": [
+          {"source": "description", "x": [45, 325], "format": "{n}. {value}"},
+          {"source": "quantity", "x": [335, 425], "align": "center"}
+        ]
+      }
+    }
+
+"pdf" is relative to the JSON file. Fields draw the receipt value named
+by "source" (default: the field name); table rows draw one item each.
+A delivery_receipt.json overrides the built-in layout.
+
+Nothing is loaded at startup: a definition is read and validated on first
+use (and again when its file changes), and the parsed template lands in
+receipt_engine's LRU of warm templates, which evicts the least recently
+used ones past RECEIPT_MAX_TEMPLATES, RECEIPT_TEMPLATE_CACHE_MB or
+RECEIPT_TEMPLATE_RSS_MB.
+"""
+
+import os
+import re
+import json
+import logging
+import threading
+
+import receipt_engine
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATES_DIR = os.environ.get('RECEIPT_TEMPLATES_DIR', os.path.join(BASE_DIR, 'receipt_templates'))
+DEFAULT_TEMPLATE_ID = 'delivery_receipt'
+
+# IDs name files in TEMPLATES_DIR, so no path separators or leading dots
+TEMPLATE_ID_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+ALIGNMENTS = ('left', 'center')
+
+
+class TemplateError(ValueError):
+    """Unknown template ID, or a definition that can't be used."""
+
+
+# ============ Definitions ============
+
+def _number_list(value, length, what):
+    if (not isinstance(value, list) or len(value) != length
+            or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)):
+        raise TemplateError(f'{what} must be a list of {length} numbers.')
+    return value
+
+
+def _check_style(entry, what):
+    if entry.get('align', 'left') not in ALIGNMENTS:
+        raise TemplateError(f'{what}: align must be one of {", ".join(ALIGNMENTS)}.')
+    font_size = entry.get('font_size', 14)
+    if not isinstance(font_size, (int, float)) or font_size < receipt_engine.MIN_FONT_SIZE:
+        raise TemplateError(f'{what}: font_size must be a number of at least {receipt_engine.MIN_FONT_SIZE}.')
+
+
+def validate_definition(definition, base_dir):
+    """Check a layout definition and resolve its PDF path; returns the definition."""
+    if not isinstance(definition, dict):
+        raise TemplateError('A template definition must be a JSON object.')
+    pdf = definition.get('pdf')
+    if not isinstance(pdf, str) or not pdf:
+        raise TemplateError('"pdf" must name the template PDF.')
+    definition['pdf'] = os.path.normpath(os.path.join(base_dir, pdf))
+    if not os.path.isfile(definition['pdf']):
+        raise TemplateError(f'its PDF {pdf} does not exist.')
+    _check_style(definition, 'template')
+
+    names = set()
+    fields = definition.get('fields', [])
+    if not isinstance(fields, list):
+        raise TemplateError('"fields" must be a list.')
+    for entry in fields:
+        if not isinstance(entry, dict) or not isinstance(entry.get('field'), str):
+            raise TemplateError('Each field needs a "field" name.')
+        what = f'field {entry["field"]}'
+        x0, y0, x1, y1 = _number_list(entry.get('rect'), 4, f'{what}: rect')
+        if x0 >= x1 or y0 >= y1:
+            raise TemplateError(f'{what}: rect must be [x0, y0, x1, y1] with x0 < x1 and y0 < y1.')
+        if not isinstance(entry.get('source', ''), str):
+            raise TemplateError(f'{what}: source must be a string.')
+        _check_style(entry, what)
+        names.add(entry['field'])
+
+    table = definition.get('table')
+    if table is not None:
+        if not isinstance(table, dict) or not isinstance(table.get('rows'), list) \
+                or not isinstance(table.get('columns'), list) or not table['columns']:
+            raise TemplateError('"table" needs "rows" and "columns" lists.')
+        for row in table['rows']:
+            y_start, y_end = _number_list(row, 2, 'table rows')
+            if y_start >= y_end:
+                raise TemplateError('table rows must be [y_start, y_end] with y_start < y_end.')
+        _check_style(table, 'table')
+        for column in table['columns']:
+            if not isinstance(column, dict) or not isinstance(column.get('source'), str):
+                raise TemplateError('Each table column needs a "source" item key.')
+            what = f'column {column["source"]}'
+            x_start, x_end = _number_list(column.get('x'), 2, f'{what}: x')
+            if x_start >= x_end:
+                raise TemplateError(f'{what}: x must be [x_start, x_end] with x_start < x_end.')
+            try:
+                column.get('format', '{value}').format(n=1, value='')
+            except (AttributeError, KeyError, IndexError, ValueError):
+                raise TemplateError(f'{what}: format must be a string using only {{n}} and {{value}}.')
+            _check_style(column, what)
+            names.update(f'item{i}_{column["source"]}' for i in range(1, len(table['rows']) + 1))
+
+    if not names:
+        raise TemplateError('A template needs at least one field or table column.')
+    return definition
+
+
+def definition_path(template_id):
+    if not isinstance(template_id, str) or not TEMPLATE_ID_PATTERN.match(template_id):
+        raise TemplateError(f'Unknown template "{template_id}".')
+    return os.path.join(TEMPLATES_DIR, f'{template_id}.json')
+
+
+_definitions = {}
+_definitions_lock = threading.Lock()
+
+
+def load_definition(template_id):
+    """The validated definition for template_id, re-read when its file changes.
+
+    None means the built-in delivery receipt.
+    """
+    path = definition_path(template_id)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        if template_id == DEFAULT_TEMPLATE_ID:
+            return None
+        raise TemplateError(f'Unknown template "{template_id}".')
+
+    fingerprint = (stat.st_mtime_ns, stat.st_size)
+    with _definitions_lock:
+        cached = _definitions.get(template_id)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            definition = validate_definition(json.load(f), os.path.dirname(path))
+    except (OSError, ValueError) as e:
+        # Unreadable files, JSON errors and TemplateErrors; the message may reach clients, so no paths
+        logger.warning(f"Invalid template definition {path}: {e}")
+        raise TemplateError(f'Template "{template_id}" is not usable: {e}')
+    definition.setdefault('name', template_id.replace('_', ' ').title())
+    with _definitions_lock:
+        _definitions[template_id] = (fingerprint, definition)
+    return definition
+
+
+def template_ids():
+    """The built-in ID plus one per definition file, sorted."""
+    try:
+        names = os.listdir(TEMPLATES_DIR)
+    except FileNotFoundError:
+        names = []
+    ids = {name[:-len('.json')] for name in names if name.endswith('.json')}
+    ids.add(DEFAULT_TEMPLATE_ID)
+    return sorted(template_id for template_id in ids if TEMPLATE_ID_PATTERN.match(template_id))
+
+
+def list_templates():
+    """[{id, name, items}] for every usable template; broken definitions are skipped."""
+    templates = []
+    for template_id in template_ids():
+        try:
+            definition = load_definition(template_id)
+        except TemplateError:
+            continue  # load_definition logged why
+        definition = definition or dict(receipt_engine.DEFAULT_LAYOUT, name='Delivery Receipt')
+        table = definition.get('table')
+        templates.append({'id': template_id, 'name': definition['name'],
+                          'items': len(table['rows']) if table else 0})
+    return templates
+
+
+# ============ Templates ============
+
+def get_template(template_id=None, profile=None, default_path=receipt_engine.DEFAULT_TEMPLATE_PATH):
+    """The warm ReceiptTemplate for template_id (default: the delivery receipt at default_path).
+
+    Raises TemplateError for unknown IDs and broken definitions.
+    """
+    template_id = template_id or DEFAULT_TEMPLATE_ID
+    definition = load_definition(template_id)
+    if definition is None:
+        return receipt_engine.get_template(default_path, profile)
+    return receipt_engine.get_template(definition['pdf'], profile, definition, template_id)
+
+
+# ============ Route ============
+
+def install(app):
+    """Register GET /api/templates on a Flask app."""
+    from flask import jsonify
+
+    def templates():
+        return jsonify(templates=list_templates(), default=DEFAULT_TEMPLATE_ID)
+
+    app.add_url_rule('/api/templates', 'templates', templates)